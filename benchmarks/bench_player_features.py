@@ -0,0 +1,76 @@
+"""Benchmark the reference and vectorized player feature engines on a synthetic report.
+
+    python benchmarks/bench_player_features.py --fights 40 --players 25 --events 4000
+
+Writes a report under a temp dir (or --out), times both engines on it and checks
+that they return identical frames. With --workers N the vectorized engine is also
+timed with N processes.
+"""
+from __future__ import annotations
+import os, sys, csv, json, time, random, argparse, tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from raidintel.analysis.player_features import build_player_features, build_player_features_vectorized
+
+TYPES = {"Casts": 1.0, "DamageDone": 1.5, "Healing": 0.6, "Deaths": 0.002}
+
+def synthesize(out_dir: str, code: str, fights: int, players: int, events: int, seed: int) -> int:
+    rnd = random.Random(seed)
+    base = os.path.join(out_dir, code)
+    os.makedirs(os.path.join(base, "events"), exist_ok=True)
+    total = 0
+    t = 0
+    with open(os.path.join(base, "fights.csv"), "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f); w.writerow(["id", "startTime", "endTime"])
+        bounds = []
+        for fid in range(1, fights + 1):
+            st = t + rnd.randint(30_000, 120_000); en = st + rnd.randint(60_000, 600_000)
+            w.writerow([fid, st, en]); bounds.append((fid, st, en)); t = en
+    for fid, st, en in bounds:
+        for data_type, weight in TYPES.items():
+            n = max(1, int(events * weight))
+            ts = sorted(rnd.randint(st, en) for _ in range(n))
+            with open(os.path.join(base, "events", f"fight_{fid}_{data_type}.jsonl"), "w", encoding="utf-8") as fh:
+                for x in ts:
+                    ev = {"timestamp": x, "type": data_type.lower(), "sourceID": rnd.randint(1, players),
+                          "targetID": rnd.randint(100, 140), "abilityGameID": rnd.randint(1000, 1100), "fight": fid}
+                    fh.write(json.dumps(ev) + "\n")
+            total += n
+    return total
+
+def timed(fn, *args, repeat: int = 1):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter(); out = fn(*args); best = min(best, time.perf_counter() - t0)
+    return best, out
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--fights", type=int, default=40)
+    ap.add_argument("--players", type=int, default=25)
+    ap.add_argument("--events", type=int, default=4000, help="casts per fight; other types are scaled from it")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--workers", type=int, default=0, help="also time the process-parallel build with this many workers")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--out", default=None, help="keep the synthetic report here instead of a temp dir")
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        out_dir = args.out or tmp
+        n = synthesize(out_dir, "BENCH", args.fights, args.players, args.events, args.seed)
+        print(f"synthetic report: {args.fights} fights, {args.players} players, {n} events")
+        t_ref, ref = timed(build_player_features, "BENCH", out_dir, repeat=args.repeat)
+        t_vec, vec = timed(build_player_features_vectorized, "BENCH", out_dir, repeat=args.repeat)
+        if not ref.equals(vec) or list(ref.dtypes) != list(vec.dtypes):
+            raise SystemExit("vectorized output differs from build_player_features")
+        print(f"build_player_features:            {t_ref:8.3f}s  ({n / t_ref:,.0f} events/s)")
+        print(f"build_player_features_vectorized: {t_vec:8.3f}s  ({n / t_vec:,.0f} events/s)")
+        print(f"speedup: {t_ref / t_vec:.1f}x, {len(vec)} rows identical")
+        if args.workers > 1:
+            t_par, par = timed(lambda: build_player_features_vectorized("BENCH", out_dir, workers=args.workers), repeat=args.repeat)
+            if not ref.equals(par) or list(ref.dtypes) != list(par.dtypes):
+                raise SystemExit("parallel output differs from build_player_features")
+            print(f"vectorized, {args.workers} workers:        {t_par:8.3f}s  ({n / t_par:,.0f} events/s, {t_vec / t_par:.1f}x over 1 worker)")
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 from __future__ import annotations
-import argparse, json, os, time
+import argparse, json, os
 from src.raidintel.wcl_client import WCLClient
 
 GQL_REPORTS = """
@@ -45,7 +45,6 @@ def fetch_all_reports(client: WCLClient, guild: str, slug: str, region: str):
         if not block.get("has_more_pages", False):
             return out
         page += 1
-        time.sleep(0.2)
 
 def main():
     ap = argparse.ArgumentParser(description="Dev runner using JSON (not in VC)")
@@ -1,8 +1,38 @@
 from __future__ import annotations
+import os
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Dict, List, Optional, Sequence
 from ..storage import ArtifactKey
 from ..orchestrator import Action, Context
+from ..fight_filter import FightFilter
+
+def with_fights(params: Dict[str, object], fight_filter: Optional[FightFilter]) -> Dict[str, object]:
+    """Artifact params plus the fight filter's settings, when it drops any fight."""
+    if fight_filter is not None and fight_filter.active:
+        params["fights"] = fight_filter.spec()
+    return params
+
+def report_path(ctx: Context, code: str, *parts: str) -> str:
+    return os.path.join(ctx.cfg.output_dir, code, *parts)
+
+def report_event_files(ctx: Context, code: str, event_types: Optional[Sequence[str]] = None) -> List[str]:
+    """fights.csv and the committed event files of a report (of `event_types` only, if given), in either event store."""
+    if event_types is None:
+        return [report_path(ctx, code, "fights.csv"), report_path(ctx, code, "events", "fight_*_*.jsonl"),
+                report_path(ctx, code, "events_parquet", "**", "*.parquet"), report_path(ctx, code, "events_bin", "*", "fight_*.npy")]
+    out = [report_path(ctx, code, "fights.csv")]
+    for t in event_types:
+        out += [report_path(ctx, code, "events", f"fight_*_{t}.jsonl"),
+                report_path(ctx, code, "events_parquet", f"dataType={t}", "**", "*.parquet"),
+                report_path(ctx, code, "events_bin", t, "fight_*.npy")]
+    return out
+
+def report_events(ctx: Context, code: str) -> "EnsureReportEventsDumped":
+    """The events dump an action of `code` depends on: the types its graph consumes
+    (`ctx.demand`, see `graph.resolve_with_demand`), every configured type until that is known."""
+    need = ctx.demand.get(code)
+    return EnsureReportEventsDumped(code, list(need) if need is not None else list(ctx.cfg.event_types),
+                                    fight_filter=FightFilter.from_config(ctx.cfg))
 
 @dataclass
 class EnsureReportHeader(Action):
@@ -19,6 +49,9 @@ class EnsureReportHeader(Action):
         rep = ctx.repo.get_report_header(self.code)  # raises if not found
         ctx.etl.write_report_header_json(rep)
 
+    def outputs(self, ctx: Context) -> List[str]:
+        return [report_path(ctx, self.code, "report.json")]
+
     def ttl_seconds(self) -> Optional[int]:
         return self.ttl
 
@@ -71,17 +104,29 @@ class EnsureReportEventsDumped(Action):
     code: str
     event_types: List[str]
     ttl: Optional[int] = None
+    fight_filter: Optional[FightFilter] = None  # None = every fight
     def artifact(self) -> ArtifactKey:
-        return ArtifactKey("report-events", {"code": self.code, "types": tuple(sorted(self.event_types))})
+        return ArtifactKey("report-events", with_fights({"code": self.code, "types": tuple(sorted(self.event_types))},
+                                                        self.fight_filter))
     def requires(self, ctx: Context) -> List[Action]:
         return [EnsureReportHeader(self.code)]
     def run(self, ctx: Context) -> None:
+        from ..etl.fetch import ConcurrentEventFetcher
         fights = ctx.repo.get_fights(self.code)
-        ctx.etl.write_fights_csv(self.code, fights)
-        for ft in fights:
-            for et in self.event_types:
-                ev_it = ctx.repo.stream_events(self.code, ft.id, float(ft.startTime), float(ft.endTime), et)
-                ctx.etl.dump_events_jsonl(self.code, ft, et, ev_it)
+        ctx.etl.write_fights_csv(self.code, fights)  # all of them; readers apply the same filter
+        if self.fight_filter is not None:
+            fights = self.fight_filter.apply(fights)
+        key = self.artifact()
+        key.version = self.version()
+        # a record means an earlier dump finished: this run refreshes it (TTL, changed inputs) and must
+        # download again; only a dump that never finished resumes from what it committed
+        resume = ctx.cfg.resume_dumps and ctx.store.record(key) is None
+        fetcher = ConcurrentEventFetcher(ctx.repo, ctx.etl, max_in_flight=ctx.cfg.max_in_flight,
+                                         batch_size=ctx.cfg.events_batch_size, resume=resume,
+                                         mode=ctx.cfg.fetch_mode, shards=ctx.cfg.fight_shards, shard_min_s=ctx.cfg.shard_min_s)
+        fetcher.dump_report(self.code, fights, self.event_types)
+    def outputs(self, ctx: Context) -> List[str]:
+        return report_event_files(ctx, self.code, self.event_types)
     def ttl_seconds(self) -> Optional[int]:
         return self.ttl
     def version(self) -> str:
@@ -91,34 +136,33 @@ class EnsureReportEventsDumped(Action):
 class EnsureDatasetBuilt(Action):
     code: str
     ttl: Optional[int] = None
+    fight_filter: Optional[FightFilter] = None  # None = every fight
     def artifact(self) -> ArtifactKey:
-        return ArtifactKey("dataset-built", {"code": self.code})
+        return ArtifactKey("dataset-built", with_fights({"code": self.code}, self.fight_filter))
     def requires(self, ctx: Context) -> List[Action]:
-        return [EnsureReportEventsDumped(self.code, ctx.cfg.event_types)]
+        return [report_events(ctx, self.code)]
+    def consumes(self, ctx: Context) -> Optional[Dict[str, List[str]]]:
+        return {t: [] for t in ctx.cfg.event_types}  # per-type counts only
     def run(self, ctx: Context) -> None:
-        # Minimal dataset: per-fight counts using events files (simple example)
-        import os, csv, json, glob
+        # Minimal dataset: per-fight counts, straight from the dump manifest (no event scan)
+        import csv
         out_dir = os.path.join(ctx.cfg.output_dir, self.code)
-        events_dir = os.path.join(out_dir, "events")
-        fights_csv = os.path.join(out_dir, "fights.csv")
+        keep = self.fight_filter or FightFilter()
         idx = {}  # fight_id -> aggregates
-        if os.path.exists(fights_csv):
-            with open(fights_csv, "r", encoding="utf-8") as f:
-                for row in csv.DictReader(f):
-                    fid = int(row["id"])
-                    idx[fid] = {"fight_id": fid, "startTime": int(row["startTime"]), "endTime": int(row["endTime"])}
-        for path in glob.glob(os.path.join(events_dir, "fight_*_*.jsonl")):
-            base = os.path.basename(path)
-            fid = int(base.split("_")[1])
-            etype = base.rsplit("_", 1)[-1].split(".")[0]
+        for fight in keep.apply(ctx.etl.read_fights_csv(self.code)):
+            idx[fight.id] = {"fight_id": fight.id, "startTime": fight.startTime, "endTime": fight.endTime}
+        for (fid, etype), entry in ctx.etl.manifest(self.code).items():
+            if keep.active and fid not in idx:
+                continue  # stored before the filter was set
             idx.setdefault(fid, {"fight_id": fid})
-            cnt = 0
-            with open(path, "r", encoding="utf-8") as fh:
-                for _ in fh: cnt += 1
-            idx[fid][f"n_{etype}"] = cnt
+            idx[fid][f"n_{etype}"] = entry["count"]
         keys = sorted({k for d in idx.values() for k in d.keys()})
         with open(os.path.join(out_dir, "dataset.csv"), "w", newline="", encoding="utf-8") as f:
             w = csv.DictWriter(f, fieldnames=keys); w.writeheader(); w.writerows(idx.values())
+    def inputs(self, ctx: Context) -> List[str]:
+        return report_event_files(ctx, self.code)
+    def outputs(self, ctx: Context) -> List[str]:
+        return [report_path(ctx, self.code, "dataset.csv")]
     def ttl_seconds(self) -> Optional[int]:
         return self.ttl
     def version(self) -> str:
@@ -132,12 +176,11 @@ class AnalyzeGuildLatest(Action):
         return ArtifactKey("analysis-latest", {"g": self.guild, "s": self.slug, "r": self.region})
     def requires(self, ctx: Context) -> List[Action]:
         # ensure we have listing to pick latest
-        _ = ctx.repo.list_guild_reports(self.guild, self.slug, self.region)
         reps = ctx.repo.list_guild_reports(self.guild, self.slug, self.region)
         if not reps:
             return [EnsureGuildReports(self.guild, self.slug, self.region)]
         latest = max(reps, key=lambda r: r.startTime)
-        return [EnsureGuildReports(self.guild, self.slug, self.region), EnsureDatasetBuilt(latest.code)]
+        return [EnsureGuildReports(self.guild, self.slug, self.region), EnsureDatasetBuilt(latest.code, fight_filter=FightFilter.from_config(ctx.cfg))]
     def run(self, ctx: Context) -> None:
         import os, json, pandas as pd
         reps = ctx.repo.list_guild_reports(self.guild, self.slug, self.region)
@@ -147,10 +190,13 @@ class AnalyzeGuildLatest(Action):
         if not os.path.exists(ds):
             raise RuntimeError("Dataset missing")
         df = pd.read_csv(ds).fillna(0)
+        manifest = ctx.etl.manifest(latest.code).values()
         summary = {
             "report": latest.code,
             "fights": int(df["fight_id"].nunique()),
-            "total_events": int(df[[c for c in df.columns if c.startswith("n_")]].sum().sum()) if any(c.startswith("n_") for c in df.columns) else 0,
+            "total_events": sum(e["count"] for e in manifest),
+            "event_bytes": sum(e["bytes"] for e in manifest),
+            "distinct_sources": len({s for e in manifest for s in e["sources"]}),
         }
         with open(os.path.join(out_dir, "analysis.json"), "w", encoding="utf-8") as f:
             json.dump(summary, f, indent=2)
@@ -1,10 +1,12 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Optional, List
-import os
+from typing import Dict, Optional, List
+import os, logging
+from .. import tracing
 from ..storage import ArtifactKey
 from ..orchestrator import Action, Context
-from ..analysis.player_features import build_player_features
+from ..fight_filter import FightFilter
+from ..analysis.player_features import FEATURE_FIELDS, build_player_features_vectorized, stream_player_features
 from ..analysis.prescriptions import prescribe, write_coaching_md
 # optional ML flag
 try:
@@ -12,18 +14,77 @@ try:
 except Exception:
     add_anomaly_scores = None
 
+log = logging.getLogger(__name__)
+
+def write_coaching_notes(df, out_path: str) -> str:
+    """coaching.md from a player features frame."""
+    df = df.fillna(0)
+    if add_anomaly_scores:
+        df = add_anomaly_scores(df)
+    return write_coaching_md(prescribe(df), out_path)
+
 @dataclass
 class BuildPlayerFeatures(Action):
     code: str
     ttl: Optional[int] = None
-    def artifact(self) -> ArtifactKey: return ArtifactKey("features-players", {"code": self.code})
+    fight_filter: Optional[FightFilter] = None  # None = every fight
+    def artifact(self) -> ArtifactKey:
+        from .core import with_fights
+        return ArtifactKey("features-players", with_fights({"code": self.code}, self.fight_filter))
     def requires(self, ctx: Context) -> List[Action]:
-        from .core import EnsureReportEventsDumped
-        return [EnsureReportEventsDumped(self.code, ctx.cfg.event_types)]
+        from .core import report_events
+        return [report_events(ctx, self.code)]
+    def consumes(self, ctx: Context) -> Optional[Dict[str, List[str]]]:
+        return {t: list(fields) for t, fields in FEATURE_FIELDS.items()}
     def run(self, ctx: Context) -> None:
-        df = build_player_features(self.code, ctx.cfg.output_dir)
         out = os.path.join(ctx.cfg.output_dir, self.code, "player_features.csv")
+        fights = (self.fight_filter or FightFilter()).fight_ids(ctx.etl.read_fights_csv(self.code))  # None = all
+        budget = getattr(ctx.cfg, "feature_memory_mb", 0)
+        if budget > 0:
+            stats = stream_player_features(self.code, ctx.cfg.output_dir, out, event_store=ctx.cfg.event_store,
+                                           memory_mb=budget, fights=fights, trace_memory=tracing.active() is not None)
+            log.info("Player features of %s: %s", self.code, stats.summary())
+            return
+        df = build_player_features_vectorized(self.code, ctx.cfg.output_dir, event_store=ctx.cfg.event_store,
+                                              fights=fights, workers=getattr(ctx.cfg, "feature_workers", 1))
         df.to_csv(out, index=False)
+    def inputs(self, ctx: Context) -> List[str]:
+        from .core import report_event_files
+        return report_event_files(ctx, self.code, list(FEATURE_FIELDS))
+    def outputs(self, ctx: Context) -> List[str]: return [os.path.join(ctx.cfg.output_dir, self.code, "player_features.csv")]
+    def ttl_seconds(self) -> Optional[int]: return self.ttl
+    def version(self) -> str: return "v1"
+
+@dataclass
+class BuildDeathContext(Action):
+    code: str
+    ttl: Optional[int] = None
+    fight_filter: Optional[FightFilter] = None  # None = every fight
+    def artifact(self) -> ArtifactKey:
+        from .core import with_fights
+        return ArtifactKey("death-context", with_fights({"code": self.code}, self.fight_filter))
+    def requires(self, ctx: Context) -> List[Action]:
+        from .core import report_events
+        return [report_events(ctx, self.code)]
+    def consumes(self, ctx: Context) -> Optional[Dict[str, List[str]]]:
+        from ..analysis.death_context import DEATH_CONTEXT_FIELDS
+        return {t: list(fields) for t, fields in DEATH_CONTEXT_FIELDS.items()}
+    def required_events(self, ctx: Context) -> List[str]: return ["Deaths", "DamageTaken"]
+    def run(self, ctx: Context) -> None:
+        from .core import report_events
+        from ..analysis.death_context import build_death_context
+        dumped = report_events(ctx, self.code).event_types
+        missing = [t for t in self.required_events(ctx) if t not in dumped]
+        if missing:  # only when run outside a resolved graph: the demand pass adds what `required_events` lists
+            raise ValueError(f"Death context of {self.code} needs {', '.join(missing)} events, which are not dumped")
+        fights = (self.fight_filter or FightFilter()).fight_ids(ctx.etl.read_fights_csv(self.code))
+        df = build_death_context(self.code, ctx.cfg.output_dir, event_store=ctx.cfg.event_store, fights=fights)
+        df.to_csv(os.path.join(ctx.cfg.output_dir, self.code, "death_context.csv"), index=False)
+    def inputs(self, ctx: Context) -> List[str]:
+        from .core import report_event_files
+        from ..analysis.death_context import DEATH_CONTEXT_FIELDS
+        return report_event_files(ctx, self.code, list(DEATH_CONTEXT_FIELDS))
+    def outputs(self, ctx: Context) -> List[str]: return [os.path.join(ctx.cfg.output_dir, self.code, "death_context.csv")]
     def ttl_seconds(self) -> Optional[int]: return self.ttl
     def version(self) -> str: return "v1"
 
@@ -32,14 +93,15 @@ class PrescribeImprovements(Action):
     code: str
     ttl: Optional[int] = 600
     def artifact(self) -> ArtifactKey: return ArtifactKey("coaching-notes", {"code": self.code})
-    def requires(self, ctx: Context) -> List[Action]: return [BuildPlayerFeatures(self.code)]
+    def requires(self, ctx: Context) -> List[Action]:
+        return [BuildPlayerFeatures(self.code, fight_filter=FightFilter.from_config(ctx.cfg))]
     def run(self, ctx: Context) -> None:
         import pandas as pd
         feats_path = os.path.join(ctx.cfg.output_dir, self.code, "player_features.csv")
-        df = pd.read_csv(feats_path).fillna(0)
-        if add_anomaly_scores:
-            df = add_anomaly_scores(df)
-        sug = prescribe(df)
-        write_coaching_md(sug, os.path.join(ctx.cfg.output_dir, self.code, "coaching.md"))
+        # no rows (e.g. the fight filter kept no pull) is written as an empty line
+        df = pd.read_csv(feats_path) if os.path.getsize(feats_path) > 1 else pd.DataFrame([])
+        write_coaching_notes(df, os.path.join(ctx.cfg.output_dir, self.code, "coaching.md"))
+    def inputs(self, ctx: Context) -> List[str]: return [os.path.join(ctx.cfg.output_dir, self.code, "player_features.csv")]
+    def outputs(self, ctx: Context) -> List[str]: return [os.path.join(ctx.cfg.output_dir, self.code, "coaching.md")]
     def ttl_seconds(self) -> Optional[int]: return self.ttl
     def version(self) -> str: return "v1"
@@ -0,0 +1,102 @@
+from __future__ import annotations
+import os, csv
+from typing import Iterable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from ..models import Fight
+from ..etl.time_index import NULL, EventWindows
+
+DEATH_WINDOW_S = 10.0
+# event fields each data type is read for
+DEATH_CONTEXT_FIELDS = {"Deaths": ["timestamp", "sourceID", "targetID", "abilityGameID", "killingAbilityGameID"],
+                        "DamageTaken": ["timestamp", "targetID", "abilityGameID", "amount"],
+                        "Healing": ["timestamp", "targetID", "amount"],
+                        "Casts": ["timestamp", "sourceID", "abilityGameID"]}
+# major personal defensives (spell ids); pass `defensives=` for anything else
+DEFENSIVE_ABILITIES = frozenset({
+    642, 498, 45438, 871, 118038, 22812, 61336, 47585, 19236, 48792, 48707, 104773, 186265,
+    31224, 5277, 1966, 108271, 115203, 198589, 196555, 363916,
+})
+COLUMNS = ["report_code", "fight_id", "targetID", "death_ts", "window_s", "dmg_taken", "n_hits", "top_damage_ability",
+           "killing_ability", "heal_received", "n_heals", "defensives_cast", "defensive_abilities"]
+
+def _fight_ids(base: str) -> List[int]:
+    path = os.path.join(base, "fights.csv")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Missing fights.csv at {path}")
+    with open(path, "r", encoding="utf-8") as f:
+        return [Fight.from_row(r).id for r in csv.DictReader(f)]
+
+def _window_sums(win: EventWindows, fid: int, data_type: str, by: str, actors: np.ndarray, t0: np.ndarray,
+                 t1: np.ndarray, value: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Per window: sum of `value`, event count, and (order, lo, hi) to reach the rows. Zeros if the stream is not stored."""
+    idx = win.index(fid, data_type)
+    if idx is None:
+        z = np.zeros(len(actors), dtype=np.int64)
+        return z, z, np.empty(0, dtype=np.int64), z, z
+    order, lo, hi = idx.spans(by, actors, t0, t1)
+    vals = win.columns(fid, data_type, [value])[value][order]
+    csum = np.concatenate([[0], np.cumsum(np.where(vals == NULL, 0, vals))])
+    return csum[hi] - csum[lo], hi - lo, order, lo, hi
+
+def build_death_context(report_code: str, out_dir: str, event_store: str = "jsonl", window_s: float = DEATH_WINDOW_S,
+                        fights: Optional[Iterable[int]] = None, defensives: Iterable[int] = DEFENSIVE_ABILITIES) -> pd.DataFrame:
+    """One row per death: what the player took, was healed for and used in the `window_s` before it.
+
+    The dead unit is the death event's targetID (its sourceID when there is
+    none). Each window is found by binary search in the streams' time indexes
+    (built by the ETL, or on first use), and damage and healing totals come
+    from prefix sums, so the cost grows with the number of deaths rather than
+    with the events scanned per death. Fights are read one at a time.
+    """
+    base = os.path.join(out_dir, report_code)
+    ids = _fight_ids(base) if fights is None else sorted({int(f) for f in fights})
+    defensive = np.array(sorted({int(a) for a in defensives}), dtype=np.int64)
+    win = EventWindows(base, event_store)
+    window_ms = int(window_s * 1000)
+    parts: List[pd.DataFrame] = []
+    for fid in ids:
+        if win.index(fid, "Deaths") is None:
+            continue
+        d = win.columns(fid, "Deaths", DEATH_CONTEXT_FIELDS["Deaths"])
+        victim = np.where(d["targetID"] != NULL, d["targetID"], d["sourceID"])
+        keep = (victim != NULL) & (d["timestamp"] != NULL)
+        if not keep.any():
+            win.drop(fid)
+            continue
+        victim, ts = victim[keep], d["timestamp"][keep]
+        t0, t1 = ts - window_ms, ts + 1  # the killing blow shares the death's timestamp
+        killing = np.where(d["killingAbilityGameID"] != NULL, d["killingAbilityGameID"], d["abilityGameID"])[keep]
+        dmg, n_hits, order, lo, hi = _window_sums(win, fid, "DamageTaken", "target", victim, t0, t1, "amount")
+        top = np.full(len(victim), NULL, dtype=np.int64)
+        if len(order):
+            cols = win.columns(fid, "DamageTaken", ["abilityGameID", "amount"])
+            ab, am = cols["abilityGameID"][order], np.maximum(cols["amount"][order], 0)
+            for i in np.flatnonzero(hi > lo):
+                u, inv = np.unique(ab[lo[i]:hi[i]], return_inverse=True)
+                top[i] = u[np.argmax(np.bincount(inv, weights=am[lo[i]:hi[i]]))]
+        heal, n_heals, _, _, _ = _window_sums(win, fid, "Healing", "target", victim, t0, t1, "amount")
+        n_def = np.zeros(len(victim), dtype=np.int64)
+        used: List[str] = [""] * len(victim)
+        idx = win.index(fid, "Casts")
+        if idx is not None and len(defensive):
+            order, lo, hi = idx.spans("source", victim, t0, t1)
+            ab = win.columns(fid, "Casts", ["abilityGameID"])["abilityGameID"][order]
+            is_def = np.isin(ab, defensive)
+            cdef = np.concatenate([[0], np.cumsum(is_def)])
+            n_def = cdef[hi] - cdef[lo]
+            for i in np.flatnonzero(n_def):
+                seg = ab[lo[i]:hi[i]]
+                used[i] = ";".join(str(a) for a in seg[is_def[lo[i]:hi[i]]])
+        parts.append(pd.DataFrame({
+            "report_code": report_code, "fight_id": fid, "targetID": victim, "death_ts": ts, "window_s": float(window_s),
+            "dmg_taken": dmg, "n_hits": n_hits, "top_damage_ability": top, "killing_ability": killing,
+            "heal_received": heal, "n_heals": n_heals, "defensives_cast": n_def, "defensive_abilities": used,
+        }))
+        win.drop(fid)
+    if not parts:
+        return pd.DataFrame(columns=COLUMNS)
+    out = pd.concat(parts, ignore_index=True)
+    for c in ("top_damage_ability", "killing_ability"):  # unknown -> empty cell
+        out[c] = out[c].astype("Int64").mask(out[c] == NULL)
+    return out
@@ -1,10 +1,18 @@
 from __future__ import annotations
 import os, glob, json
+import time, contextlib
 from dataclasses import dataclass, asdict
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
 import pandas as pd
 import csv
 
+# data types the player features read, in the order the reference implementation scans them
+FEATURE_TYPES = ["Casts", "DamageDone", "Healing", "Deaths"]
+# event fields each of them is read for (`fight` comes from the stream itself)
+FEATURE_FIELDS = {"Casts": ["sourceID", "timestamp"], "DamageDone": ["sourceID", "timestamp"],
+                  "Healing": ["sourceID"], "Deaths": ["sourceID"]}
+
 @dataclass
 class PlayerFightRow:
     report_code: str
@@ -37,7 +45,7 @@ def _merge_intervals(ms_list: List[int], gap_ms: int = 1500) -> int:
     total += (en - st)
     return max(0, int(total))
 
-def build_player_features(report_code: str, out_dir: str) -> pd.DataFrame:
+def build_player_features(report_code: str, out_dir: str, event_store: str = "jsonl") -> pd.DataFrame:
     base = os.path.join(out_dir, report_code)
     fights_csv = os.path.join(base, "fights.csv")
     if not os.path.exists(fights_csv):
@@ -78,36 +86,51 @@ def build_player_features(report_code: str, out_dir: str) -> pd.DataFrame:
                 except Exception:
                     continue
 
+    def iter_events(files: List[str], data_type: str):
+        """(fight_id, event) pairs of one data type, from the JSONL files, the parquet or the binary store."""
+        if event_store == "parquet":
+            from ..etl.parquet_store import read_events_table
+            cols = ["fight", "sourceID", "timestamp"]  # projection: nothing else is read
+            t = read_events_table(base, data_type, columns=cols)
+            for fid, sid, ts in zip(*(t.column(c).to_pylist() for c in cols)):
+                ev = {"sourceID": sid} if ts is None else {"sourceID": sid, "timestamp": ts}
+                yield fid, ev
+            return
+        if event_store == "binary":
+            from ..etl.binary_store import binary_streams, null_of, open_events
+            for p in binary_streams(base, data_type):
+                arr = open_events(p)
+                null, no_ts = null_of(arr.dtype["sourceID"]), null_of(arr.dtype["timestamp"])
+                for fid, sid, ts in zip(arr.fight.tolist(), arr.sourceID.tolist(), arr.timestamp.tolist()):
+                    yield fid, ({} if sid == null else {"sourceID": sid} if ts == no_ts else {"sourceID": sid, "timestamp": ts})
+            return
+        for p in files:
+            fid = int(os.path.basename(p).split("_")[1])
+            for ev in iter_jsonl(p):
+                yield fid, ev
+
     # counts + timestamp collection
-    for p in casts_files:
-        fid = int(os.path.basename(p).split("_")[1])
-        for ev in iter_jsonl(p):
-            sid = ev.get("sourceID")
-            if sid is None: continue
-            row(fid, sid).n_casts += 1
-            cast_times.setdefault((fid, sid), []).append(int(ev.get("timestamp", 0)))
+    for fid, ev in iter_events(casts_files, "Casts"):
+        sid = ev.get("sourceID")
+        if sid is None: continue
+        row(fid, sid).n_casts += 1
+        cast_times.setdefault((fid, sid), []).append(int(ev.get("timestamp", 0)))
 
-    for p in damage_files:
-        fid = int(os.path.basename(p).split("_")[1])
-        for ev in iter_jsonl(p):
-            sid = ev.get("sourceID")
-            if sid is None: continue
-            row(fid, sid).n_damage_events += 1
-            dmg_times.setdefault((fid, sid), []).append(int(ev.get("timestamp", 0)))
+    for fid, ev in iter_events(damage_files, "DamageDone"):
+        sid = ev.get("sourceID")
+        if sid is None: continue
+        row(fid, sid).n_damage_events += 1
+        dmg_times.setdefault((fid, sid), []).append(int(ev.get("timestamp", 0)))
 
-    for p in healing_files:
-        fid = int(os.path.basename(p).split("_")[1])
-        for ev in iter_jsonl(p):
-            sid = ev.get("sourceID")
-            if sid is None: continue
-            row(fid, sid).n_heal_events += 1
+    for fid, ev in iter_events(healing_files, "Healing"):
+        sid = ev.get("sourceID")
+        if sid is None: continue
+        row(fid, sid).n_heal_events += 1
 
-    for p in deaths_files:
-        fid = int(os.path.basename(p).split("_")[1])
-        for ev in iter_jsonl(p):
-            sid = ev.get("sourceID")
-            if sid is None: continue
-            row(fid, sid).n_deaths += 1
+    for fid, ev in iter_events(deaths_files, "Deaths"):
+        sid = ev.get("sourceID")
+        if sid is None: continue
+        row(fid, sid).n_deaths += 1
 
     # finalize metrics
     out: List[dict] = []
@@ -122,3 +145,376 @@ def build_player_features(report_code: str, out_dir: str) -> pd.DataFrame:
 
     df = pd.DataFrame(out).fillna(0)
     return df
+
+def _jsonl_columns(path: str, need_ts: bool) -> Tuple[np.ndarray, np.ndarray]:
+    """(sourceID, timestamp) arrays of one event file, rows without a sourceID dropped.
+
+    pyarrow's JSON reader parses just the two projected fields in C++; a file it
+    cannot read (malformed lines, odd types) goes through json.loads line by
+    line and skips what fails, like `build_player_features`.
+    """
+    if os.path.getsize(path) > 0:
+        try:
+            import pyarrow as pa
+            import pyarrow.json as pj
+            schema = pa.schema([("sourceID", pa.int64()), ("timestamp", pa.int64())])
+            t = pj.read_json(path, parse_options=pj.ParseOptions(explicit_schema=schema, unexpected_field_behavior="ignore"))
+            sid = t.column("sourceID").to_numpy(zero_copy_only=False)
+            ts = t.column("timestamp").fill_null(0).to_numpy(zero_copy_only=False)
+            keep = t.column("sourceID").is_valid().to_numpy(zero_copy_only=False)
+            return sid[keep].astype(np.int64), ts[keep].astype(np.int64)
+        except Exception:
+            pass
+    sids: List[int] = []; tss: List[int] = []
+    with open(path, "r", encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line: continue
+            try:
+                ev = json.loads(line)
+            except Exception:
+                continue
+            sid = ev.get("sourceID")
+            if sid is None: continue
+            sids.append(sid)
+            tss.append(int(ev.get("timestamp", 0)) if need_ts else 0)
+    return np.asarray(sids, dtype=np.int64), np.asarray(tss, dtype=np.int64)
+
+def _binary_columns(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """(sourceID, timestamp) of a memory-mapped binary stream, rows without a sourceID dropped.
+
+    A missing timestamp reads as 0, like `_jsonl_columns`.
+    """
+    from ..etl.binary_store import null_of, open_events
+    arr = open_events(path)
+    sid = arr.sourceID
+    keep = sid != null_of(sid.dtype)
+    ts = arr.timestamp[keep].astype(np.int64)
+    return sid[keep].astype(np.int64), np.where(ts == null_of(ts.dtype), 0, ts)
+
+def _empty_in_manifest(manifest: Dict[Tuple[int, str], dict], key: Tuple[int, str], path: str) -> bool:
+    """True if the dump manifest records no events for `key` and still describes the file at `path`."""
+    e = manifest.get(key)
+    return e is not None and e.get("count") == 0 and os.path.getsize(path) == e.get("bytes")
+
+def _fight_of(path: str) -> int:
+    """Fight id of a stored stream (`fight_<id>_<type>.jsonl`, `.../fight=<id>/part-0.parquet` or `<type>/fight_<id>.npy`)."""
+    if path.endswith(".parquet"):
+        return int(os.path.basename(os.path.dirname(path)).split("=", 1)[1])
+    return int(os.path.basename(path).split("_")[1].split(".")[0])
+
+def _stored_streams(base: str, event_store: str, data_type: str) -> List[str]:
+    """Files of one data type in the order a full read visits them (glob order; the parquet dataset reads paths sorted)."""
+    if event_store == "parquet":
+        from ..etl.parquet_store import parquet_dir
+        return sorted(glob.glob(os.path.join(parquet_dir(base), f"dataType={data_type}", "fight=*", "part-0.parquet")))
+    if event_store == "binary":
+        from ..etl.binary_store import binary_streams
+        return binary_streams(base, data_type)
+    return glob.glob(os.path.join(base, "events", f"fight_*_{data_type}.jsonl"))
+
+def _seq(kind: int, rank: np.ndarray, row: np.ndarray) -> np.ndarray:
+    # position of an event in a full read: data type, then stream, then row within the stream
+    return (np.int64(kind) << 56) | (rank.astype(np.int64) << 32) | row.astype(np.int64)
+
+def load_feature_events(base: str, event_store: str = "jsonl", fights: Optional[Iterable[int]] = None) -> pd.DataFrame:
+    """All feature-relevant events of a report (or of `fights`) as columns: kind (index into FEATURE_TYPES), fight, sourceID, timestamp, seq.
+
+    Rows keep the order `build_player_features` visits them in, and `seq` is
+    that position as a sortable key, the same whichever subset of fights is
+    loaded. Streams the dump manifest records as empty are not opened.
+    """
+    from ..etl.manifest import load_manifest
+    manifest = load_manifest(base)
+    only = None if fights is None else {int(f) for f in fights}
+    cols = ("kind", "fight", "sourceID", "timestamp", "seq")
+    parts: List[Tuple[int, np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = []
+    for kind, data_type in enumerate(FEATURE_TYPES):
+        streams = _stored_streams(base, event_store, data_type)
+        rank = {_fight_of(p): i for i, p in enumerate(streams)}
+        stored = [p for p in streams if only is None or _fight_of(p) in only]
+        if event_store == "parquet":
+            from ..etl.parquet_store import read_events_table
+            if not stored or all(_empty_in_manifest(manifest, (_fight_of(p), data_type), p) for p in stored):
+                continue
+            t = read_events_table(base, data_type, columns=["fight", "sourceID", "timestamp"], fights=only)
+            fid = t.column("fight").to_numpy(zero_copy_only=False).astype(np.int64)
+            idx = np.arange(len(fid))
+            run = np.ones(len(fid), dtype=bool)
+            run[1:] = fid[1:] != fid[:-1]
+            row = idx - np.maximum.accumulate(np.where(run, idx, 0))
+            keep = t.column("sourceID").is_valid().to_numpy(zero_copy_only=False)
+            sid = t.column("sourceID").to_numpy(zero_copy_only=False)[keep].astype(np.int64)
+            ts = t.column("timestamp").fill_null(0).to_numpy(zero_copy_only=False)[keep].astype(np.int64)
+            fid = fid[keep]
+            known = np.array(sorted(rank), dtype=np.int64)  # fight -> stream rank by binary search, not per event
+            pos = np.minimum(np.searchsorted(known, fid), len(known) - 1)
+            ranks = np.where(known[pos] == fid, np.array([rank[f] for f in known], dtype=np.int64)[pos], 0)
+            parts.append((kind, fid, sid, ts, _seq(kind, ranks, row[keep])))
+            continue
+        for p in stored:
+            fid = _fight_of(p)
+            if _empty_in_manifest(manifest, (fid, data_type), p):
+                continue
+            sid, ts = _binary_columns(p) if event_store == "binary" else _jsonl_columns(p, need_ts=kind <= 1)
+            n = len(sid)
+            parts.append((kind, np.full(n, fid, dtype=np.int64), sid, ts,
+                          _seq(kind, np.full(n, rank[fid], dtype=np.int64), np.arange(n))))
+    if not parts:
+        return pd.DataFrame({c: np.empty(0, dtype=np.int64) for c in cols})
+    return pd.DataFrame({
+        "kind": np.concatenate([np.full(len(p[1]), p[0], dtype=np.int64) for p in parts]),
+        "fight": np.concatenate([p[1] for p in parts]),
+        "sourceID": np.concatenate([p[2] for p in parts]),
+        "timestamp": np.concatenate([p[3] for p in parts]),
+        "seq": np.concatenate([p[4] for p in parts]),
+    })
+
+def _active_ms(fight: np.ndarray, sid: np.ndarray, ts: np.ndarray, gap_ms: int = 1500) -> pd.Series:
+    """`_merge_intervals` for every (fight, sourceID) at once.
+
+    After sorting, an interval [first, last + 1) covers 1 + the sum of its gaps, so
+    each timestamp contributes 1 if it opens an interval (new key, or more than
+    gap_ms + 1 after its predecessor) and its distance to the predecessor otherwise.
+    """
+    if len(ts) == 0:
+        return pd.Series(dtype=np.int64, index=pd.MultiIndex.from_arrays([[], []], names=["fight", "sourceID"]))
+    order = np.lexsort((ts, sid, fight))
+    f, s, t = fight[order], sid[order], ts[order]
+    new_key = np.ones(len(t), dtype=bool)
+    new_key[1:] = (f[1:] != f[:-1]) | (s[1:] != s[:-1])
+    d = np.diff(t, prepend=t[0])
+    contrib = np.where(new_key | (d > gap_ms + 1), 1, d)
+    starts = np.flatnonzero(new_key)
+    totals = np.add.reduceat(contrib, starts)
+    return pd.Series(totals, index=pd.MultiIndex.from_arrays([f[starts], s[starts]], names=["fight", "sourceID"]))
+
+def aggregate_feature_events(ev: pd.DataFrame) -> pd.DataFrame:
+    """Per (fight, sourceID): first `seq`, event count per kind (n0..n3) and active_ms, ordered by first appearance."""
+    if ev.empty:
+        return pd.DataFrame(columns=["fight", "sourceID", "seq"] + [f"n{k}" for k in range(len(FEATURE_TYPES))] + ["active_ms"])
+    counts = ev.groupby(["fight", "sourceID", "kind"]).size().unstack("kind", fill_value=0)
+    counts = counts.reindex(columns=range(len(FEATURE_TYPES)), fill_value=0)
+    first = ev.groupby(["fight", "sourceID"])["seq"].min().sort_values(kind="stable")
+    counts = counts.loc[first.index]
+    timed = ev[ev["kind"] <= 1]
+    active = _active_ms(timed["fight"].to_numpy(), timed["sourceID"].to_numpy(), timed["timestamp"].to_numpy())
+    out = pd.DataFrame({
+        "fight": first.index.get_level_values("fight").to_numpy().astype(np.int64),
+        "sourceID": first.index.get_level_values("sourceID").to_numpy().astype(np.int64),
+        "seq": first.to_numpy().astype(np.int64),
+        **{f"n{k}": counts[k].to_numpy().astype(np.int64) for k in range(len(FEATURE_TYPES))},
+        "active_ms": active.reindex(first.index, fill_value=0).to_numpy().astype(np.int64),
+    })
+    return out
+
+def _partial_features(base: str, event_store: str, fights: List[int]) -> pd.DataFrame:
+    """Worker task of the process-parallel build: the aggregates of a chunk of fights."""
+    return aggregate_feature_events(load_feature_events(base, event_store, fights))
+
+# below this many feature events per worker, process start-up costs more than it saves
+MIN_EVENTS_PER_WORKER = 100_000
+
+def _fight_chunks(base: str, fight_ids: List[int], n: int, min_events: int = MIN_EVENTS_PER_WORKER) -> List[List[int]]:
+    """Split fights into at most `n` chunks of similar event volume (feature streams' bytes in the manifest).
+
+    Fewer chunks are made than there are CPUs, or when the recorded feature
+    events would give a worker less than `min_events` (one chunk: build
+    in-process); `min_events=0` splits into `n` regardless.
+    """
+    from ..etl.manifest import load_manifest
+    manifest = load_manifest(base)
+    if min_events > 0:
+        n = min(n, os.cpu_count() or 1)
+        entries = [e for e in (manifest.get((f, t)) for f in fight_ids for t in FEATURE_TYPES) if e is not None]
+        if entries:
+            n = min(n, sum(e["count"] for e in entries) // min_events)
+    if n <= 1:
+        return [sorted(fight_ids)]
+    size = {f: sum((manifest.get((f, t)) or {}).get("bytes", 0) for t in FEATURE_TYPES) for f in fight_ids}
+    chunks: List[List[int]] = [[] for _ in range(min(n, len(fight_ids)))]
+    load = [0] * len(chunks)
+    for f in sorted(fight_ids, key=lambda f: (-size[f], f)):  # largest first onto the lightest chunk
+        k = load.index(min(load))
+        chunks[k].append(f); load[k] += size[f] or 1
+    return [sorted(c) for c in chunks if c]
+
+def _process_pool(workers: int):
+    """Workers started from a clean server process (or spawned), not forked from a possibly threaded parent."""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+
+def _fight_durations(base: str) -> Dict[int, float]:
+    fights_csv = os.path.join(base, "fights.csv")
+    if not os.path.exists(fights_csv):
+        raise FileNotFoundError(f"Missing fights.csv at {fights_csv}")
+    fight_dur: Dict[int, float] = {}
+    with open(fights_csv, "r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            fight_dur[int(row["id"])] = max(1.0, (int(row["endTime"]) - int(row["startTime"])) / 1000.0)
+    return fight_dur
+
+def _feature_frame(report_code: str, agg: pd.DataFrame, fight_dur: Dict[int, float]) -> pd.DataFrame:
+    """Final feature rows from `aggregate_feature_events` output."""
+    fight_ids = agg["fight"].to_numpy()
+    dur = np.array([fight_dur[int(f)] for f in fight_ids], dtype=float)
+    n_casts, n_dmg, n_heal, n_deaths = (agg[f"n{k}"].to_numpy().astype(np.int64) for k in range(4))
+    active = agg["active_ms"].to_numpy().astype(np.int64)
+    df = pd.DataFrame({
+        "report_code": [report_code] * len(agg),
+        "fight_id": fight_ids.astype(np.int64),
+        "sourceID": agg["sourceID"].to_numpy().astype(np.int64),
+        "n_casts": n_casts,
+        "n_damage_events": n_dmg,
+        "n_heal_events": n_heal,
+        "n_deaths": n_deaths,
+        "active_ms": active,
+        "duration_s": dur,
+        "casts_per_s": n_casts / dur,
+        "dmg_events_per_s": n_dmg / dur,
+        "heal_events_per_s": n_heal / dur,
+        "active_uptime_pct": np.minimum(100.0, 100.0 * (active / (dur * 1000.0))),
+    })
+    return df.fillna(0)
+
+def build_player_features_vectorized(report_code: str, out_dir: str, event_store: str = "jsonl",
+                                    fights: Optional[Iterable[int]] = None, workers: int = 1,
+                                    min_events_per_worker: int = MIN_EVENTS_PER_WORKER) -> pd.DataFrame:
+    """Columnar equivalent of `build_player_features`; returns an identical DataFrame (rows of `fights` only, if given).
+
+    With `workers` > 1 the fights are split into chunks of similar size that
+    are loaded and aggregated in a process pool; the partial aggregates are
+    merged by their `seq` keys, so the result is the same as with one worker.
+    No more workers than CPUs are started, and small reports (under
+    `min_events_per_worker` feature events per worker, by the manifest) use
+    fewer or none.
+    """
+    base = os.path.join(out_dir, report_code)
+    fight_dur = _fight_durations(base)
+    ids = sorted(fight_dur) if fights is None else sorted({int(f) for f in fights})
+    chunks = _fight_chunks(base, ids, workers, min_events_per_worker) if workers > 1 else []
+    if len(chunks) > 1:
+        with _process_pool(len(chunks)) as pool:
+            parts = [p for p in pool.map(_partial_features, [base] * len(chunks), [event_store] * len(chunks), chunks)
+                     if not p.empty]
+        agg = pd.concat(parts, ignore_index=True).sort_values("seq", kind="stable") if parts else None
+    else:
+        agg = aggregate_feature_events(load_feature_events(base, event_store, fights))
+    if agg is None or agg.empty:
+        return pd.DataFrame([]).fillna(0)
+    return _feature_frame(report_code, agg, fight_dur)
+
+# rough resident cost of one loaded event: five int64 columns plus grouping/sorting temporaries
+EVENT_MEM_BYTES = 96
+
+@dataclass
+class StreamStats:
+    fights: int = 0
+    chunks: int = 0
+    rows: int = 0
+    largest_chunk_events: int = 0
+    peak_bytes: Optional[int] = None  # traced heap high-water above the build's start, else the process's peak RSS
+    peak_traced: bool = False
+    elapsed_s: float = 0.0
+
+    def summary(self) -> str:
+        peak = ""
+        if self.peak_bytes is not None:
+            peak = f", peak {self.peak_bytes / 2**20:.1f} MiB " + ("traced heap" if self.peak_traced else "RSS (process)")
+        return (f"{self.rows} rows from {self.fights} fights in {self.chunks} chunks "
+                f"(largest {self.largest_chunk_events} events) in {self.elapsed_s:.1f}s{peak}")
+
+def _budget_chunks(base: str, fight_ids: List[int], budget_bytes: float) -> List[Tuple[List[int], int]]:
+    """Consecutive fights grouped while their feature events fit the budget (a bigger or unrecorded fight goes alone)."""
+    from ..etl.manifest import load_manifest
+    manifest = load_manifest(base)
+    out: List[Tuple[List[int], int]] = []
+    cur: List[int] = []; n_cur = 0
+    for f in fight_ids:
+        entries = [e for e in (manifest.get((f, t)) for t in FEATURE_TYPES) if e is not None]
+        n = sum(e["count"] for e in entries) if entries else int(budget_bytes // EVENT_MEM_BYTES) + 1
+        if cur and (n_cur + n) * EVENT_MEM_BYTES > budget_bytes:
+            out.append((cur, n_cur)); cur, n_cur = [], 0
+        cur.append(f); n_cur += n
+    if cur:
+        out.append((cur, n_cur))
+    return out
+
+def stream_player_features(report_code: str, out_dir: str, out_path: str, event_store: str = "jsonl",
+                           memory_mb: float = 256, fights: Optional[Iterable[int]] = None,
+                           trace_memory: bool = False) -> StreamStats:
+    """Write player features to `out_path` a few fights at a time.
+
+    Fights are grouped in id order so each group's feature events (counted in
+    the dump manifest) fit roughly `memory_mb`; every group is loaded into
+    typed columns, aggregated and appended to the CSV before the next one is
+    read, so memory is bounded by the largest group rather than the report.
+    With `trace_memory` the peak of that memory (parse buffers and temporaries
+    included) is measured with tracemalloc, which slows every allocation in the
+    process while it runs; otherwise the stats carry the process's peak RSS.
+    Rows are the ones `build_player_features_vectorized` returns, ordered by
+    fight group instead of first appearance in the whole report.
+    """
+    from .. import tracing
+    t0 = time.perf_counter()
+    base = os.path.join(out_dir, report_code)
+    fight_dur = _fight_durations(base)
+    ids = sorted(fight_dur) if fights is None else sorted({int(f) for f in fights})
+    stats = StreamStats(fights=len(ids))
+    tmp = out_path + ".tmp"
+    header = True
+    heap = tracing.HeapPeak() if trace_memory else None
+    with heap or contextlib.nullcontext():
+        for chunk, n_events in _budget_chunks(base, ids, memory_mb * 2**20):
+            with tracing.span("features.chunk", "features", fights=len(chunk), events=n_events):
+                agg = aggregate_feature_events(load_feature_events(base, event_store, chunk))
+                if not agg.empty:
+                    df = _feature_frame(report_code, agg, fight_dur)
+                    df.to_csv(tmp, mode="w" if header else "a", header=header, index=False)
+                    header = False
+                    stats.rows += len(df)
+            stats.chunks += 1
+            stats.largest_chunk_events = max(stats.largest_chunk_events, n_events)
+    stats.peak_bytes, stats.peak_traced = (heap.peak_bytes, True) if heap else (tracing.peak_rss_bytes(), False)
+    if header:  # no rows at all: same file as an empty frame's to_csv
+        pd.DataFrame([]).to_csv(tmp, index=False)
+    os.replace(tmp, out_path)
+    stats.elapsed_s = time.perf_counter() - t0
+    return stats
+
+# count columns in FEATURE_TYPES order
+_COUNT_COLUMNS = ["n_casts", "n_damage_events", "n_heal_events", "n_deaths"]
+
+def _in_build_order(df: pd.DataFrame, base: str, event_store: str) -> pd.DataFrame:
+    """Rows of whole fights in the order a full build emits them.
+
+    That order is by `seq`: the first stream type a player shows up in (the
+    first nonzero count), then the position of the fight's stream of that
+    type in a full read, then first appearance in the stream, which rows of
+    the same type and fight already have among themselves.
+    """
+    first = (df[_COUNT_COLUMNS].to_numpy() > 0).argmax(axis=1)
+    rank = np.zeros(len(df), dtype=np.int64)
+    fight_ids = df["fight_id"]
+    for kind, data_type in enumerate(FEATURE_TYPES):
+        sel = first == kind
+        if sel.any():
+            pos = {_fight_of(p): i for i, p in enumerate(_stored_streams(base, event_store, data_type))}
+            rank[sel] = fight_ids[sel].map(pos).fillna(-1).to_numpy().astype(np.int64)
+    return (df.assign(_first=first, _rank=rank).sort_values(["_first", "_rank"], kind="stable")
+            .drop(columns=["_first", "_rank"]).reset_index(drop=True))
+
+def update_player_features(report_code: str, out_dir: str, fights: Iterable[int], event_store: str = "jsonl") -> pd.DataFrame:
+    """player_features.csv with the rows of `fights` recomputed and every other row kept as stored, in full-build order."""
+    fights = sorted({int(f) for f in fights})
+    path = os.path.join(out_dir, report_code, "player_features.csv")
+    fresh = build_player_features_vectorized(report_code, out_dir, event_store, fights=fights)
+    if not os.path.exists(path) or os.path.getsize(path) <= 1:
+        return fresh
+    kept = pd.read_csv(path)
+    kept = kept[~kept["fight_id"].isin(fights)]
+    if fresh.empty:
+        return kept.reset_index(drop=True)
+    return _in_build_order(pd.concat([kept, fresh], ignore_index=True), os.path.join(out_dir, report_code), event_store)
@@ -1,5 +1,6 @@
 from __future__ import annotations
 import os, csv
+from typing import Iterable, Optional
 import pandas as pd
 
 FEATURES = [
@@ -28,12 +29,15 @@ def _read_fight_durations(base_dir: str):
             out[fid] = dur_s
     return out
 
-def build_pull_features(report_code: str, out_dir: str) -> pd.DataFrame:
+def build_pull_features(report_code: str, out_dir: str, fights: Optional[Iterable[int]] = None) -> pd.DataFrame:
+    """One row per pull (only `fights`, if given; see `FightFilter.fight_ids`)."""
     base = os.path.join(out_dir, report_code)
     pf_path = os.path.join(base, "player_features.csv")
     if not os.path.exists(pf_path):
         raise FileNotFoundError(f"Missing {pf_path}. Run BuildPlayerFeatures first.")
     df = pd.read_csv(pf_path).fillna(0)
+    if fights is not None:
+        df = df[df["fight_id"].isin({int(f) for f in fights})]
 
     # fight durations
     fight_dur = _read_fight_durations(base)
@@ -0,0 +1,184 @@
+from __future__ import annotations
+import os, json, time, pathlib, logging, threading
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from .models import Report
+
+log = logging.getLogger(__name__)
+
+def parse_date_ms(value: Optional[str]) -> Optional[int]:
+    """ISO date or datetime (UTC unless it carries an offset) -> epoch ms."""
+    if not value:
+        return None
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+def select_reports(reports: List[Report], since_ms: Optional[int] = None, until_ms: Optional[int] = None,
+                   limit: Optional[int] = None) -> List[Report]:
+    """Reports starting in [since, until), newest first."""
+    out = [r for r in reports if (since_ms is None or r.startTime >= since_ms) and (until_ms is None or r.startTime < until_ms)]
+    out.sort(key=lambda r: (r.startTime, r.code), reverse=True)
+    return out[:limit] if limit else out
+
+def progress_path(output_dir: str, guild: str, slug: str, region: str) -> str:
+    safe = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in f"{region}-{slug}-{guild}".lower())
+    return os.path.join(output_dir, "_backfill", f"{safe}.json")
+
+class BackfillProgress:
+    """Per-report backfill state in a JSON file: "dumped" (events stored) or "done"; failures keep their error."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.reports: Dict[str, Dict[str, Any]] = json.load(f).get("reports", {})
+        except (OSError, ValueError):
+            self.reports = {}
+
+    def state(self, code: str) -> Optional[str]:
+        with self._lock:
+            return self.reports.get(code, {}).get("state")
+
+    def mark(self, code: str, state: str, error: Optional[str] = None) -> None:
+        with self._lock:
+            entry = {"state": state, "t": time.time()}
+            if error:
+                entry["error"] = error
+                entry["state"] = self.reports.get(code, {}).get("state") or state  # keep what was reached
+                entry["failed"] = True
+            self.reports[code] = entry
+            pathlib.Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"reports": self.reports}, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+
+@dataclass
+class BackfillStats:
+    reports: int = 0
+    done: int = 0
+    skipped: int = 0
+    failed: Dict[str, str] = field(default_factory=dict)
+    elapsed_s: float = 0.0
+
+    def summary(self) -> str:
+        failed = f", {len(self.failed)} failed" if self.failed else ""
+        return f"{self.done} of {self.reports} reports processed ({self.skipped} already done{failed}) in {self.elapsed_s:.1f}s"
+
+class Backfill:
+    """Runs events dump -> player features -> coaching notes for many reports.
+
+    Reports are taken newest first. Dumps run on `fetch_workers` threads and
+    every finished dump is handed to a separate pool of `cpu_workers` for the
+    feature and coaching steps, so downloads of older reports overlap with the
+    analysis of newer ones. Those threads mostly wait: the feature build itself
+    fans out to `feature_workers` processes (default: the config's). Each thread
+    runs its steps on its own `Orchestrator` (one run per report) over the shared
+    store and WCL client, so all requests share the client's rate limiter.
+    Progress is persisted after every step; a restarted backfill skips finished
+    reports and resumes dumps from their checkpoints.
+    """
+
+    def __init__(self, orch: Any, progress: BackfillProgress, fetch_workers: int = 1, cpu_workers: int = 2,
+                 feature_workers: Optional[int] = None) -> None:
+        self.orch = orch
+        self.progress = progress
+        self.fetch_workers = max(1, int(fetch_workers))
+        self.cpu_workers = max(1, int(cpu_workers))
+        self.feature_workers = feature_workers
+        self._local = threading.local()
+        self._cancel = threading.Event()
+
+    def _orch(self) -> Any:
+        """This thread's orchestrator, reset for a new run."""
+        orch = getattr(self._local, "orch", None)
+        if orch is None:
+            from .orchestrator import Orchestrator
+            ctx = self.orch.base_ctx
+            if self.feature_workers is not None:
+                ctx = replace(ctx, cfg=replace(ctx.cfg, feature_workers=max(1, int(self.feature_workers))))
+            orch = self._local.orch = Orchestrator(ctx, workers=self.orch.workers)
+        else:
+            orch.reset()
+        return orch
+
+    def _dump(self, code: str) -> None:
+        from .actions.core import EnsureReportEventsDumped
+        from .actions.prescribe import PrescribeImprovements
+        if self.progress.state(code) not in ("dumped", "done"):
+            orch = self._orch()
+            graph = orch.plan(PrescribeImprovements(code))  # the dump with just the types the analysis reads
+            dump = next((a for a in graph.actions.values() if isinstance(a, EnsureReportEventsDumped)), None)
+            if dump is None:
+                raise RuntimeError(f"the analysis graph of {code} has no events dump to backfill")
+            orch.ensure(dump)
+            self.progress.mark(code, "dumped")
+
+    def _analyze(self, code: str) -> None:
+        from .actions.prescribe import PrescribeImprovements
+        self._orch().ensure(PrescribeImprovements(code))
+        self.progress.mark(code, "done")
+
+    def run(self, reports: List[Report]) -> BackfillStats:
+        stats = BackfillStats(reports=len(reports))
+        t0 = time.perf_counter()
+        todo = [r for r in reports if self.progress.state(r.code) != "done"]
+        stats.skipped = len(reports) - len(todo)
+        lock = threading.Lock()
+        analysis: List[Future] = []
+        codes: Dict[Future, str] = {}
+
+        def failed(code: str, e: BaseException) -> None:
+            log.error("Backfill of %s failed: %s", code, e)
+            self.progress.mark(code, "failed", error=f"{type(e).__name__}: {e}")
+            with lock:
+                stats.failed[code] = str(e)
+
+        def analyzed(code: str) -> None:
+            if self._cancel.is_set():
+                return
+            try:
+                self._analyze(code)
+            except Exception as e:
+                failed(code, e)
+                return
+            with lock:
+                stats.done += 1
+            log.info("Backfilled %s (%d/%d)", code, stats.done + stats.skipped, stats.reports)
+
+        with ThreadPoolExecutor(self.cpu_workers, thread_name_prefix="backfill-cpu") as cpu, \
+             ThreadPoolExecutor(self.fetch_workers, thread_name_prefix="backfill-fetch") as fetch:
+            def dumped(code: str) -> None:
+                if self._cancel.is_set():
+                    return
+                try:
+                    self._dump(code)
+                except Exception as e:
+                    failed(code, e)
+                    return
+                with lock:
+                    if not self._cancel.is_set():
+                        analysis.append(cpu.submit(analyzed, code))
+
+            try:
+                fetches = [fetch.submit(dumped, r.code) for r in todo]  # FIFO pool: newest first
+                for f, r in zip(fetches, todo):
+                    codes[f] = r.code
+                wait(fetches)
+                with lock:
+                    pending = list(analysis)
+                wait(pending)
+            except BaseException:  # Ctrl-C: finish the steps in flight, start nothing new
+                self._cancel.set()
+                with lock:
+                    queued = list(codes) + analysis
+                for f in queued:
+                    f.cancel()
+                raise
+        stats.elapsed_s = time.perf_counter() - t0
+        return stats
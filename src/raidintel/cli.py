@@ -1,18 +1,38 @@
 from __future__ import annotations
+import os, time
+from typing import List, Optional
 import typer
 from .config import WCLConfig
 from .wcl_client import WCLClient
+from .response_cache import ResponseCache
 from .repository import WCLRepository
+from .report_index import ReportIndex
 from .etl.pipeline import ETLPipeline
-from .storage import ArtifactStore
+from .etl.fetch import ConcurrentEventFetcher
+from .storage import open_artifact_store
 from .orchestrator import Context, Orchestrator
 from .actions.core import AnalyzeGuildLatest, JustGetGuildData, EnsureReportEventsDumped, EnsureReportHeader, EnsureReportInGuild
-from .actions.prescribe import BuildPlayerFeatures, PrescribeImprovements
+from .fight_filter import FightFilter
+from .actions.prescribe import BuildDeathContext, BuildPlayerFeatures, PrescribeImprovements
 from .graph import build_graph, render_ascii
+from . import tracing
 
 app = typer.Typer(add_completion=False, help="RaidIntel CLI")
 
-def _ctx(cfg_path: str) -> Context:
+@app.callback()
+def main(ctx: typer.Context,
+         trace: Optional[str] = typer.Option(None, help="Write a Chrome trace / Perfetto JSON of the run to this file"),
+         profile: bool = typer.Option(False, help="Print a per-action timing and I/O summary at the end (streamed feature builds also trace their heap peak)")):
+    if not (trace or profile):
+        return
+    tracer = tracing.enable()
+    def finish() -> None:
+        if trace:
+            typer.echo(f"Trace written to {tracer.write_chrome_trace(trace)}", err=True)
+        tracer.print_summary()
+    ctx.call_on_close(finish)
+
+def _cfg(cfg_path: str) -> WCLConfig:
     cfg_path_lower = cfg_path.lower()
     if cfg_path_lower.endswith(".json"):
         cfg = WCLConfig.from_json(cfg_path)
@@ -20,12 +40,45 @@ def _ctx(cfg_path: str) -> Context:
         cfg = WCLConfig.from_toml(cfg_path)
 
     cfg.validate()
-    client = WCLClient(site=cfg.site, client_id=cfg.client_id, client_secret=cfg.client_secret)
-    repo = WCLRepository(client)
-    etl = ETLPipeline(cfg.output_dir)
-    store = ArtifactStore(cfg.output_dir)
+    return cfg
+
+def _cache(cfg: WCLConfig) -> Optional[ResponseCache]:
+    return ResponseCache(os.path.join(cfg.output_dir, "_cache", "gql"), cfg.cache_max_mb * 1024 * 1024) if cfg.cache_max_mb > 0 else None
+
+def _ctx(cfg_path: str, offline: bool = False) -> Context:
+    cfg = _cfg(cfg_path)
+    cache = _cache(cfg)
+    index = ReportIndex(os.path.join(cfg.output_dir, "reports.sqlite"))
+    if offline:
+        from .planner import OfflineRepository
+        repo = OfflineRepository(cfg.output_dir, index=index, cache=cache)
+    else:
+        client = WCLClient(site=cfg.site, client_id=cfg.client_id, client_secret=cfg.client_secret, cache=cache)
+        repo = WCLRepository(client, listing_ttl=cfg.cache_listing_ttl, index=index)
+    time_index: List[str] = []
+    if cfg.event_time_index:  # just the streams window queries read
+        from .analysis.death_context import DEATH_CONTEXT_FIELDS
+        time_index = list(DEATH_CONTEXT_FIELDS)
+    etl = ETLPipeline(cfg.output_dir, event_store=cfg.event_store, json_archive=cfg.event_json_archive,
+                      time_index=time_index)
+    store = open_artifact_store(cfg.output_dir, cfg.artifact_store)
     return Context(store=store, repo=repo, etl=etl, cfg=cfg)
 
+def _root_action(c: Context, action: str, code: Optional[str] = None):
+    keep = FightFilter.from_config(c.cfg)
+    per_report = {"dump-report": lambda: EnsureReportEventsDumped(code, c.cfg.event_types, fight_filter=keep),
+                  "build-player-features": lambda: BuildPlayerFeatures(code, fight_filter=keep),
+                  "prescribe": lambda: PrescribeImprovements(code), "death-context": lambda: BuildDeathContext(code, fight_filter=keep)}
+    if action == "analyze-guild-latest":
+        return AnalyzeGuildLatest(c.cfg.guild, c.cfg.server_slug, c.cfg.server_region)
+    if action == "just-get-guild-data":
+        return JustGetGuildData(c.cfg.guild, c.cfg.server_slug, c.cfg.server_region)
+    if action in per_report:
+        if not code:
+            raise typer.BadParameter(f"{action} needs a report code")
+        return per_report[action]()
+    raise typer.BadParameter("Unknown action")
+
 @app.command()
 def ensure_report_header(code: str, config: str = typer.Option("examples/raidintel.toml")):
     c = _ctx(config); Orchestrator(c).ensure(EnsureReportHeader(code))
@@ -45,6 +98,16 @@ def list_reports(config: str = typer.Option("examples/raidintel.toml")):
     for r in reps:
         typer.echo(f"{r.code}\t{r.title}\thttps://{c.cfg.site}.warcraftlogs.com/reports/{r.code}")
 
+@app.command()
+def cache_stats(config: str = typer.Option("examples/raidintel.toml")):
+    """Show the size of the on-disk GraphQL response cache."""
+    cache = _cache(_cfg(config))
+    if cache is None:
+        typer.echo("Response cache is disabled (cache_max_mb = 0)")
+        return
+    s = cache.stats()
+    typer.echo(f"{cache.root}: {s['entries']} entries, {s['bytes'] / 2**20:.1f} MiB of {cache.max_bytes / 2**20:.0f} MiB")
+
 @app.command()
 def dump_last_report(config: str = typer.Option("examples/raidintel.toml")):
     c = _ctx(config)
@@ -52,18 +115,19 @@ def dump_last_report(config: str = typer.Option("examples/raidintel.toml")):
     if not reps: raise typer.Exit(code=1)
     latest = max(reps, key=lambda r: r.startTime)
     fights = c.repo.get_fights(latest.code)
-    ETLPipeline(c.cfg.output_dir).write_fights_csv(latest.code, fights)
-    for ft in fights:
-        for et in c.cfg.event_types:
-            ev = c.repo.stream_events(latest.code, ft.id, float(ft.startTime), float(ft.endTime), et)
-            ETLPipeline(c.cfg.output_dir).dump_events_jsonl(latest.code, ft, et, ev)
-    typer.echo(f"Dumped events for {latest.code}")
+    c.etl.write_fights_csv(latest.code, fights)
+    fights = FightFilter.from_config(c.cfg).apply(fights)
+    fetcher = ConcurrentEventFetcher(c.repo, c.etl, max_in_flight=c.cfg.max_in_flight, batch_size=c.cfg.events_batch_size,
+                                     resume=c.cfg.resume_dumps, mode=c.cfg.fetch_mode,
+                                     shards=c.cfg.fight_shards, shard_min_s=c.cfg.shard_min_s)
+    stats = fetcher.dump_report(latest.code, fights, c.cfg.event_types)
+    typer.echo(f"Dumped events for {latest.code}: {stats.summary()}")
 
 @app.command()
 def dump_report(code: str, config: str = typer.Option("examples/raidintel.toml")):
     c = _ctx(config)
     orch = Orchestrator(c)
-    orch.ensure(EnsureReportEventsDumped(code, c.cfg.event_types))
+    orch.ensure(EnsureReportEventsDumped(code, c.cfg.event_types, fight_filter=FightFilter.from_config(c.cfg)))
 
 @app.command()
 def run(action: str, config: str = typer.Option("examples/raidintel.toml")):
@@ -76,20 +140,69 @@ def run(action: str, config: str = typer.Option("examples/raidintel.toml")):
         raise typer.BadParameter("Unknown action")
 
 @app.command("print-graph")
-def print_graph(action: str, config: str = typer.Option("examples/raidintel.toml")):
+def print_graph(action: str, code: Optional[str] = typer.Argument(None), config: str = typer.Option("examples/raidintel.toml"),
+                annotate: bool = typer.Option(False, help="Show each node's status and duration from the last run")):
     c = _ctx(config)
-    if action == "analyze-guild-latest":
-        root = AnalyzeGuildLatest(c.cfg.guild, c.cfg.server_slug, c.cfg.server_region)
-    elif action == "just-get-guild-data":
-        root = JustGetGuildData(c.cfg.guild, c.cfg.server_slug, c.cfg.server_region)
-    else:
-        raise typer.BadParameter("Unknown action")
+    root = _root_action(c, action, code)
     nodes, edges, rid = build_graph(root, c)
-    print(render_ascii(nodes, edges, rid))
+    notes = None
+    if annotate:
+        notes = {nid: f"{r['status']}, {r['duration_s']:.2f}s" for nid, r in tracing.load_run_log(c.cfg.output_dir).items()}
+    print(render_ascii(nodes, edges, rid, notes))
+
+@app.command()
+def plan(action: str, code: Optional[str] = typer.Argument(None), config: str = typer.Option("examples/raidintel.toml")):
+    """Show what ACTION would build and estimate its cost, without network access."""
+    from .planner import make_plan, print_plan
+    c = _ctx(config, offline=True)
+    print_plan(make_plan(Orchestrator(c), _root_action(c, action, code)))
+
+@app.command()
+def backfill(guild: Optional[str] = typer.Option(None, help="Guild name (default: from config)"),
+             server_slug: Optional[str] = typer.Option(None), server_region: Optional[str] = typer.Option(None),
+             since: Optional[str] = typer.Option(None, help="Only reports starting on or after this ISO date"),
+             until: Optional[str] = typer.Option(None, help="Only reports starting before this ISO date"),
+             limit: Optional[int] = typer.Option(None, help="At most this many reports (newest first)"),
+             fetch_workers: int = typer.Option(1, help="Reports downloading at the same time"),
+             cpu_workers: int = typer.Option(2, help="Reports being analyzed at the same time"),
+             feature_workers: Optional[int] = typer.Option(None, help="Processes per player-feature build (default: from config)"),
+             config: str = typer.Option("examples/raidintel.toml")):
+    """Dump, build features for and prescribe every report of a guild, newest first; resumable."""
+    from .backfill import Backfill, BackfillProgress, parse_date_ms, progress_path, select_reports
+    c = _ctx(config)
+    g, s, r = guild or c.cfg.guild, server_slug or c.cfg.server_slug, server_region or c.cfg.server_region
+    reps = select_reports(c.repo.list_guild_reports(g, s, r), parse_date_ms(since), parse_date_ms(until), limit)
+    progress = BackfillProgress(progress_path(c.cfg.output_dir, g, s, r))
+    typer.echo(f"Backfilling {len(reps)} reports of {g} ({s}, {r.upper()}); progress in {progress.path}")
+    stats = Backfill(Orchestrator(c), progress, fetch_workers=fetch_workers, cpu_workers=cpu_workers,
+                     feature_workers=feature_workers).run(reps)
+    typer.echo(stats.summary())
+    for code, err in stats.failed.items():
+        typer.echo(f"  {code}: {err}", err=True)
+    if stats.failed:
+        raise typer.Exit(code=1)
+
+@app.command()
+def watch(code: str, interval: float = typer.Option(10.0, help="Seconds between polls of the report's fights"),
+          max_polls: Optional[int] = typer.Option(None, help="Stop after this many polls (default: until Ctrl-C)"),
+          config: str = typer.Option("examples/raidintel.toml")):
+    """Follow a live report: append new events as pulls end and keep coaching.md current."""
+    from .live import LiveTail
+    c = _ctx(config)
+    typer.echo(f"Watching {code} every {interval:.0f}s (Ctrl-C to stop)")
+    try:
+        LiveTail(c, code).watch(interval, max_polls, on_poll=lambda res: typer.echo(f"{time.strftime('%H:%M:%S')} {res.summary()}"))
+    except KeyboardInterrupt:
+        typer.echo("Stopped")
 
 @app.command()
 def build_player_features_cmd(code: str, config: str = typer.Option("examples/raidintel.toml")):
-    c = _ctx(config); Orchestrator(c).ensure(BuildPlayerFeatures(code)); print("player_features.csv written")
+    c = _ctx(config); Orchestrator(c).ensure(_root_action(c, "build-player-features", code)); print("player_features.csv written")
+
+@app.command()
+def death_context(code: str, config: str = typer.Option("examples/raidintel.toml")):
+    """Incoming damage, healing received and defensives used in the 10s before each death."""
+    c = _ctx(config); Orchestrator(c).ensure(_root_action(c, "death-context", code)); print("death_context.csv written")
 
 @app.command()
 def prescribe(code: str, config: str = typer.Option("examples/raidintel.toml")):
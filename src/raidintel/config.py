@@ -3,12 +3,19 @@ from dataclasses import dataclass, field
 from typing import List
 import os
 import json
+from .repository import EVENTS_BATCH_SIZE
 
 try:
     import tomllib  # PY>=3.11
 except ModuleNotFoundError:
     import tomli as tomllib  # type: ignore
 
+def _as_bool(v) -> bool:
+    # env overrides arrive as strings
+    if isinstance(v, str):
+        return v.strip().lower() in ("1", "true", "yes", "on")
+    return bool(v)
+
 @dataclass
 class WCLConfig:
     client_id: str
@@ -19,6 +26,26 @@ class WCLConfig:
     server_region: str = ""
     output_dir: str = "out"
     event_types: List[str] = field(default_factory=lambda: ["Casts","DamageDone","Healing","Buffs","Debuffs","Deaths","Resources","Threat"])
+    max_in_flight: int = 4  # concurrent (fight, data_type) event streams
+    events_batch_size: int = EVENTS_BATCH_SIZE  # aliased event streams per GraphQL request (1 = one stream per request)
+    event_store: str = "jsonl"  # or "parquet": events_parquet/dataType=*/fight=*/, or "binary": typed records in events_bin/<type>/
+    event_json_archive: bool = False  # binary store: also keep the original JSON, gzipped, in events_json/
+    event_time_index: bool = False  # index the streams window queries read (death context) by (source/target, timestamp) at dump time
+    fetch_mode: str = "per-fight"  # or "report-wide": one stream per data type over all fights, split locally
+    fight_shards: int = 4  # time-range shards streamed in parallel for long fights (1 = off)
+    shard_min_s: int = 180  # only fights at least this long are sharded
+    resume_dumps: bool = True  # an unfinished dump skips committed event files and continues interrupted ones; refreshes re-download
+    cache_max_mb: int = 512  # on-disk GraphQL response cache under <output_dir>/_cache (0 = disabled)
+    cache_listing_ttl: int = 300  # seconds a guild report listing stays cached
+    orchestrator_workers: int = 4  # actions of the dependency graph run concurrently (1 = serial)
+    artifact_store: str = "sqlite"  # or "json": one file per artifact under <output_dir>/_artifacts
+    feature_workers: int = 1  # processes building player features, fights split between them (1 = in-process)
+    feature_memory_mb: int = 0  # > 0: build player features a few fights at a time within about this much memory
+    fight_bosses_only: bool = False  # skip trash fights (no encounter) before any events are fetched
+    fight_outcome: str = "all"  # or "kills" / "wipes"
+    fight_difficulties: List[int] = field(default_factory=list)  # e.g. [4, 5]; empty = any
+    fight_encounters: List[int] = field(default_factory=list)  # encounter ids; empty = any
+    fight_min_duration_s: float = 0  # skip shorter pulls (resets)
 
     @staticmethod
     def from_toml(path: str) -> "WCLConfig":
@@ -35,6 +62,26 @@ class WCLConfig:
             server_region=str(env_override("server_region", "")).lower(),
             output_dir=env_override("output_dir", "out"),
             event_types=env_override("event_types", ["Casts","DamageDone","Healing","Buffs","Debuffs","Deaths","Resources","Threat"]),
+            max_in_flight=int(env_override("max_in_flight", 4)),
+            events_batch_size=int(env_override("events_batch_size", EVENTS_BATCH_SIZE)),
+            event_store=str(env_override("event_store", "jsonl")).lower(),
+            event_json_archive=_as_bool(env_override("event_json_archive", False)),
+            event_time_index=_as_bool(env_override("event_time_index", False)),
+            fetch_mode=str(env_override("fetch_mode", "per-fight")).lower(),
+            fight_shards=int(env_override("fight_shards", 4)),
+            shard_min_s=int(env_override("shard_min_s", 180)),
+            resume_dumps=_as_bool(env_override("resume_dumps", True)),
+            cache_max_mb=int(env_override("cache_max_mb", 512)),
+            cache_listing_ttl=int(env_override("cache_listing_ttl", 300)),
+            orchestrator_workers=int(env_override("orchestrator_workers", 4)),
+            artifact_store=str(env_override("artifact_store", "sqlite")).lower(),
+            feature_workers=int(env_override("feature_workers", 1)),
+            feature_memory_mb=int(env_override("feature_memory_mb", 0)),
+            fight_bosses_only=_as_bool(env_override("fight_bosses_only", False)),
+            fight_outcome=str(env_override("fight_outcome", "all")).lower(),
+            fight_difficulties=env_override("fight_difficulties", []),
+            fight_encounters=env_override("fight_encounters", []),
+            fight_min_duration_s=float(env_override("fight_min_duration_s", 0)),
         )
 
     @staticmethod
@@ -54,6 +101,26 @@ class WCLConfig:
             event_types=env_override("event_types", [
                 "Casts","DamageDone","Healing","Buffs","Debuffs","Deaths","Resources","Threat"
             ]),
+            max_in_flight=int(env_override("max_in_flight", 4)),
+            events_batch_size=int(env_override("events_batch_size", EVENTS_BATCH_SIZE)),
+            event_store=str(env_override("event_store", "jsonl")).lower(),
+            event_json_archive=_as_bool(env_override("event_json_archive", False)),
+            event_time_index=_as_bool(env_override("event_time_index", False)),
+            fetch_mode=str(env_override("fetch_mode", "per-fight")).lower(),
+            fight_shards=int(env_override("fight_shards", 4)),
+            shard_min_s=int(env_override("shard_min_s", 180)),
+            resume_dumps=_as_bool(env_override("resume_dumps", True)),
+            cache_max_mb=int(env_override("cache_max_mb", 512)),
+            cache_listing_ttl=int(env_override("cache_listing_ttl", 300)),
+            orchestrator_workers=int(env_override("orchestrator_workers", 4)),
+            artifact_store=str(env_override("artifact_store", "sqlite")).lower(),
+            feature_workers=int(env_override("feature_workers", 1)),
+            feature_memory_mb=int(env_override("feature_memory_mb", 0)),
+            fight_bosses_only=_as_bool(env_override("fight_bosses_only", False)),
+            fight_outcome=str(env_override("fight_outcome", "all")).lower(),
+            fight_difficulties=env_override("fight_difficulties", []),
+            fight_encounters=env_override("fight_encounters", []),
+            fight_min_duration_s=float(env_override("fight_min_duration_s", 0)),
         )
 
     def validate(self) -> None:
@@ -0,0 +1,173 @@
+from __future__ import annotations
+import os, ast, glob, gzip, json, shutil, struct, pathlib, logging
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple
+import numpy as np
+from ..models import Event
+
+log = logging.getLogger(__name__)
+
+# One fixed-width record per event, typed per data type. Each stream is a .npy
+# file (`events_bin/<type>/fight_<id>.npy`) that `np.load(..., mmap_mode="r")`
+# maps straight into a record array. Fields outside the schema are dropped;
+# `json_archive` in ETLPipeline keeps the original JSON next to it.
+BASE_FIELDS = [("timestamp", "<i8"), ("fight", "<i4"), ("type", "u1"),
+               ("sourceID", "<i4"), ("targetID", "<i4"), ("abilityGameID", "<i4")]
+_DAMAGE = [("amount", "<i8"), ("absorbed", "<i8"), ("overkill", "<i8"), ("hitType", "i1"), ("tick", "i1")]
+EXTRA_FIELDS: Dict[str, List[tuple]] = {
+    "DamageDone": _DAMAGE,
+    "DamageTaken": _DAMAGE,
+    "Healing": [("amount", "<i8"), ("overheal", "<i8"), ("absorbed", "<i8"), ("hitType", "i1"), ("tick", "i1")],
+    "Buffs": [("stack", "<i4")],
+    "Debuffs": [("stack", "<i4")],
+    "Deaths": [("killerID", "<i4"), ("killingAbilityGameID", "<i4")],
+    "Resources": [("resourceChange", "<i8"), ("resourceChangeType", "<i4"), ("waste", "<i8")],
+    "Interrupts": [("extraAbilityGameID", "<i4")],
+    "Dispels": [("extraAbilityGameID", "<i4")],
+}
+# `type` is stored as an index into this table (0 = anything else)
+EVENT_TYPES = ("", "cast", "begincast", "damage", "heal", "absorbed", "healabsorbed", "applybuff", "applybuffstack",
+               "removebuff", "removebuffstack", "refreshbuff", "applydebuff", "applydebuffstack", "removedebuff",
+               "removedebuffstack", "refreshdebuff", "death", "resurrect", "resourcechange", "energize", "drain",
+               "interrupt", "dispel", "summon", "combatantinfo")
+TYPE_CODES = {t: i for i, t in enumerate(EVENT_TYPES) if t}
+ROWS_PER_WRITE = 65536
+_MAGIC = b"\x93NUMPY\x01\x00"
+
+def event_dtype(data_type: str) -> np.dtype:
+    return np.dtype(BASE_FIELDS + EXTRA_FIELDS.get(data_type, []))
+
+def null_of(dtype: Any) -> int:
+    """Missing integer fields hold the smallest value of their type (-1 is a real id: the environment)."""
+    return int(np.iinfo(dtype).min)
+
+def binary_dir(report_dir: str) -> str:
+    return os.path.join(report_dir, "events_bin")
+
+def binary_path(report_dir: str, fight_id: int, data_type: str) -> str:
+    return os.path.join(binary_dir(report_dir), data_type, f"fight_{fight_id}.npy")
+
+def binary_streams(report_dir: str, data_type: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(binary_dir(report_dir), data_type, "fight_*.npy")),
+                  key=lambda p: int(os.path.basename(p)[6:-4]))
+
+def archive_path(report_dir: str, fight_id: int, data_type: str) -> str:
+    return os.path.join(report_dir, "events_json", f"fight_{fight_id}_{data_type}.jsonl.gz")
+
+def _header(dtype: np.dtype, n: int) -> bytes:
+    """.npy v1.0 header padded to a length that only depends on the dtype, so appends rewrite it in place."""
+    text = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (np.lib.format.dtype_to_descr(dtype), n)
+    width = len(text) - len(str(n)) + 20  # room for any row count
+    size = -(-(len(_MAGIC) + 2 + width + 1) // 64) * 64
+    body = text.ljust(size - len(_MAGIC) - 2 - 1) + "\n"
+    return _MAGIC + struct.pack("<H", len(body)) + body.encode("latin1")
+
+def _column(values: List[Any], null: int) -> List[int]:
+    out = []
+    for v in values:
+        if isinstance(v, bool):
+            out.append(int(v))
+        elif isinstance(v, int) or (isinstance(v, float) and v.is_integer()):
+            out.append(int(v))
+        else:
+            out.append(null)
+    return out
+
+def project(events: Sequence[Event], data_type: str, fight_id: int) -> np.ndarray:
+    """Events of one stream as records of `event_dtype(data_type)`."""
+    dt = event_dtype(data_type)
+    arr = np.empty(len(events), dtype=dt)
+    for name in dt.names:
+        if name == "fight":
+            arr[name] = fight_id
+        elif name == "type":
+            arr[name] = [TYPE_CODES.get(ev.get("type"), 0) for ev in events]
+        else:
+            arr[name] = _column([ev.get(name) for ev in events], null_of(dt[name]))
+    return arr
+
+class BinaryEventWriter:
+    """Appends projected events to `<path>.tmp`; `close()` writes the row count and renames it into place."""
+
+    def __init__(self, path: str, data_type: str, fight_id: int) -> None:
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path, self.tmp = path, path + ".tmp"
+        self.dtype = event_dtype(data_type)
+        self.data_type, self.fight_id = data_type, fight_id
+        self.count = 0
+        self._fh = open(self.tmp, "wb")
+        self._fh.write(_header(self.dtype, 0))
+
+    def write(self, events: Sequence[Event]) -> None:
+        if events:
+            self._fh.write(project(events, self.data_type, self.fight_id).tobytes())
+            self.count += len(events)
+
+    def close(self) -> str:
+        self._fh.seek(0)
+        self._fh.write(_header(self.dtype, self.count))
+        self._fh.close()
+        os.replace(self.tmp, self.path)
+        return self.path
+
+def write_events_binary(path: str, data_type: str, fight_id: int, events: Iterable[Event]) -> int:
+    """Write one stream in chunks of ROWS_PER_WRITE; returns the row count."""
+    w = BinaryEventWriter(path, data_type, fight_id)
+    buf: List[Event] = []
+    for ev in events:
+        buf.append(ev)
+        if len(buf) >= ROWS_PER_WRITE:
+            w.write(buf); buf = []
+    w.write(buf)
+    w.close()
+    return w.count
+
+def append_events_binary(path: str, data_type: str, fight_id: int, events: Sequence[Event]) -> int:
+    """Add records after the ones the header counts, in place; returns the new row count.
+
+    Records and header are two writes: a crash between them leaves bytes past
+    the counted rows, which the next append cuts off instead of counting.
+    """
+    dtype = event_dtype(data_type)
+    with open(path, "r+b") as fh:
+        size, n = _read_header(fh)
+        fh.seek(size + n * dtype.itemsize)
+        fh.truncate()
+        fh.write(project(events, data_type, fight_id).tobytes())
+        fh.seek(0)
+        fh.write(_header(dtype, n + len(events)))
+    return n + len(events)
+
+def _read_header(fh: Any) -> Tuple[int, int]:
+    """(header size in bytes, row count) of an open stream."""
+    fh.seek(len(_MAGIC))
+    (hlen,) = struct.unpack("<H", fh.read(2))
+    return len(_MAGIC) + 2 + hlen, int(ast.literal_eval(fh.read(hlen).decode("latin1"))["shape"][0])
+
+def read_count(path: str) -> int:
+    """Row count from the header alone."""
+    with open(path, "rb") as fh:
+        return _read_header(fh)[1]
+
+def open_events(path: str) -> np.recarray:
+    """A stored stream memory-mapped read-only as a record array."""
+    if read_count(path) == 0:  # nothing to map
+        return np.empty(0, dtype=np.load(path).dtype).view(np.recarray)
+    return np.load(path, mmap_mode="r").view(np.recarray)
+
+def _lines(jsonl_path: str) -> Iterator[Event]:
+    with open(jsonl_path, "r", encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                yield json.loads(line)
+
+def jsonl_to_binary(jsonl_path: str, path: str, data_type: str, fight_id: int) -> int:
+    n = write_events_binary(path, data_type, fight_id, _lines(jsonl_path))
+    log.info("Converted %s events to %s", n, path)
+    return n
+
+def archive_jsonl(jsonl_path: str, path: str) -> None:
+    """Keep a staged JSONL stream as gzip (appends add gzip members, which readers see as one stream)."""
+    pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(jsonl_path, "rb") as src, gzip.open(path + ".tmp", "wb", compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+    os.replace(path + ".tmp", path)
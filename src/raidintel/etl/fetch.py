@@ -0,0 +1,280 @@
+from __future__ import annotations
+import time, bisect, logging, threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_EXCEPTION, wait
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from .. import tracing
+from ..models import Fight, Event
+from ..repository import EVENTS_BATCH_SIZE, EventCursor
+
+log = logging.getLogger(__name__)
+
+class FetchCancelled(RuntimeError):
+    pass
+
+@dataclass
+class FetchStats:
+    streams: int = 0
+    events: int = 0
+    skipped: int = 0
+    elapsed_s: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(self, n_events: int) -> None:
+        with self._lock:
+            self.streams += 1
+            self.events += n_events
+
+    def skip(self, n_streams: int) -> None:
+        with self._lock:
+            self.skipped += n_streams
+
+    @property
+    def events_per_s(self) -> float:
+        return self.events / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+    def summary(self) -> str:
+        skipped = f", {self.skipped} already complete" if self.skipped else ""
+        return f"{self.streams} streams, {self.events} events in {self.elapsed_s:.1f}s ({self.events_per_s:.0f} events/s){skipped}"
+
+class _ShardGroup:
+    """Counts down the time-range shards of one stream; the last one to finish merges."""
+
+    def __init__(self, remaining: int) -> None:
+        self.remaining = remaining
+        self._lock = threading.Lock()
+
+    def shard_done(self) -> bool:
+        with self._lock:
+            self.remaining -= 1
+            return self.remaining == 0
+
+@dataclass
+class _Task:
+    fight: Fight
+    data_type: str
+    start: float
+    end: float
+    shard: int = 0
+    shards: int = 1
+    group: Optional[_ShardGroup] = None
+
+class ConcurrentEventFetcher:
+    """Downloads (fight, data_type) event streams of a report on a bounded worker pool.
+
+    Each stream is paginated sequentially (cursors depend on the previous page),
+    but up to `max_in_flight` workers run at once. With `batch_size` > 1 every
+    worker owns a lane of streams and pages them together through
+    `WCLRepository.stream_events_batched`, so one request carries up to
+    `batch_size` streams. Files are committed atomically by the ETL writers.
+
+    With `mode="report-wide"` each data type is instead streamed once over the
+    whole report (all fight IDs in one `fightIDs` filter) and the events are
+    routed into the same per-fight files; on reports with many short pulls this
+    replaces hundreds of tiny requests with a few full pages.
+
+    Fights of at least `shard_min_s` seconds are split into `shards` equal time
+    ranges that are streamed as independent tasks and concatenated in order once
+    all of them are committed, so the page walk of a long pull is parallel too.
+
+    With `resume=True` streams that were already committed are skipped and
+    interrupted ones continue from their last checkpointed page.
+    """
+
+    MODES = ("per-fight", "report-wide")
+
+    def __init__(self, repo: Any, etl: Any, max_in_flight: int = 4, batch_size: int = EVENTS_BATCH_SIZE, resume: bool = True,
+                 mode: str = "per-fight", shards: int = 1, shard_min_s: float = 180.0) -> None:
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown fetch mode {mode!r}; expected one of {', '.join(self.MODES)}")
+        self.repo = repo
+        self.etl = etl
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.batch_size = max(1, int(batch_size))
+        self.resume = resume
+        self.mode = mode
+        self.shards = max(1, int(shards))
+        self.shard_min_s = shard_min_s
+        self._cancel = threading.Event()
+
+    def _check_cancel(self) -> None:
+        if self._cancel.is_set():
+            raise FetchCancelled("event download cancelled")
+
+    def _plan(self, fight: Fight) -> List[Tuple[float, float]]:
+        """Time ranges to stream for a fight: the whole fight, or `shards` equal slices of a long one."""
+        st, en = float(fight.startTime), float(fight.endTime)
+        n = self.shards if (en - st) >= self.shard_min_s * 1000.0 else 1
+        if n <= 1:
+            return [(st, en)]
+        step = (en - st) / n
+        bounds = [st + k * step for k in range(n)] + [en]
+        return [(bounds[k], bounds[k + 1]) for k in range(n)]
+
+    def _write(self, task: _Task, w: Any, events: List[Event], cursor: Optional[float]) -> None:
+        if task.shards > 1:
+            # shards are half-open [start, end) (the last one closed), so boundary events land exactly once
+            last = task.shard == task.shards - 1
+            events = [ev for ev in events
+                      if task.start <= ev.get("timestamp", 0) and (ev.get("timestamp", 0) < task.end or last)]
+        w.write(events, cursor=cursor)
+
+    def _finish(self, code: str, task: _Task, w: Any, stats: FetchStats) -> None:
+        w.commit()
+        if task.group is None:
+            stats.add(w.count)
+        elif task.group.shard_done():
+            merged = self.etl.merge_event_shards(code, task.fight, task.data_type, task.shards)
+            stats.add(merged.count)
+
+    def _open(self, code: str, task: _Task) -> Any:
+        shard = task.shard if task.shards > 1 else None
+        return self.etl.open_events_writer(code, task.fight, task.data_type, resume=self.resume, shard=shard)
+
+    def _dump_one(self, code: str, task: _Task, stats: FetchStats) -> None:
+        w = self._open(code, task)
+        try:
+            start = w.cursor if w.cursor is not None else task.start
+            for events, nxt in self.repo.stream_event_pages(code, task.fight.id, start, task.end, task.data_type):
+                self._write(task, w, events, nxt)
+                self._check_cancel()
+        except BaseException:
+            w.abort()
+            raise
+        self._finish(code, task, w, stats)
+
+    def _dump_lane(self, code: str, tasks: List[_Task], stats: FetchStats) -> None:
+        cursors = []
+        for t in tasks:
+            shard = t.shard if t.shards > 1 else None
+            state = self.etl.load_events_checkpoint(code, t.fight.id, t.data_type, shard) if self.resume else None
+            cursors.append(EventCursor(t.fight.id, t.data_type, float(state["cursor"]) if state else t.start, t.end))
+        writers: Dict[int, Any] = {}
+        try:
+            for i, events, done in self.repo.stream_events_batched(code, cursors, batch_size=self.batch_size):
+                w = writers.get(i)
+                if w is None:
+                    w = writers[i] = self._open(code, tasks[i])
+                self._write(tasks[i], w, events, None if done else cursors[i].start)
+                if done:
+                    self._finish(code, tasks[i], writers.pop(i), stats)
+                self._check_cancel()
+        finally:
+            for w in writers.values():
+                w.abort()
+
+    def _dump_type_report_wide(self, code: str, fights: List[Fight], data_type: str, stats: FetchStats) -> None:
+        fights = sorted(fights, key=lambda f: f.startTime)
+        by_id = {f.id: f for f in fights}
+        starts = [f.startTime for f in fights]
+        # fights still to write; resumed writers know how far they got
+        todo = [f for f in fights if not (self.resume and self.etl.events_complete(code, f.id, data_type))]
+        stats.skip(len(fights) - len(todo))
+        if not todo:
+            return
+        cursors: Dict[int, float] = {}
+        for f in todo:
+            state = self.etl.load_events_checkpoint(code, f.id, data_type) if self.resume else None
+            cursors[f.id] = float(state["cursor"]) if state else float(f.startTime)
+        wanted = {f.id for f in todo}
+        open_fights = list(todo)  # ordered by startTime; committed as the stream moves past them
+        closed: Dict[int, int] = {}  # committed fight -> events that still arrived for it
+        writers: Dict[int, Any] = {}
+
+        def route(ev: Event) -> Optional[int]:
+            fid = ev.get("fight")
+            if fid in by_id:
+                return fid
+            ts = ev.get("timestamp", 0)
+            k = bisect.bisect_right(starts, ts) - 1
+            return fights[k].id if k >= 0 and ts <= fights[k].endTime else None
+
+        def writer(f: Fight) -> Any:
+            w = writers.get(f.id)
+            if w is None:
+                w = writers[f.id] = self.etl.open_events_writer(code, f, data_type, resume=self.resume)
+            return w
+
+        def close_until(cursor: Optional[float]) -> None:
+            while open_fights and (cursor is None or open_fights[0].endTime < cursor):
+                f = open_fights.pop(0)
+                w = writer(f)
+                w.commit()
+                closed[f.id] = 0
+                stats.add(writers.pop(f.id).count)
+
+        start = min(cursors.values())
+        end = float(max(f.endTime for f in todo))
+        try:
+            for events, nxt in self.repo.stream_fights_event_pages(code, [f.id for f in todo], start, end, data_type):
+                touched: Dict[int, List[Event]] = {}
+                for ev in events:
+                    fid = route(ev)
+                    if fid in closed:  # its file is committed; reopening it would start an empty writer
+                        closed[fid] += 1
+                        continue
+                    # events before a resumed writer's cursor are already on disk
+                    if fid in wanted and ev.get("timestamp", 0) >= cursors[fid]:
+                        touched.setdefault(fid, []).append(ev)
+                for fid, evs in touched.items():
+                    writer(by_id[fid]).write(evs, cursor=nxt)
+                close_until(nxt)
+                self._check_cancel()
+        finally:
+            for w in writers.values():
+                w.abort()
+            for fid, n in closed.items():
+                if n:
+                    log.warning("%s: dropped %d %s event(s) for fight %d, which arrived after it was committed",
+                                code, n, data_type, fid)
+
+    def dump_report(self, code: str, fights: List[Fight], event_types: List[str]) -> FetchStats:
+        stats = FetchStats()
+        tasks: List[_Task] = []
+        for ft in fights if self.mode == "per-fight" else []:  # report-wide streams plan their own fights
+            for et in event_types:
+                if self.resume and self.etl.events_complete(code, ft.id, et):
+                    stats.skipped += 1
+                    continue
+                ranges = self._plan(ft)
+                if len(ranges) == 1:
+                    tasks.append(_Task(ft, et, *ranges[0]))
+                    continue
+                n = len(ranges)
+                pending = [k for k in range(n) if not (self.resume and self.etl.events_complete(code, ft.id, et, k))]
+                if not pending:  # every shard landed but the merge did not
+                    stats.add(self.etl.merge_event_shards(code, ft, et, n).count)
+                    continue
+                group = _ShardGroup(len(pending))
+                tasks.extend(_Task(ft, et, ranges[k][0], ranges[k][1], k, n, group) for k in pending)
+        t0 = time.perf_counter()
+        self._cancel.clear()
+        try:
+            self._run(code, fights, event_types, tasks, stats)
+        finally:
+            self.etl.compact_manifest(code)
+        stats.elapsed_s = time.perf_counter() - t0
+        log.info("Dumped %s: %s", code, stats.summary())
+        return stats
+
+    def _run(self, code: str, fights: List[Fight], event_types: List[str], tasks: List[_Task], stats: FetchStats) -> None:
+        with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="wcl-fetch") as pool:
+            if self.mode == "report-wide":
+                futures = [tracing.submit(pool, self._dump_type_report_wide, code, fights, et, stats) for et in event_types]
+            elif self.batch_size > 1:
+                lanes = [tasks[k::self.max_in_flight] for k in range(self.max_in_flight)]
+                futures = [tracing.submit(pool, self._dump_lane, code, lane, stats) for lane in lanes if lane]
+            else:
+                futures = [tracing.submit(pool, self._dump_one, code, t, stats) for t in tasks]
+            try:
+                done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+            except BaseException:  # Ctrl-C: stop workers at their next page boundary
+                self._cancel.set()
+                for fut in futures:
+                    fut.cancel()
+                raise
+            self._cancel.set()
+            for fut in pending:
+                fut.cancel()
+            for fut in done:
+                fut.result()  # re-raise the first failure
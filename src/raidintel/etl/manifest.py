@@ -0,0 +1,188 @@
+from __future__ import annotations
+import os, glob, json, hashlib, logging, threading
+from typing import Any, Dict, Optional, Set, Tuple
+from ..models import Event
+
+log = logging.getLogger(__name__)
+
+# <output_dir>/<code>/manifest.json: one entry per committed (fight, data_type) stream.
+# Commits append their entry to manifest.jsonl instead of rewriting the whole file;
+# `compact_manifest` folds that journal back in (readers overlay it until then).
+MANIFEST = "manifest.json"
+JOURNAL = "manifest.jsonl"
+ManifestKey = Tuple[int, str]
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+def _report_lock(report_dir: str) -> threading.Lock:
+    key = os.path.abspath(report_dir)
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+class EventStats:
+    """Running statistics of one event stream, fed as its lines are written."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.min_ts: Optional[float] = None
+        self.max_ts: Optional[float] = None
+        self.sources: Set[Any] = set()
+        self.sha = hashlib.sha256()
+
+    def add(self, ev: Event, line: bytes) -> None:
+        self.count += 1
+        self.sha.update(line)
+        ts = ev.get("timestamp")
+        if isinstance(ts, (int, float)):
+            self.min_ts = ts if self.min_ts is None or ts < self.min_ts else self.min_ts
+            self.max_ts = ts if self.max_ts is None or ts > self.max_ts else self.max_ts
+        sid = ev.get("sourceID")
+        if sid is not None:
+            self.sources.add(sid)
+
+    def add_line(self, line: bytes) -> None:
+        """Feed an already serialized line (resumed prefixes, merged shards, backfills)."""
+        if not line.strip():
+            self.sha.update(line)
+            return
+        try:
+            ev = json.loads(line)
+        except ValueError:
+            ev = {}
+        self.add(ev if isinstance(ev, dict) else {}, line)
+
+    def entry(self, fight_id: int, data_type: str, report_dir: str, path: str, sha256: Optional[str] = None) -> Dict[str, Any]:
+        """Manifest entry for the stream stored at `path`; `sha256` defaults to the bytes fed so far."""
+        return {
+            "fight": int(fight_id), "type": data_type, "path": os.path.relpath(path, report_dir),
+            "count": self.count, "bytes": os.path.getsize(path), "min_ts": self.min_ts, "max_ts": self.max_ts,
+            "sources": sorted(self.sources, key=str), "sha256": sha256 or self.sha.hexdigest(),
+        }
+
+def extend_entry(entry: Dict[str, Any], st: EventStats, report_dir: str, path: str, sha256: str) -> Dict[str, Any]:
+    """`entry` after the events fed to `st` were appended to its file."""
+    ts_min = [t for t in (entry.get("min_ts"), st.min_ts) if t is not None]
+    ts_max = [t for t in (entry.get("max_ts"), st.max_ts) if t is not None]
+    return {**entry, "path": os.path.relpath(path, report_dir), "count": entry["count"] + st.count,
+            "bytes": os.path.getsize(path), "min_ts": min(ts_min) if ts_min else None, "max_ts": max(ts_max) if ts_max else None,
+            "sources": sorted(set(entry.get("sources") or []) | st.sources, key=str), "sha256": sha256}
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def manifest_path(report_dir: str) -> str:
+    return os.path.join(report_dir, MANIFEST)
+
+def journal_path(report_dir: str) -> str:
+    return os.path.join(report_dir, JOURNAL)
+
+def load_manifest(report_dir: str) -> Dict[ManifestKey, Dict[str, Any]]:
+    try:
+        with open(manifest_path(report_dir), "r", encoding="utf-8") as f:
+            files = json.load(f).get("files", {})
+    except (OSError, ValueError):
+        files = {}
+    entries = {(int(e["fight"]), e["type"]): e for e in files.values()}
+    try:
+        with open(journal_path(report_dir), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    e = json.loads(line)
+                except ValueError:  # torn last line of an interrupted commit
+                    continue
+                entries[(int(e["fight"]), e["type"])] = e
+    except OSError:
+        pass
+    return entries
+
+def _save(report_dir: str, entries: Dict[ManifestKey, Dict[str, Any]]) -> None:
+    path = manifest_path(report_dir)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    files = {f"{fid}:{et}": entries[(fid, et)] for fid, et in sorted(entries)}
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "files": files}, f, indent=1)
+    os.replace(tmp, path)
+
+def record_entry(report_dir: str, entry: Dict[str, Any]) -> None:
+    """Journal one entry; later entries for the same stream win."""
+    line = json.dumps(entry) + "\n"
+    with _report_lock(report_dir), open(journal_path(report_dir), "a", encoding="utf-8") as f:
+        f.write(line)
+
+def _compact(report_dir: str, entries: Dict[ManifestKey, Dict[str, Any]]) -> None:
+    _save(report_dir, entries)
+    try:
+        os.remove(journal_path(report_dir))
+    except FileNotFoundError:
+        pass
+
+def compact_manifest(report_dir: str) -> None:
+    """Fold the journal into manifest.json (once per dump rather than once per commit)."""
+    with _report_lock(report_dir):
+        if os.path.exists(journal_path(report_dir)):
+            _compact(report_dir, load_manifest(report_dir))
+
+def _stored_files(report_dir: str, event_store: str) -> Dict[ManifestKey, str]:
+    out: Dict[ManifestKey, str] = {}
+    if event_store == "parquet":
+        from .parquet_store import parquet_dir
+        for p in glob.glob(os.path.join(parquet_dir(report_dir), "dataType=*", "fight=*", "part-0.parquet")):
+            fight_dir = os.path.dirname(p)
+            fid = int(os.path.basename(fight_dir).split("=", 1)[1])
+            out[(fid, os.path.basename(os.path.dirname(fight_dir)).split("=", 1)[1])] = p
+        return out
+    if event_store == "binary":
+        from .binary_store import binary_dir
+        for p in glob.glob(os.path.join(binary_dir(report_dir), "*", "fight_*.npy")):
+            out[(int(os.path.basename(p)[6:-4]), os.path.basename(os.path.dirname(p)))] = p
+        return out
+    for p in glob.glob(os.path.join(report_dir, "events", "fight_*_*.jsonl")):
+        base = os.path.basename(p)
+        out[(int(base.split("_")[1]), base.rsplit("_", 1)[-1].split(".")[0])] = p
+    return out
+
+def scan_file(report_dir: str, key: ManifestKey, path: str) -> Dict[str, Any]:
+    """Build an entry by reading a stored file (for files written before manifests existed)."""
+    st = EventStats()
+    if path.endswith(".parquet"):
+        from .parquet_store import read_events_table
+        t = read_events_table(report_dir, key[1], columns=["timestamp", "sourceID"], fights=[key[0]])
+        for ts, sid in zip(t.column("timestamp").to_pylist(), t.column("sourceID").to_pylist()):
+            st.add({"timestamp": ts, "sourceID": sid}, b"")
+        return st.entry(key[0], key[1], report_dir, path, sha256=file_sha256(path))
+    if path.endswith(".npy"):
+        from .binary_store import null_of, open_events
+        arr = open_events(path)
+        null = null_of(arr.dtype["sourceID"])
+        for ts, sid in zip(arr.timestamp.tolist(), arr.sourceID.tolist()):
+            st.add({"timestamp": ts, "sourceID": None if sid == null else sid}, b"")
+        return st.entry(key[0], key[1], report_dir, path, sha256=file_sha256(path))
+    with open(path, "rb") as fh:
+        for line in fh:
+            st.add_line(line)
+    return st.entry(key[0], key[1], report_dir, path)
+
+def refresh_manifest(report_dir: str, event_store: str = "jsonl") -> Dict[ManifestKey, Dict[str, Any]]:
+    """The report's manifest, with entries added for unrecorded or resized files and dropped for removed ones.
+
+    When every file is recorded this costs one stat per file.
+    """
+    with _report_lock(report_dir):
+        entries = load_manifest(report_dir)
+        stored = _stored_files(report_dir, event_store)
+        changed = os.path.exists(journal_path(report_dir))
+        for key in [k for k in entries if k not in stored]:
+            del entries[key]; changed = True
+        for key, path in stored.items():
+            e = entries.get(key)
+            if e is None or e.get("bytes") != os.path.getsize(path) or e.get("path") != os.path.relpath(path, report_dir):
+                entries[key] = scan_file(report_dir, key, path); changed = True
+        if changed:
+            log.info("Updated manifest of %s (%d files)", report_dir, len(entries))
+            _compact(report_dir, entries)
+    return entries
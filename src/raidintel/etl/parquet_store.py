@@ -0,0 +1,132 @@
+from __future__ import annotations
+import os, json, glob, pathlib, logging
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from ..models import Event
+
+log = logging.getLogger(__name__)
+
+# Fields most consumers read get real columns; everything else goes to `extra` as JSON.
+# `fight` is not stored in the files: it is the hive partition key next to `dataType`.
+INT_FIELDS = ["timestamp", "sourceID", "targetID", "abilityGameID", "amount"]
+SCHEMA = pa.schema([
+    ("timestamp", pa.int64()),
+    ("type", pa.dictionary(pa.int32(), pa.string())),
+    ("sourceID", pa.int64()),
+    ("targetID", pa.int64()),
+    ("abilityGameID", pa.int64()),
+    ("amount", pa.int64()),
+    ("extra", pa.string()),
+])
+PARTITIONING = ds.partitioning(pa.schema([("dataType", pa.string()), ("fight", pa.int32())]), flavor="hive")
+DATASET_SCHEMA = pa.schema(list(SCHEMA) + list(PARTITIONING.schema))  # what a read returns: file columns, then partition keys
+DICT_COLUMNS = ["type", "sourceID", "targetID", "abilityGameID"]
+ROW_GROUP = 65536
+
+def parquet_dir(report_dir: str) -> str:
+    return os.path.join(report_dir, "events_parquet")
+
+def parquet_path(report_dir: str, fight_id: int, data_type: str) -> str:
+    return os.path.join(parquet_dir(report_dir), f"dataType={data_type}", f"fight={fight_id}", "part-0.parquet")
+
+def _is_int(v: Any) -> bool:
+    return isinstance(v, int) and not isinstance(v, bool)
+
+def _columns(events: Sequence[Event]) -> Dict[str, list]:
+    cols: Dict[str, list] = {name: [] for name in SCHEMA.names}
+    for ev in events:
+        rest = dict(ev)
+        rest.pop("fight", None)
+        for k in INT_FIELDS:
+            v = rest.get(k)
+            if _is_int(v):
+                cols[k].append(v)
+                del rest[k]
+            else:
+                cols[k].append(None)  # missing, or not an int: stays in `extra` verbatim
+        t = rest.get("type")
+        if isinstance(t, str):
+            cols["type"].append(t)
+            del rest["type"]
+        else:
+            cols["type"].append(None)
+        cols["extra"].append(json.dumps(rest, ensure_ascii=False, separators=(",", ":")) if rest else None)
+    return cols
+
+def write_events_parquet(path: str, events: Iterable[Event]) -> int:
+    """Write events to one parquet file in row groups of ROW_GROUP; returns the row count."""
+    pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+    tmp = path + ".tmp"
+    n = 0
+    with pq.ParquetWriter(tmp, SCHEMA, use_dictionary=DICT_COLUMNS, compression="zstd") as w:
+        buf: List[Event] = []
+        for ev in events:
+            buf.append(ev)
+            if len(buf) >= ROW_GROUP:
+                w.write_table(pa.table(_columns(buf), schema=SCHEMA))
+                n += len(buf)
+                buf = []
+        if buf or n == 0:
+            w.write_table(pa.table(_columns(buf), schema=SCHEMA))
+            n += len(buf)
+    os.replace(tmp, path)
+    return n
+
+def append_events_parquet(path: str, events: Sequence[Event]) -> int:
+    """Rewrite `path` with `events` added as a trailing row group; returns the new row count."""
+    old = pq.read_table(path).cast(SCHEMA)
+    tmp = path + ".tmp"
+    with pq.ParquetWriter(tmp, SCHEMA, use_dictionary=DICT_COLUMNS, compression="zstd") as w:
+        w.write_table(old)
+        if events:
+            w.write_table(pa.table(_columns(events), schema=SCHEMA))
+    os.replace(tmp, path)
+    return old.num_rows + len(events)
+
+def jsonl_to_parquet(jsonl_path: str, path: str) -> int:
+    def lines() -> Iterator[Event]:
+        with open(jsonl_path, "r", encoding="utf-8") as fh:
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
+    n = write_events_parquet(path, lines())
+    log.info("Converted %s events to %s", n, path)
+    return n
+
+def events_dataset(report_dir: str) -> ds.Dataset:
+    return ds.dataset(parquet_dir(report_dir), format="parquet", partitioning=PARTITIONING)
+
+def read_events_table(report_dir: str, data_type: str, columns: Optional[List[str]] = None,
+                      fights: Optional[Iterable[int]] = None) -> pa.Table:
+    """Read one data type with column projection; `dataType`/`fight` filters prune whole files."""
+    flt = ds.field("dataType") == data_type
+    if fights is not None:
+        flt = flt & ds.field("fight").isin([int(f) for f in fights])
+    if not os.path.isdir(os.path.join(parquet_dir(report_dir), f"dataType={data_type}")):
+        # typed like a read of existing files, so empty and non-empty reads concatenate
+        return DATASET_SCHEMA.empty_table().select(columns or DATASET_SCHEMA.names)
+    return events_dataset(report_dir).to_table(columns=columns, filter=flt)
+
+def table_to_events(table: pa.Table) -> List[Event]:
+    """Rebuild event dicts (common fields, `fight`, then whatever `extra` held)."""
+    out: List[Event] = []
+    for row in table.to_pylist():
+        extra = row.pop("extra", None)
+        row.pop("dataType", None)
+        ev = {k: v for k, v in row.items() if v is not None}
+        if extra:
+            ev.update(json.loads(extra))
+        out.append(ev)
+    return out
+
+def count_rows(report_dir: str) -> Dict[tuple, int]:
+    """(fight_id, data_type) -> row count, from parquet footers only."""
+    out: Dict[tuple, int] = {}
+    for p in glob.glob(os.path.join(parquet_dir(report_dir), "dataType=*", "fight=*", "part-0.parquet")):
+        fight_dir = os.path.dirname(p)
+        fid = int(os.path.basename(fight_dir).split("=", 1)[1])
+        etype = os.path.basename(os.path.dirname(fight_dir)).split("=", 1)[1]
+        out[(fid, etype)] = pq.ParquetFile(p).metadata.num_rows
+    return out
@@ -1,14 +1,46 @@
 from __future__ import annotations
-import os, csv, json, pathlib, logging
-from typing import Iterable, List
+import os, csv, gzip, json, pathlib, logging
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
 from ..models import Fight, Event
 from dataclasses import asdict
+from .. import tracing
+from .manifest import (EventStats, ManifestKey, compact_manifest, extend_entry, file_sha256, load_manifest, record_entry,
+                       refresh_manifest, scan_file)
 
 log = logging.getLogger(__name__)
 
+EVENT_STORES = ("jsonl", "parquet", "binary")
+
 class ETLPipeline:
-    def __init__(self, output_dir: str = "out") -> None:
+    """Writes report artifacts under `<output_dir>/<code>/`.
+
+    Event streams are always staged as `events/fight_<id>_<type>.jsonl` (that is
+    what checkpoints and resume work on). With `event_store="parquet"` each
+    committed stream is converted to `events_parquet/dataType=<type>/fight=<id>/`
+    and the staged JSONL is removed. With `event_store="binary"` it is projected
+    onto its data type's fixed-width record schema in `events_bin/<type>/`
+    (see `binary_store`); `json_archive=True` keeps the original JSON gzipped
+    in `events_json/`, since the projection drops the remaining fields.
+
+    `time_index` (True, or the data types to cover) builds a time index in
+    `events_idx/` for each committed stream (see `time_index.EventWindows`).
+    Appends drop a stream's index instead of rebuilding it; readers rebuild it
+    on first use.
+
+    Every committed stream is recorded in the report's `manifest.json` (count,
+    bytes, timestamp range, distinct sourceIDs, checksum of the stored file), so
+    consumers can answer those questions without reading events. Commits are
+    journaled next to it and folded in by `compact_manifest` at the end of a dump.
+    """
+
+    def __init__(self, output_dir: str = "out", event_store: str = "jsonl", json_archive: bool = False,
+                 time_index: Union[bool, Iterable[str]] = False) -> None:
+        if event_store not in EVENT_STORES:
+            raise ValueError(f"Unknown event store {event_store!r}; expected one of {', '.join(EVENT_STORES)}")
         self.output_dir = output_dir
+        self.event_store = event_store
+        self.json_archive = json_archive
+        self.time_index = time_index if isinstance(time_index, bool) else frozenset(time_index)
 
     def _ensure_dir(self, path: str) -> None:
         pathlib.Path(path).mkdir(parents=True, exist_ok=True)
@@ -26,20 +58,287 @@ class ETLPipeline:
         self._ensure_dir(out_dir)
         path = os.path.join(out_dir, "fights.csv")
         with open(path, "w", newline="", encoding="utf-8") as f:
-            w = csv.DictWriter(f, fieldnames=["id","startTime","endTime"])
+            w = csv.DictWriter(f, fieldnames=["id","startTime","endTime","encounterID","kill","difficulty","fightPercentage"])
             w.writeheader()
             for x in fights:
-                w.writerow({"id": x.id, "startTime": x.startTime, "endTime": x.endTime})
+                w.writerow({"id": x.id, "startTime": x.startTime, "endTime": x.endTime, "encounterID": x.encounterID,
+                            "kill": "" if x.kill is None else x.kill, "difficulty": "" if x.difficulty is None else x.difficulty,
+                            "fightPercentage": "" if x.fightPercentage is None else x.fightPercentage})
         return path
 
+    def read_fights_csv(self, report_code: str) -> List[Fight]:
+        path = os.path.join(self.output_dir, report_code, "fights.csv")
+        if not os.path.exists(path):
+            return []
+        with open(path, "r", encoding="utf-8") as f:
+            return [Fight.from_row(r) for r in csv.DictReader(f)]
+
+    def events_path(self, report_code: str, fight_id: int, data_type: str, shard: Optional[int] = None) -> str:
+        path = os.path.join(self.output_dir, report_code, "events", f"fight_{fight_id}_{data_type}.jsonl")
+        return path if shard is None else f"{path}.shard{shard}"
+
+    def stored_events_path(self, report_code: str, fight_id: int, data_type: str) -> str:
+        """Where a committed stream lives in the configured event store."""
+        return stored_stream_path(os.path.join(self.output_dir, report_code), fight_id, data_type, self.event_store)
+
+    def _on_commit(self, report_code: str, fight_id: int, data_type: str, w: "EventFileWriter") -> Callable[[str], None]:
+        report_dir = os.path.join(self.output_dir, report_code)
+        def committed(jsonl_path: str) -> None:
+            sha = None
+            if self.event_store == "parquet":
+                from .parquet_store import jsonl_to_parquet
+                path = self.stored_events_path(report_code, fight_id, data_type)
+                with tracing.span("etl.parquet", "write", fight=fight_id, type=data_type):
+                    jsonl_to_parquet(jsonl_path, path)
+                os.remove(jsonl_path)
+                sha = file_sha256(path)
+            elif self.event_store == "binary":
+                from .binary_store import archive_jsonl, archive_path, jsonl_to_binary
+                path = self.stored_events_path(report_code, fight_id, data_type)
+                with tracing.span("etl.binary", "write", fight=fight_id, type=data_type):
+                    jsonl_to_binary(jsonl_path, path, data_type, fight_id)
+                    if self.json_archive:
+                        archive_jsonl(jsonl_path, archive_path(report_dir, fight_id, data_type))
+                os.remove(jsonl_path)
+                sha = file_sha256(path)
+            else:
+                path = jsonl_path
+            record_entry(report_dir, w.stats.entry(fight_id, data_type, report_dir, path, sha256=sha))
+            self._index(report_dir, fight_id, data_type, path)
+        return committed
+
+    def _index(self, report_dir: str, fight_id: int, data_type: str, path: str) -> None:
+        from .time_index import build_stream_index, index_path
+        idx = index_path(report_dir, fight_id, data_type)
+        if self.time_index is True or (self.time_index and data_type in self.time_index):
+            with tracing.span("etl.index", "write", fight=fight_id, type=data_type):
+                build_stream_index(path, idx)
+        elif os.path.exists(idx):  # left from a run that indexed this type: stale now
+            os.remove(idx)
+
+    def _drop_index(self, report_dir: str, fight_id: int, data_type: str) -> None:
+        from .time_index import index_path
+        try:
+            os.remove(index_path(report_dir, fight_id, data_type))
+        except FileNotFoundError:
+            pass
+
+    def open_events_writer(self, report_code: str, fight: Fight, data_type: str, resume: bool = False,
+                           shard: Optional[int] = None) -> "EventFileWriter":
+        path = self.events_path(report_code, fight.id, data_type, shard)
+        self._ensure_dir(os.path.dirname(path))
+        w = EventFileWriter(path, resume=resume)
+        if shard is None:  # shards are only staging for the merged file
+            w.on_commit = self._on_commit(report_code, fight.id, data_type, w)
+        return w
+
+    def manifest(self, report_code: str) -> Dict[ManifestKey, Dict[str, Any]]:
+        """(fight_id, data_type) -> manifest entry for every stored stream of a report."""
+        return refresh_manifest(os.path.join(self.output_dir, report_code), self.event_store)
+
+    def compact_manifest(self, report_code: str) -> None:
+        compact_manifest(os.path.join(self.output_dir, report_code))
+
+    def trailing_events_at(self, report_code: str, fight_id: int, data_type: str, ts: float) -> int:
+        """How many events at the end of a committed stream have timestamp `ts` (streams are in time order)."""
+        path = self.stored_events_path(report_code, fight_id, data_type)
+        if self.event_store == "parquet":
+            import pyarrow.parquet as pq
+            col = pq.read_table(path, columns=["timestamp"]).column("timestamp").to_pylist()
+            stamps = reversed(col)
+        elif self.event_store == "binary":
+            from .binary_store import open_events
+            stamps = (int(t) for t in open_events(path).timestamp[::-1])
+        else:
+            stamps = (json.loads(line).get("timestamp") for line in _reversed_lines(path) if line.strip())
+        n = 0
+        for t in stamps:
+            if t != ts:
+                break
+            n += 1
+        return n
+
+    def append_events(self, report_code: str, fight_id: int, data_type: str, events: List[Event]) -> int:
+        """Append events to a committed stream in place and update its manifest entry."""
+        if not events:
+            return 0
+        report_dir = os.path.join(self.output_dir, report_code)
+        path = self.stored_events_path(report_code, fight_id, data_type)
+        st = EventStats()
+        with tracing.span("etl.append", "write", fight=fight_id, type=data_type):
+            if self.event_store == "parquet":
+                from .parquet_store import append_events_parquet
+                for ev in events:
+                    st.add(ev, b"")
+                append_events_parquet(path, events)
+            elif self.event_store == "binary":
+                from .binary_store import append_events_binary, archive_path
+                for ev in events:
+                    st.add(ev, b"")
+                append_events_binary(path, data_type, fight_id, events)
+                archive = archive_path(report_dir, fight_id, data_type)
+                if os.path.exists(archive):
+                    with gzip.open(archive, "ab") as fh:
+                        fh.writelines((json.dumps(ev, ensure_ascii=False) + "\n").encode("utf-8") for ev in events)
+            else:
+                with open(path, "ab") as fh:
+                    for ev in events:
+                        line = (json.dumps(ev, ensure_ascii=False) + "\n").encode("utf-8")
+                        fh.write(line)
+                        st.add(ev, line)
+            old = load_manifest(report_dir).get((fight_id, data_type))
+            if old is None:  # stream predates manifests: its scan already covers the appended events
+                record_entry(report_dir, scan_file(report_dir, (fight_id, data_type), path))
+            else:
+                record_entry(report_dir, extend_entry(old, st, report_dir, path, file_sha256(path)))
+            self._drop_index(report_dir, fight_id, data_type)
+        tracing.count("etl.events", st.count)
+        return st.count
+
+    def events_complete(self, report_code: str, fight_id: int, data_type: str, shard: Optional[int] = None) -> bool:
+        """True if the stream was committed and no partial download of it is pending."""
+        path = self.events_path(report_code, fight_id, data_type, shard)
+        final = path if shard is not None else self.stored_events_path(report_code, fight_id, data_type)
+        return os.path.exists(final) and EventFileWriter.load_checkpoint(path) is None
+
+    def load_events_checkpoint(self, report_code: str, fight_id: int, data_type: str,
+                               shard: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        path = self.events_path(report_code, fight_id, data_type, shard)
+        return EventFileWriter.load_checkpoint(path) if os.path.exists(path + ".tmp") else None
+
+    def merge_event_shards(self, report_code: str, fight: Fight, data_type: str, n_shards: int) -> EventFileWriter:
+        """Concatenate committed time-range shards (in order) into the fight's file."""
+        w = self.open_events_writer(report_code, fight, data_type)
+        parts = [self.events_path(report_code, fight.id, data_type, k) for k in range(n_shards)]
+        try:
+            for part in parts:
+                w.append_file(part)
+        except BaseException:
+            w.abort()
+            raise
+        w.commit()
+        for part in parts:
+            os.remove(part)
+        return w
+
     def dump_events_jsonl(self, report_code: str, fight: Fight, data_type: str, events: Iterable[Event]) -> str:
-        out_dir = os.path.join(self.output_dir, report_code, "events")
-        self._ensure_dir(out_dir)
-        path = os.path.join(out_dir, f"fight_{fight.id}_{data_type}.jsonl")
-        count = 0
-        with open(path, "w", encoding="utf-8") as fh:
+        w = self.open_events_writer(report_code, fight, data_type)
+        try:
+            w.write(events)
+        except BaseException:
+            w.abort()
+            raise
+        return w.commit()
+
+def stored_stream_path(report_dir: str, fight_id: int, data_type: str, event_store: str = "jsonl") -> str:
+    if event_store == "parquet":
+        from .parquet_store import parquet_path
+        return parquet_path(report_dir, fight_id, data_type)
+    if event_store == "binary":
+        from .binary_store import binary_path
+        return binary_path(report_dir, fight_id, data_type)
+    return os.path.join(report_dir, "events", f"fight_{fight_id}_{data_type}.jsonl")
+
+def _reversed_lines(path: str, block: int = 1 << 16) -> Iterable[bytes]:
+    """Lines of a file from last to first, read in blocks from the end."""
+    with open(path, "rb") as fh:
+        fh.seek(0, os.SEEK_END)
+        pos, rest = fh.tell(), b""
+        while pos > 0:
+            step = min(block, pos)
+            pos -= step
+            fh.seek(pos)
+            lines = (fh.read(step) + rest).split(b"\n")
+            rest = lines.pop(0)
+            yield from reversed(lines)
+        yield rest
+
+class EventFileWriter:
+    """Writes one (fight, data_type) JSONL file page by page.
+
+    Lines go to `<path>.tmp`, which is renamed on `commit()`, so a file is either
+    complete or absent. Each page written with a `cursor` (the page's
+    nextPageTimestamp) is checkpointed to `<path>.ckpt` together with the byte
+    offset reached; with `resume=True` the temp file is truncated back to that
+    offset and streaming continues from `self.cursor`. `on_commit` receives the
+    committed path (used to hand the file over to another event store).
+    """
+
+    def __init__(self, path: str, resume: bool = False, on_commit: Optional[Callable[[str], None]] = None) -> None:
+        self.path = path
+        self.on_commit = on_commit
+        self.tmp = path + ".tmp"
+        self.ckpt = path + ".ckpt"
+        self.resumable = resume
+        self.count = 0
+        self.stats = EventStats()
+        self.cursor: Optional[float] = None
+        state = self.load_checkpoint(path) if resume else None
+        if state is not None and os.path.exists(self.tmp):
+            self._fh = open(self.tmp, "r+b")
+            self._fh.truncate(state["offset"])
+            for line in self._fh:  # statistics of the part already on disk
+                self.stats.add_line(line)
+            self._fh.seek(state["offset"])
+            self.count = int(state["count"])
+            self.cursor = float(state["cursor"])
+            log.info("Resuming %s at t=%s (%s events already written)", path, self.cursor, self.count)
+        else:
+            self._fh = open(self.tmp, "wb")
+            if os.path.exists(self.ckpt):
+                os.remove(self.ckpt)
+
+    @staticmethod
+    def load_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path + ".ckpt", "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write(self, events: Iterable[Event], cursor: Optional[float] = None) -> None:
+        fh = self._fh
+        with tracing.span("etl.write", "write"):
+            n, start = self.count, fh.tell()
             for ev in events:
-                fh.write(json.dumps(ev, ensure_ascii=False) + "\n")
-                count += 1
-        log.info("Wrote %s events to %s", count, path)
-        return path
+                line = (json.dumps(ev, ensure_ascii=False) + "\n").encode("utf-8")
+                fh.write(line)
+                self.stats.add(ev, line)
+                self.count += 1
+        tracing.count("etl.events", self.count - n)
+        tracing.count("etl.bytes", fh.tell() - start)
+        if cursor is not None:
+            fh.flush()
+            self.cursor = float(cursor)
+            state = {"cursor": self.cursor, "offset": fh.tell(), "count": self.count}
+            with open(self.ckpt + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(self.ckpt + ".tmp", self.ckpt)
+
+    def append_file(self, src: str) -> None:
+        """Append an already written JSONL file verbatim."""
+        with open(src, "rb") as fh:
+            for line in fh:
+                self._fh.write(line)
+                self.stats.add_line(line)
+                self.count += line.endswith(b"\n")
+
+    def commit(self) -> str:
+        self._fh.close()
+        os.replace(self.tmp, self.path)
+        if self.on_commit is not None:
+            with tracing.span("etl.commit", "write", path=os.path.basename(self.path)):
+                self.on_commit(self.path)
+        if os.path.exists(self.ckpt):
+            os.remove(self.ckpt)
+        log.info("Wrote %s events to %s", self.count, self.path)
+        return self.path
+
+    def abort(self) -> None:
+        """Close without committing; resumable writers keep their progress for the next run."""
+        self._fh.close()
+        if self.resumable and os.path.exists(self.ckpt):
+            return
+        for p in (self.tmp, self.ckpt):
+            if os.path.exists(p):
+                os.remove(p)
@@ -0,0 +1,231 @@
+from __future__ import annotations
+import os, json, pathlib, logging, threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# Missing integer fields in the columns read here, whatever the event store.
+NULL = int(np.iinfo(np.int64).min)
+# Timestamps are stored relative to the stream's first one in the low bits of the
+# (actor rank, timestamp) keys: 2^43 ms is far longer than any report.
+_TS_BITS = 43
+_TS_MAX = (1 << _TS_BITS) - 1
+
+def index_path(report_dir: str, fight_id: int, data_type: str) -> str:
+    return os.path.join(report_dir, "events_idx", data_type, f"fight_{fight_id}.npz")
+
+def stream_columns(path: str, names: Sequence[str]) -> Dict[str, np.ndarray]:
+    """int64 columns of one stored stream (.jsonl, .parquet or .npy), missing values as NULL."""
+    if path.endswith(".npy"):
+        from .binary_store import null_of, open_events
+        arr = open_events(path)
+        out = {}
+        for n in names:
+            if n not in arr.dtype.names:
+                out[n] = np.full(len(arr), NULL, dtype=np.int64)
+                continue
+            col = arr[n].astype(np.int64)
+            col[arr[n] == null_of(arr.dtype[n])] = NULL
+            out[n] = col
+        return out
+    import pyarrow as pa
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        present = set(pq.read_schema(path).names)
+        t = pq.read_table(path, columns=[n for n in names if n in present])
+    else:
+        t = _jsonl_table(path, names)
+    out = {}
+    for n in names:
+        if n not in t.column_names:
+            out[n] = np.full(t.num_rows, NULL, dtype=np.int64)
+            continue
+        col = t.column(n)
+        if not pa.types.is_integer(col.type):
+            col = col.cast(pa.int64(), safe=False)
+        out[n] = col.fill_null(NULL).to_numpy(zero_copy_only=False).astype(np.int64)
+    return out
+
+def _jsonl_table(path: str, names: Sequence[str]):
+    import pyarrow as pa
+    import pyarrow.json as pj
+    schema = pa.schema([(n, pa.int64()) for n in names])
+    if os.path.getsize(path) > 0:
+        try:
+            return pj.read_json(path, parse_options=pj.ParseOptions(explicit_schema=schema, unexpected_field_behavior="ignore"))
+        except pa.ArrowInvalid as e:  # e.g. a torn last line: fall back to the line reader
+            log.warning("%s: %s; reading it line by line", path, e)
+    cols: Dict[str, list] = {n: [] for n in names}
+    with open(path, "r", encoding="utf-8") as fh:  # malformed lines are skipped, like the feature readers do
+        for line in fh:
+            if not line.strip():
+                continue
+            try:
+                ev = json.loads(line)
+            except ValueError:
+                continue
+            for n in names:
+                v = ev.get(n)
+                cols[n].append(v if isinstance(v, int) and not isinstance(v, bool) else None)
+    return pa.table(cols, schema=schema)
+
+@dataclass
+class _Axis:
+    """Rows of a stream ordered by (actor, timestamp), with the sort keys for binary search."""
+    actors: np.ndarray  # distinct actor ids, sorted
+    order: np.ndarray  # row numbers
+    keys: np.ndarray  # actor rank << _TS_BITS | timestamp - base, ascending
+
+@dataclass
+class StreamIndex:
+    """Time index of one (fight, data type) stream.
+
+    `span`/`spans` give a window [t0, t1) as a range [lo, hi) of `order`, so
+    per-window sums over a column are two lookups in its prefix sums taken in
+    that order; `rows` gives the row numbers themselves.
+    """
+    timestamp: np.ndarray  # in stream order (time sorted)
+    base: int
+    source: _Axis
+    target: _Axis
+    size: int = 0  # bytes and mtime of the stream the index was built from
+    mtime_ns: int = 0
+
+    @staticmethod
+    def build(timestamp: np.ndarray, source: np.ndarray, target: np.ndarray, size: int = 0, mtime_ns: int = 0) -> "StreamIndex":
+        ts = np.asarray(timestamp, dtype=np.int64)
+        valid = ts[ts != NULL]
+        base = int(valid.min()) if len(valid) else 0
+        rel = np.clip(ts - base, 0, _TS_MAX)
+        def axis(actor: np.ndarray) -> _Axis:
+            actor = np.asarray(actor, dtype=np.int64)
+            order = np.lexsort((rel, actor)).astype(np.int64)
+            actors, rank = np.unique(actor, return_inverse=True)
+            return _Axis(actors, order, (rank.astype(np.int64)[order] << _TS_BITS) | rel[order])
+        return StreamIndex(ts, base, axis(source), axis(target), size, mtime_ns)
+
+    def current(self, stream: str) -> bool:
+        """Whether the index was built from `stream` as it is now (same size and modification time)."""
+        st = os.stat(stream)
+        return (self.size, self.mtime_ns) == (st.st_size, st.st_mtime_ns)
+
+    def _axis(self, by: str) -> _Axis:
+        if by not in ("source", "target"):
+            raise ValueError(f"Unknown index axis {by!r}; expected 'source' or 'target'")
+        return self.source if by == "source" else self.target
+
+    def spans(self, by: str, actors: np.ndarray, t0: np.ndarray, t1: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(order, lo, hi) of many windows at once: rows order[lo[i]:hi[i]] are actor i's events in [t0[i], t1[i])."""
+        ax = self._axis(by)
+        actors = np.asarray(actors, dtype=np.int64)
+        pos = np.searchsorted(ax.actors, actors)
+        if len(ax.actors):
+            found = ax.actors[np.minimum(pos, len(ax.actors) - 1)] == actors
+        else:
+            found = np.zeros(len(actors), dtype=bool)
+        rank = pos.astype(np.int64) << _TS_BITS
+        lo = np.searchsorted(ax.keys, rank | np.clip(np.asarray(t0, dtype=np.int64) - self.base, 0, _TS_MAX))
+        hi = np.searchsorted(ax.keys, rank | np.clip(np.asarray(t1, dtype=np.int64) - self.base, 0, _TS_MAX))
+        hi = np.where(found, hi, lo)
+        return ax.order, lo, hi
+
+    def span(self, by: str, actor: int, t0: int, t1: int) -> Tuple[np.ndarray, int, int]:
+        order, lo, hi = self.spans(by, np.array([actor]), np.array([t0]), np.array([t1]))
+        return order, int(lo[0]), int(hi[0])
+
+    def rows(self, t0: int, t1: int, source: Optional[int] = None, target: Optional[int] = None) -> np.ndarray:
+        """Row numbers of the events in [t0, t1) (of `source` or `target`, if given), in time order."""
+        if source is not None and target is not None:
+            rows = self.rows(t0, t1, source=source)
+            return rows[np.isin(rows, self.rows(t0, t1, target=target))]
+        if source is None and target is None:
+            lo, hi = np.searchsorted(self.timestamp, [t0, t1])
+            return np.arange(lo, hi, dtype=np.int64)
+        order, lo, hi = self.span("source" if source is not None else "target", source if source is not None else target, t0, t1)
+        return order[lo:hi]
+
+    def save(self, path: str) -> None:
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, timestamp=self.timestamp, meta=np.array([self.base, self.size, self.mtime_ns], dtype=np.int64),
+                 source_actors=self.source.actors, source_order=self.source.order, source_keys=self.source.keys,
+                 target_actors=self.target.actors, target_order=self.target.order, target_keys=self.target.keys)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def load(path: str) -> "StreamIndex":
+        with np.load(path) as z:
+            base, size, mtime_ns = ([int(v) for v in z["meta"]] + [-1])[:3]  # no mtime: written before it was kept
+            return StreamIndex(z["timestamp"], base, _Axis(z["source_actors"], z["source_order"], z["source_keys"]),
+                               _Axis(z["target_actors"], z["target_order"], z["target_keys"]), size, mtime_ns)
+
+def build_stream_index(stream: str, path: str) -> StreamIndex:
+    """Index the stored stream at `stream` and save it to `path`."""
+    st = os.stat(stream)
+    cols = stream_columns(stream, ["timestamp", "sourceID", "targetID"])
+    idx = StreamIndex.build(cols["timestamp"], cols["sourceID"], cols["targetID"], size=st.st_size, mtime_ns=st.st_mtime_ns)
+    idx.save(path)
+    return idx
+
+class EventWindows:
+    """Time-window queries over the stored streams of one report.
+
+    Indexes are read from `events_idx/` (written by the ETL for the types it
+    is asked to index) and rebuilt when missing or when their stream's size or
+    modification time changed since they were built; columns are read once per stream and
+    kept, so many windows over the same fight cost one read.
+    """
+
+    def __init__(self, report_dir: str, event_store: str = "jsonl") -> None:
+        self.report_dir = report_dir
+        self.event_store = event_store
+        self._lock = threading.Lock()
+        self._indexes: Dict[Tuple[int, str], Optional[StreamIndex]] = {}
+        self._columns: Dict[Tuple[int, str, str], np.ndarray] = {}
+
+    def stream(self, fight_id: int, data_type: str) -> str:
+        from .pipeline import stored_stream_path
+        return stored_stream_path(self.report_dir, fight_id, data_type, self.event_store)
+
+    def index(self, fight_id: int, data_type: str) -> Optional[StreamIndex]:
+        """The stream's index, or None if the stream is not stored."""
+        key = (fight_id, data_type)
+        with self._lock:
+            if key not in self._indexes:
+                stream = self.stream(fight_id, data_type)
+                if not os.path.exists(stream):
+                    self._indexes[key] = None
+                else:
+                    path = index_path(self.report_dir, fight_id, data_type)
+                    idx = StreamIndex.load(path) if os.path.exists(path) else None
+                    if idx is None or not idx.current(stream):
+                        idx = build_stream_index(stream, path)
+                    self._indexes[key] = idx
+            return self._indexes[key]
+
+    def columns(self, fight_id: int, data_type: str, names: Sequence[str]) -> Dict[str, np.ndarray]:
+        with self._lock:
+            missing = [n for n in names if (fight_id, data_type, n) not in self._columns]
+            if missing:
+                for n, col in stream_columns(self.stream(fight_id, data_type), missing).items():
+                    self._columns[(fight_id, data_type, n)] = col
+            return {n: self._columns[(fight_id, data_type, n)] for n in names}
+
+    def window(self, fight_id: int, data_type: str, t0: int, t1: int, source: Optional[int] = None,
+               target: Optional[int] = None, names: Sequence[str] = ("timestamp", "sourceID", "targetID", "abilityGameID")) -> Dict[str, np.ndarray]:
+        """Columns `names` of the events in [t0, t1) of `source` or `target`, in time order."""
+        idx = self.index(fight_id, data_type)
+        if idx is None:
+            return {n: np.empty(0, dtype=np.int64) for n in names}
+        rows = idx.rows(t0, t1, source=source, target=target)
+        return {n: col[rows] for n, col in self.columns(fight_id, data_type, names).items()}
+
+    def drop(self, fight_id: int) -> None:
+        """Forget what was read for a fight (bounds memory when walking a report fight by fight)."""
+        with self._lock:
+            for key in [k for k in self._indexes if k[0] == fight_id]:
+                del self._indexes[key]
+            for key in [k for k in self._columns if k[0] == fight_id]:
+                del self._columns[key]
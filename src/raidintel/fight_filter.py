@@ -0,0 +1,64 @@
+from __future__ import annotations
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from .models import Fight
+
+OUTCOMES = ("all", "kills", "wipes")
+
+def _ints(v: Any) -> Tuple[int, ...]:
+    # lists from TOML/JSON, or "1,2,3" from an env override
+    if v in (None, ""):
+        return ()
+    if isinstance(v, str):
+        v = [x for x in v.replace(" ", "").split(",") if x]
+    return tuple(sorted({int(x) for x in v}))
+
+@dataclass(frozen=True)
+class FightFilter:
+    """Which fights of a report are downloaded and analyzed."""
+    bosses_only: bool = False  # skip trash (encounterID 0)
+    outcome: str = "all"  # or "kills" / "wipes"
+    difficulties: Tuple[int, ...] = ()  # empty = any
+    encounters: Tuple[int, ...] = ()  # empty = any
+    min_duration_s: float = 0.0
+
+    def __post_init__(self) -> None:
+        if self.outcome not in OUTCOMES:
+            raise ValueError(f"Unknown fight outcome {self.outcome!r}; expected one of {', '.join(OUTCOMES)}")
+
+    @staticmethod
+    def from_config(cfg: Any) -> "FightFilter":
+        return FightFilter(bosses_only=bool(getattr(cfg, "fight_bosses_only", False)),
+                           outcome=str(getattr(cfg, "fight_outcome", "all") or "all").lower(),
+                           difficulties=_ints(getattr(cfg, "fight_difficulties", ())),
+                           encounters=_ints(getattr(cfg, "fight_encounters", ())),
+                           min_duration_s=float(getattr(cfg, "fight_min_duration_s", 0) or 0))
+
+    @property
+    def active(self) -> bool:
+        return self != FightFilter()
+
+    def spec(self) -> Dict[str, Any]:
+        """The non-default settings (JSON-able; used in artifact params)."""
+        default = asdict(FightFilter())
+        return {k: list(v) if isinstance(v, tuple) else v for k, v in asdict(self).items() if v != default[k]}
+
+    def matches(self, f: Fight) -> bool:
+        if self.bosses_only and not f.encounterID:
+            return False
+        if self.encounters and f.encounterID not in self.encounters:
+            return False
+        if self.difficulties and f.difficulty not in self.difficulties:
+            return False
+        if self.outcome == "kills" and f.kill is not True:
+            return False
+        if self.outcome == "wipes" and f.kill is not False:
+            return False
+        return f.duration_s >= self.min_duration_s
+
+    def apply(self, fights: Iterable[Fight]) -> List[Fight]:
+        return [f for f in fights if self.matches(f)]
+
+    def fight_ids(self, fights: Iterable[Fight]) -> Optional[List[int]]:
+        """Ids of the matching fights, or None when the filter keeps everything."""
+        return [f.id for f in self.apply(fights)] if self.active else None
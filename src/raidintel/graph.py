@@ -1,6 +1,6 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Dict, List, Set, Tuple, Any
+from typing import Dict, List, Optional, Set, Tuple, Any
 
 @dataclass(frozen=True)
 class Node:
@@ -23,39 +23,170 @@ def _artifact_id(a: Any) -> Tuple[str, str, str]:
         p = str(params)
     return key.id(), key.name, p
 
-def build_graph(root_action: Any, ctx: Any, max_nodes: int = 500) -> Tuple[Dict[str, Node], Set[Edge], str]:
-    nodes: Dict[str, Node] = {}
-    edges: Set[Edge] = set()
+@dataclass
+class ActionGraph:
+    """Resolved action DAG: one action per artifact id, edges point at dependencies."""
+    actions: Dict[str, Any]
+    deps: Dict[str, List[str]]
+    root_id: str
+
+    def dependents(self) -> Dict[str, List[str]]:
+        out: Dict[str, List[str]] = {nid: [] for nid in self.actions}
+        for nid, deps in self.deps.items():
+            for d in deps:
+                out[d].append(nid)
+        return out
+
+    def order(self) -> List[str]:
+        """Artifact ids with every dependency before its dependents."""
+        out: List[str] = []
+        state: Dict[str, int] = {}  # 1 = on the path, 2 = emitted
+        for start in self.actions:
+            if start in state: continue
+            stack: List[Tuple[str, int]] = [(start, 0)]
+            state[start] = 1
+            while stack:
+                nid, i = stack.pop()
+                deps = self.deps.get(nid, [])
+                if i < len(deps):
+                    stack.append((nid, i + 1))
+                    d = deps[i]
+                    if state.get(d) == 1:
+                        raise ValueError(f"Dependency cycle through {d}")
+                    if d not in state:
+                        state[d] = 1
+                        stack.append((d, 0))
+                else:
+                    state[nid] = 2
+                    out.append(nid)
+        return out
+
+    def downstream(self, nid: str) -> Set[str]:
+        """Everything that depends on `nid`, directly or transitively."""
+        dependents = self.dependents()
+        out: Set[str] = set()
+        stack = list(dependents[nid])
+        while stack:
+            d = stack.pop()
+            if d in out: continue
+            out.add(d)
+            stack.extend(dependents[d])
+        return out
+
+def resolve_actions(root_action: Any, ctx: Any, max_nodes: Optional[int] = None, strict: bool = True,
+                    requires_cache: Optional[Dict[str, List[Any]]] = None,
+                    errors: Optional[Dict[str, Exception]] = None) -> ActionGraph:
+    """Walk `requires()` once per artifact id. With strict=False a failing `requires()` counts as
+    no dependencies (and is collected in `errors` when given).
+
+    `requires_cache` (artifact id -> dependencies) is read and filled, so callers
+    that resolve several times in one run only ask each action once.
+    """
+    actions: Dict[str, Any] = {}
+    deps: Dict[str, List[str]] = {}
     stack: List[Any] = [root_action]
-    seen: Set[str] = set()
-    root_id, root_art, _ = _artifact_id(root_action)
+    root_id, _, _ = _artifact_id(root_action)
     while stack:
         act = stack.pop()
-        nid, aname, params = _artifact_id(act)
-        if nid in seen: continue
-        seen.add(nid)
-        nodes[nid] = Node(nid, f"{_action_name(act)}\\n[{aname}]\\n{params}", _action_name(act), aname)
-        try:
-            deps = act.requires(ctx)
-        except Exception:
-            deps = []
-        for dep in deps:
+        nid, _, _ = _artifact_id(act)
+        if nid in actions: continue
+        actions[nid] = act
+        if requires_cache is not None and nid in requires_cache:
+            reqs = requires_cache[nid]
+        else:
+            try:
+                reqs = act.requires(ctx)
+                if requires_cache is not None:
+                    requires_cache[nid] = reqs
+            except Exception as e:
+                if strict: raise
+                if errors is not None: errors[nid] = e
+                reqs = []
+        deps[nid] = []
+        for dep in reqs:
             did, _, _ = _artifact_id(dep)
-            edges.add((did, nid))
-            if did not in seen:
+            if did not in deps[nid]:
+                deps[nid].append(did)
+            if did not in actions:
                 stack.append(dep)
-        if len(nodes) >= max_nodes: break
-    return nodes, edges, root_id
+        if max_nodes is not None and len(actions) >= max_nodes: break
+    # nodes cut off by max_nodes keep their edges but have no entry of their own
+    deps = {nid: [d for d in ds if d in actions] for nid, ds in deps.items()}
+    return ActionGraph(actions, deps, root_id)
+
+def event_demand(graph: ActionGraph, ctx: Any) -> Dict[str, Dict[str, List[str]]]:
+    """Report code -> event types (with the fields read) consumed by the direct dependents of its dump nodes.
+
+    Dumps are the nodes with `code` and `event_types`. A dependent that does not
+    declare `consumes()` needs every configured type; a declared type outside
+    `cfg.event_types` is dropped unless the dependent also lists it in
+    `required_events()`, and is then listed after the configured ones. Dumps
+    nothing depends on are left out.
+    """
+    dumps = [nid for nid, act in graph.actions.items() if getattr(act, "event_types", None) is not None and hasattr(act, "code")]
+    if not dumps:
+        return {}
+    dependents = graph.dependents()
+    configured = list(ctx.cfg.event_types)
+    out: Dict[str, Dict[str, List[str]]] = {}
+    for nid in dumps:
+        act = graph.actions[nid]
+        if not dependents[nid]:
+            continue
+        need = out.setdefault(act.code, {})
+        for user in dependents[nid]:
+            consumes = getattr(graph.actions[user], "consumes", None)
+            declared = consumes(ctx) if consumes is not None else None
+            required = getattr(graph.actions[user], "required_events", None)
+            extra = set(required(ctx)) if required is not None else set()
+            for t, fields in (declared if declared is not None else {t: [] for t in configured}).items():
+                if t in configured or t in extra:
+                    need[t] = sorted(set(need.get(t, [])) | set(fields))
+    order = {t: k for k, t in enumerate(configured)}
+    return {code: {t: need[t] for t in sorted(need, key=lambda t: (order.get(t, len(order)), t))} for code, need in out.items()}
+
+def resolve_with_demand(root_action: Any, ctx: Any, **kwargs: Any) -> ActionGraph:
+    """`resolve_actions`, then again with `ctx.demand` set from `event_demand` if that changes it.
+
+    Actions build their dump dependency from `ctx.demand` (see
+    `actions.core.report_events`), so the second pass narrows every events dump
+    to the union of what its consumers in this graph read.
+    """
+    graph = resolve_actions(root_action, ctx, **kwargs)
+    demand = getattr(ctx, "demand", None)
+    if demand is None:
+        return graph
+    wanted = event_demand(graph, ctx)
+    if all(demand.get(code) == need for code, need in wanted.items()):
+        return graph
+    demand.update(wanted)
+    cache = kwargs.get("requires_cache")
+    if cache is not None:
+        cache.clear()
+    return resolve_actions(root_action, ctx, **kwargs)
+
+def build_graph(root_action: Any, ctx: Any, max_nodes: int = 500,
+                requires_cache: Optional[Dict[str, List[Any]]] = None) -> Tuple[Dict[str, Node], Set[Edge], str]:
+    g = resolve_with_demand(root_action, ctx, max_nodes=max_nodes, strict=False, requires_cache=requires_cache)
+    nodes: Dict[str, Node] = {}
+    edges: Set[Edge] = set()
+    for nid, act in g.actions.items():
+        _, aname, params = _artifact_id(act)
+        nodes[nid] = Node(nid, f"{_action_name(act)}\\n[{aname}]\\n{params}", _action_name(act), aname)
+        edges.update((did, nid) for did in g.deps[nid])
+    return nodes, edges, g.root_id
 
-def render_ascii(nodes: Dict[str, Node], edges: Set[Edge], root_id: str) -> str:
+def render_ascii(nodes: Dict[str, Node], edges: Set[Edge], root_id: str, notes: Optional[Dict[str, str]] = None) -> str:
+    """Dependency tree under the root; `notes` (artifact id -> text) are appended to their lines."""
     children: Dict[str, List[str]] = {}
-    for a, b in edges:
-        children.setdefault(a, []).append(b)
+    for a, b in edges:  # (dependency, dependent)
+        children.setdefault(b, []).append(a)
     lines: List[str] = []
     visited: Set[str] = set()
     def dfs(nid: str, depth: int):
         star = " *" if nid in visited else ""
-        lines.append("  " * depth + f"{nodes[nid].action_name} -> [{nodes[nid].artifact_name}]{star}")
+        note = f"  ({notes[nid]})" if notes and nid in notes else ""
+        lines.append("  " * depth + f"{nodes[nid].action_name} -> [{nodes[nid].artifact_name}]{star}{note}")
         if nid in visited: return
         visited.add(nid)
         for ch in sorted(children.get(nid, [])):
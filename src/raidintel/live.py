@@ -0,0 +1,138 @@
+from __future__ import annotations
+import os, time, logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+from . import tracing
+from .fight_filter import FightFilter
+from .models import Event, Fight
+from .repository import EventCursor
+
+log = logging.getLogger(__name__)
+
+@dataclass
+class PollResult:
+    new_fights: List[int] = field(default_factory=list)
+    tailed: Dict[int, int] = field(default_factory=dict)  # fight id -> events appended
+    fetch_s: float = 0.0
+    analysis_s: float = 0.0
+
+    @property
+    def affected(self) -> Set[int]:
+        return set(self.new_fights) | {fid for fid, n in self.tailed.items() if n}
+
+    def summary(self) -> str:
+        if not self.affected:
+            return "no new events"
+        parts = [f"new fights {', '.join(map(str, self.new_fights))}"] if self.new_fights else []
+        parts += [f"fight {fid} +{n} events" for fid, n in sorted(self.tailed.items()) if n]
+        return f"{'; '.join(parts)} (fetch {self.fetch_s:.1f}s, notes {self.analysis_s:.1f}s)"
+
+class LiveTail:
+    """Keeps the events, player features and coaching notes of a live report current.
+
+    Every `poll()` asks for the report's fights without the response cache;
+    only those passing the configured `FightFilter` are followed. Fights not
+    seen before are dumped like `EnsureReportEventsDumped` would (streams
+    already committed are skipped), and each committed stream of a
+    known fight whose end moved is continued from its last stored timestamp:
+    all those tails go out as one batched events query, and the new events are
+    appended to the stored streams in place. Player features are then
+    recomputed for the affected fights only and coaching.md is rewritten.
+
+    The artifact store is not touched; the next `prescribe` sees the changed
+    event files through its input fingerprint and rebuilds.
+    """
+
+    def __init__(self, ctx: Any, code: str, event_types: Optional[List[str]] = None) -> None:
+        from .analysis.player_features import FEATURE_FIELDS
+        self.ctx = ctx
+        self.code = code
+        # by default only what the features read
+        self.event_types = list(event_types or [t for t in ctx.cfg.event_types if t in FEATURE_FIELDS])
+        self.fight_filter = FightFilter.from_config(ctx.cfg)
+
+    def _tails(self, known: Dict[int, Fight], fights: List[Fight]) -> List[EventCursor]:
+        """Cursors continuing every committed stream of a known fight that grew."""
+        etl = self.ctx.etl
+        manifest = etl.manifest(self.code)
+        out: List[EventCursor] = []
+        for f in fights:
+            old = known.get(f.id)
+            if old is None or f.endTime <= old.endTime:
+                continue
+            for et in self.event_types:
+                if not etl.events_complete(self.code, f.id, et):
+                    continue  # never committed: the dump picks it up
+                last = (manifest.get((f.id, et)) or {}).get("max_ts")
+                out.append(EventCursor(f.id, et, float(last if last is not None else f.startTime), float(f.endTime)))
+        return out
+
+    def _append_tails(self, cursors: List[EventCursor]) -> Dict[int, int]:
+        etl, cfg = self.ctx.etl, self.ctx.cfg
+        # events at the stored last timestamp are fetched again; skip as many as are already on disk
+        dupes = [etl.trailing_events_at(self.code, c.fight_id, c.data_type, c.start) for c in cursors]
+        pages: Dict[int, List[Event]] = {i: [] for i in range(len(cursors))}
+        for i, events, _ in self.ctx.repo.stream_events_batched(self.code, cursors, batch_size=cfg.events_batch_size):
+            pages[i].extend(events)
+        appended: Dict[int, int] = {}
+        for i, c in enumerate(cursors):
+            events = pages[i][dupes[i]:]
+            appended[c.fight_id] = appended.get(c.fight_id, 0) + etl.append_events(self.code, c.fight_id, c.data_type, events)
+        return appended
+
+    def _dump_new(self, fights: List[Fight]) -> List[int]:
+        from .etl.fetch import ConcurrentEventFetcher
+        etl, cfg = self.ctx.etl, self.ctx.cfg
+        todo = [f for f in fights if not all(etl.events_complete(self.code, f.id, et) for et in self.event_types)]
+        if todo:
+            fetcher = ConcurrentEventFetcher(self.ctx.repo, etl, max_in_flight=cfg.max_in_flight,
+                                             batch_size=cfg.events_batch_size, resume=True, mode=cfg.fetch_mode,
+                                             shards=cfg.fight_shards, shard_min_s=cfg.shard_min_s)
+            fetcher.dump_report(self.code, todo, self.event_types)
+        return [f.id for f in todo]
+
+    def _analyze(self, fights: Set[int]) -> None:
+        from .analysis.player_features import update_player_features
+        from .actions.prescribe import write_coaching_notes
+        out_dir = os.path.join(self.ctx.cfg.output_dir, self.code)
+        df = update_player_features(self.code, self.ctx.cfg.output_dir, fights, event_store=self.ctx.cfg.event_store)
+        path = os.path.join(out_dir, "player_features.csv")
+        df.to_csv(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+        write_coaching_notes(df, os.path.join(out_dir, "coaching.md"))
+
+    def poll(self) -> PollResult:
+        res = PollResult()
+        t0 = time.perf_counter()
+        with tracing.span("live.fetch", "live", code=self.code):
+            known = {f.id: f for f in self.ctx.etl.read_fights_csv(self.code)}
+            fights = self.ctx.repo.get_fights(self.code, cached=False)
+            wanted = self.fight_filter.apply(fights)
+            tails = self._tails(known, wanted)
+            if tails:
+                res.tailed = self._append_tails(tails)
+            res.new_fights = self._dump_new(wanted)
+            self.ctx.etl.write_fights_csv(self.code, fights)
+        t1 = time.perf_counter()
+        res.fetch_s = t1 - t0
+        if res.affected:
+            with tracing.span("live.analyze", "live", fights=len(res.affected)):
+                self._analyze(res.affected)
+            res.analysis_s = time.perf_counter() - t1
+        return res
+
+    def watch(self, interval_s: float = 10.0, max_polls: Optional[int] = None,
+              on_poll: Optional[Any] = None) -> Tuple[int, int]:
+        """Poll every `interval_s` until interrupted (or `max_polls`); returns (polls, polls with changes)."""
+        polls = changed = 0
+        while max_polls is None or polls < max_polls:
+            started = time.monotonic()
+            res = self.poll()
+            polls += 1
+            changed += bool(res.affected)
+            if on_poll is not None:
+                on_poll(res)
+            if max_polls is not None and polls >= max_polls:
+                break
+            time.sleep(max(0.0, interval_s - (time.monotonic() - started)))
+        return polls, changed
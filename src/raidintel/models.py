@@ -14,5 +14,22 @@ class Fight:
     id: int
     startTime: int
     endTime: int
+    encounterID: int = 0  # 0 = trash
+    kill: Optional[bool] = None
+    difficulty: Optional[int] = None
+    fightPercentage: Optional[float] = None
+
+    @property
+    def duration_s(self) -> float:
+        return (self.endTime - self.startTime) / 1000.0
+
+    @staticmethod
+    def from_row(row: Dict[str, Any]) -> "Fight":
+        """From a fights.csv row (older files only have id/startTime/endTime)."""
+        def opt(key: str, conv: Any) -> Any:
+            v = row.get(key)
+            return None if v in (None, "") else conv(v)
+        return Fight(int(row["id"]), int(row["startTime"]), int(row["endTime"]), opt("encounterID", int) or 0,
+                     opt("kill", lambda v: str(v).lower() == "true"), opt("difficulty", int), opt("fightPercentage", float))
 
 Event = Dict[str, Any]
@@ -1,7 +1,12 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import List, Protocol, Optional, Any
-from .storage import ArtifactKey, ArtifactStore
+import json, time, hashlib, logging, threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, Future, wait
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Protocol, Optional, Any
+from . import tracing
+from .storage import ArtifactKey, ArtifactStore, fingerprint_files
+
+log = logging.getLogger(__name__)
 
 class Action(Protocol):
     def artifact(self) -> ArtifactKey: ...
@@ -9,6 +14,13 @@ class Action(Protocol):
     def run(self, ctx: "Context") -> None: ...
     def ttl_seconds(self) -> Optional[int]: ...
     def version(self) -> str: ...  # bump when logic/schema changes
+    # files read / written, as paths or glob patterns; part of the input fingerprint
+    def inputs(self, ctx: "Context") -> List[str]: return []
+    def outputs(self, ctx: "Context") -> List[str]: return []
+    # event data type -> fields read, for actions that read a report's events dump (None = every configured type)
+    def consumes(self, ctx: "Context") -> Optional[Dict[str, List[str]]]: return None
+    # consumed event types the action cannot run without, dumped even when not in cfg.event_types
+    def required_events(self, ctx: "Context") -> List[str]: return []
 
 @dataclass
 class Context:
@@ -16,17 +28,192 @@ class Context:
     repo: Any
     etl: Any
     cfg: Any
+    demand: Dict[str, Dict[str, List[str]]] = field(default_factory=dict)  # report code -> consumed types/fields (graph.event_demand)
 
 class Orchestrator:
-    def __init__(self, ctx: Context):
-        self.ctx = ctx
+    """Ensures an action and everything it requires.
 
-    def ensure(self, action: Action) -> None:
-        for dep in action.requires(self.ctx):
-            self.ensure(dep)
+    The action graph is resolved once up front (`graph.resolve_actions`), so each
+    artifact is checked and run at most once even when several actions share it.
+    With `workers` > 1 nodes whose dependencies are satisfied run concurrently on
+    a thread pool; a failed node cancels everything downstream of it while
+    independent branches finish, then the first failure is re-raised.
+
+    An orchestrator is one run: its context wraps the repository in a
+    `RunScopedRepository`, so identical API calls made while planning and
+    executing are issued once, and `requires()` is asked once per artifact id.
+    `reset()` starts a new run.
+
+    Besides existence and TTL, an artifact is up to date only while its input
+    fingerprint matches the one recorded when it was built: the stamps of its
+    dependencies (the digest of their `outputs()`, else their build time) plus
+    the size and mtime of the files named by its own `inputs()`. Rebuilding an
+    upstream artifact whose outputs change therefore rebuilds exactly what
+    depends on them, and checking a fresh artifact reads no input file: inputs
+    are often a report's whole events dump, which `outputs()` digests once per
+    build instead.
+
+    Every node's outcome (hit, miss, stale, failed, cancelled) and duration is
+    kept in `last_run`, reported to the active `tracing.Tracer` and merged into
+    `<output_dir>/_trace/last_run.json` for `print-graph --annotate`.
+    """
+
+    def __init__(self, ctx: Context, workers: Optional[int] = None):
+        self.base_ctx = ctx
+        if workers is None:
+            workers = getattr(ctx.cfg, "orchestrator_workers", 1)
+        self.workers = max(1, int(workers))
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget memoized repository calls and resolved dependencies."""
+        from .repository import RunScopedRepository
+        repo = self.base_ctx.repo
+        if isinstance(repo, RunScopedRepository):
+            repo = repo.repo
+        self.ctx = replace(self.base_ctx, repo=RunScopedRepository(repo) if repo is not None else None, demand={})
+        self._requires: Dict[str, List[Action]] = {}
+        self.last_run: Dict[str, Dict[str, Any]] = {}
+        self._run_lock = threading.Lock()
+
+    def plan(self, action: Action, **kwargs: Any) -> Any:
+        """The resolved `graph.ActionGraph` under `action`, events dumps narrowed to what the graph consumes.
+
+        Extra keyword arguments go to `graph.resolve_actions` (e.g. `strict`, `errors`).
+        """
+        from .graph import resolve_with_demand
+        return resolve_with_demand(action, self.ctx, requires_cache=self._requires, **kwargs)
+
+    @staticmethod
+    def _key(action: Action) -> ArtifactKey:
         key = action.artifact()
         key.version = action.version()
-        if self.ctx.store.exists(key) and self.ctx.store.is_fresh(key, action.ttl_seconds()):
-            return
+        return key
+
+    def _fingerprint(self, graph: Any, nid: str) -> str:
+        deps = graph.deps[nid]
+        recs = self.ctx.store.records_many([self._key(graph.actions[d]) for d in deps])
+        stamps = {d: ((r or {}).get("meta") or {}).get("outputs") or (r or {}).get("t") for d, r in zip(deps, recs)}
+        inputs = getattr(graph.actions[nid], "inputs", None)
+        files = fingerprint_files(inputs(self.ctx), by_content=False) if inputs else None
+        return hashlib.sha1(json.dumps([stamps, files], sort_keys=True).encode()).hexdigest()
+
+    def _record(self, nid: str, action: Action, status: str, duration_s: float) -> None:
+        with self._run_lock:
+            self.last_run[nid] = {"action": action.__class__.__name__, "status": status,
+                                  "duration_s": round(duration_s, 4), "t": time.time()}
+        tracer = tracing.active()
+        if tracer is not None:
+            tracer.action_done(nid, status, duration_s)
+
+    def _ensure_one(self, graph: Any, nid: str, fresh: Optional[bool] = None) -> bool:
+        """Ensure one node with timing and tracing; returns whether it ran."""
+        t0 = time.perf_counter()
+        status = "failed"
+        with tracing.action_scope(nid), tracing.span(nid, "action"):
+            try:
+                status = self._build(graph, nid, fresh)
+            finally:
+                self._record(nid, graph.actions[nid], status, time.perf_counter() - t0)
+        return status != "hit"
+
+    def _build(self, graph: Any, nid: str, fresh: Optional[bool]) -> str:
+        """Run a node unless its artifact is present, fresh and built from the same inputs; returns hit/miss/stale."""
+        action = graph.actions[nid]
+        key = self._key(action)
+        if fresh is None:
+            fresh = self.ctx.store.exists(key) and self.ctx.store.is_fresh(key, action.ttl_seconds())
+        fp = None
+        if fresh:
+            recorded = ((self.ctx.store.record(key) or {}).get("meta") or {}).get("inputs")
+            if recorded is None:  # records from before fingerprints are trusted
+                return "hit"
+            fp = self._fingerprint(graph, nid)
+            if recorded == fp:
+                return "hit"
+            log.info("%s: inputs changed, rebuilding", key.id())
+        if fp is None:
+            fp = self._fingerprint(graph, nid)
         action.run(self.ctx)
-        self.ctx.store.touch(key, {"name": key.name, "params": key.params, "version": key.version})
+        outputs = getattr(action, "outputs", None)
+        self.ctx.store.touch(key, {"name": key.name, "params": key.params, "version": key.version,
+                                   "inputs": fp, "outputs": fingerprint_files(outputs(self.ctx)) if outputs else None})
+        return "stale" if fresh else "miss"
+
+    def dry_run(self, graph: Any) -> Dict[str, str]:
+        """What `ensure` would do with each node, without running anything.
+
+        "fresh" (skipped), "missing" (absent or past its TTL), "changed" (inputs
+        differ from the recorded fingerprint) or "upstream" (a dependency will be
+        rebuilt, so it may be too).
+        """
+        order = graph.order()
+        fresh = self._freshness(graph, order)
+        out: Dict[str, str] = {}
+        for nid in order:
+            if not fresh[nid]:
+                out[nid] = "missing"
+            elif any(out[d] != "fresh" for d in graph.deps[nid]):
+                out[nid] = "upstream"
+            else:
+                recorded = ((self.ctx.store.record(self._key(graph.actions[nid])) or {}).get("meta") or {}).get("inputs")
+                out[nid] = "fresh" if recorded is None or recorded == self._fingerprint(graph, nid) else "changed"
+        return out
+
+    def _freshness(self, graph: Any, order: List[str]) -> Dict[str, bool]:
+        """Freshness of every node in one bulk store query."""
+        acts = [graph.actions[nid] for nid in order]
+        fresh = self.ctx.store.fresh_many([self._key(a) for a in acts], [a.ttl_seconds() for a in acts])
+        return dict(zip(order, fresh))
+
+    def ensure(self, action: Action) -> None:
+        with tracing.span("plan", "orchestrator"):
+            graph = self.plan(action)
+            order = graph.order()
+            fresh = self._freshness(graph, order)
+        try:
+            if self.workers == 1 or len(order) == 1:
+                for nid in order:
+                    self._ensure_one(graph, nid, fresh[nid])
+            else:
+                self._run_parallel(graph, order, fresh)
+        finally:
+            output_dir = getattr(self.ctx.cfg, "output_dir", None)
+            if output_dir and self.last_run:
+                tracing.save_run_log(output_dir, self.last_run)
+
+    def _run_parallel(self, graph: Any, order: List[str], fresh: Dict[str, bool]) -> None:
+        dependents = graph.dependents()
+        waiting = {nid: len(graph.deps[nid]) for nid in order}
+        ready = [nid for nid in order if waiting[nid] == 0]
+        failed: Dict[str, BaseException] = {}
+        cancelled: set = set()
+        running: Dict[Future, str] = {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="raidintel-dag") as pool:
+            try:
+                while ready or running:
+                    while ready:
+                        nid = ready.pop(0)
+                        running[pool.submit(self._ensure_one, graph, nid, fresh[nid])] = nid
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        nid = running.pop(fut)
+                        err = fut.exception()
+                        if err is not None:
+                            failed[nid] = err
+                            skip = graph.downstream(nid) - cancelled
+                            cancelled |= skip
+                            for d in skip:
+                                self._record(d, graph.actions[d], "cancelled", 0.0)
+                            log.error("%s failed: %s; cancelled %d downstream action(s)", nid, err, len(skip))
+                            continue
+                        for d in dependents[nid]:
+                            waiting[d] -= 1
+                            if waiting[d] == 0 and d not in cancelled:
+                                ready.append(d)
+            except BaseException:  # Ctrl-C: don't start anything new, let running actions finish
+                for fut in running:
+                    fut.cancel()
+                raise
+        if failed:
+            raise next(iter(failed.values()))
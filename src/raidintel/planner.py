@@ -0,0 +1,273 @@
+from __future__ import annotations
+import os, csv, glob, json, math, logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from .models import Report, Fight
+from .fight_filter import FightFilter
+from .etl.manifest import load_manifest
+
+log = logging.getLogger(__name__)
+
+# Rough constants for estimates that local data cannot answer.
+REQUEST_LATENCY_S = 0.6  # one GraphQL round trip
+EVENTS_PER_PAGE = 10000  # `limit` of an events query
+DEFAULT_EVENTS_PER_S = 25.0  # per fight-second and data type, before any report has been dumped
+DEFAULT_EVENT_BYTES = 120
+POINTS_PER_REQUEST = 1.0  # RateLimiter's starting estimate
+POINTS_PER_HOUR = 3600.0
+FEATURE_BYTES_PER_S = 40e6  # vectorized player feature build
+CPU_FLOOR_S = {"dataset-built": 0.05, "coaching-notes": 0.5, "analysis-latest": 0.3}
+
+class OfflineError(RuntimeError):
+    pass
+
+class OfflineRepository:
+    """Answers repository calls from local data only: the report index, the
+    response cache and the files of earlier dumps. The calls that need the
+    network raise `OfflineError`, so planning never touches it."""
+
+    def __init__(self, output_dir: str, index: Any = None, cache: Any = None) -> None:
+        self.output_dir = output_dir
+        self.index = index
+        self.cache = cache
+
+    def _cached(self, query: str, variables: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return self.cache.get(query, variables) if self.cache is not None else None
+
+    def list_guild_reports(self, guild: str, slug: str, region: str) -> List[Report]:
+        reps = self.index.reports(guild, slug, region) if self.index is not None else []
+        if not reps:
+            raise OfflineError(f"no local report index for {guild} ({slug}, {region})")
+        return reps
+
+    def get_report_header(self, code: str) -> Report:
+        path = os.path.join(self.output_dir, code, "report.json")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return Report(**json.load(f))
+        from .repository import GQL_REPORT_HEADER
+        data = self._cached(GQL_REPORT_HEADER, {"code": code})
+        if data and data["reportData"]["report"]:
+            return Report(**data["reportData"]["report"])
+        raise OfflineError(f"header of {code} is not stored locally")
+
+    def get_fights(self, code: str, cached: bool = True) -> List[Fight]:
+        path = os.path.join(self.output_dir, code, "fights.csv")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return [Fight.from_row(r) for r in csv.DictReader(f)]
+        from .repository import GQL_FIGHTS, fight_from_api
+        data = self._cached(GQL_FIGHTS, {"code": code})
+        if data:
+            fights = data["reportData"]["report"]["fights"] or []
+            return [fight_from_api(f) for f in fights if f.get("endTime", 0) > f.get("startTime", 0)]
+        raise OfflineError(f"fights of {code} are not stored locally")
+
+    def list_guild_reports_page(self, *args: Any, **kwargs: Any) -> Any:
+        raise OfflineError("list_guild_reports_page needs the network")
+
+    def sync_guild_reports(self, *args: Any, **kwargs: Any) -> Any:
+        raise OfflineError("sync_guild_reports needs the network")
+
+    def stream_event_pages(self, *args: Any, **kwargs: Any) -> Any:
+        raise OfflineError("stream_event_pages needs the network")
+
+    def stream_fights_event_pages(self, *args: Any, **kwargs: Any) -> Any:
+        raise OfflineError("stream_fights_event_pages needs the network")
+
+    def stream_events(self, *args: Any, **kwargs: Any) -> Any:
+        raise OfflineError("stream_events needs the network")
+
+    def stream_events_batched(self, *args: Any, **kwargs: Any) -> Any:
+        raise OfflineError("stream_events_batched needs the network")
+
+def _fight_seconds(report_dir: str) -> Dict[int, float]:
+    path = os.path.join(report_dir, "fights.csv")
+    out: Dict[int, float] = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for r in csv.DictReader(f):
+                out[int(r["id"])] = max(1.0, (int(r["endTime"]) - int(r["startTime"])) / 1000.0)
+    return out
+
+def local_event_rates(output_dir: str) -> Tuple[Dict[str, float], float]:
+    """Events per fight-second for each data type and bytes per event, from the manifests of earlier dumps."""
+    counts: Dict[str, float] = defaultdict(float)
+    secs: Dict[str, float] = defaultdict(float)
+    n_events = n_bytes = 0
+    manifests = glob.glob(os.path.join(output_dir, "*", "manifest.json")) + glob.glob(os.path.join(output_dir, "*", "manifest.jsonl"))
+    for report_dir in sorted({os.path.dirname(mp) for mp in manifests}):
+        dur = _fight_seconds(report_dir)
+        for (fid, et), e in load_manifest(report_dir).items():
+            if fid in dur:
+                counts[et] += e["count"]; secs[et] += dur[fid]
+            n_events += e["count"]; n_bytes += e["bytes"]
+    rates = {et: counts[et] / secs[et] for et in counts if secs[et] > 0}
+    return rates, (n_bytes / n_events if n_events else DEFAULT_EVENT_BYTES)
+
+@dataclass
+class NodeCost:
+    requests: Optional[float] = 0.0  # None = unknown
+    cpu_s: float = 0.0
+    note: str = ""
+
+    @property
+    def points(self) -> Optional[float]:
+        return None if self.requests is None else self.requests * POINTS_PER_REQUEST
+
+@dataclass
+class PlannedNode:
+    nid: str
+    action: str
+    artifact: str
+    status: str
+    cost: NodeCost
+    seconds: float = 0.0
+
+@dataclass
+class Plan:
+    root_id: str
+    nodes: Dict[str, PlannedNode]
+    order: List[str]
+    critical_path: List[str] = field(default_factory=list)
+    critical_s: float = 0.0
+    unresolved: Dict[str, str] = field(default_factory=dict)  # artifact id -> why requires() could not be answered
+
+    @property
+    def work(self) -> List[PlannedNode]:
+        return [self.nodes[n] for n in self.order if self.nodes[n].status != "fresh"]
+
+    def total_requests(self) -> Tuple[float, bool]:
+        """(known request count, whether some nodes could not be estimated)."""
+        reqs = [n.cost.requests for n in self.work]
+        return sum(r for r in reqs if r is not None), any(r is None for r in reqs)
+
+class Estimator:
+    """Per-artifact cost estimates from local metadata (fights.csv, manifests, report index)."""
+
+    def __init__(self, ctx: Any) -> None:
+        self.ctx = ctx
+        self.cfg = ctx.cfg
+        self.rates, self.event_bytes = local_event_rates(ctx.cfg.output_dir)
+
+    def _rate(self, data_type: str) -> float:
+        return self.rates.get(data_type, DEFAULT_EVENTS_PER_S)
+
+    def _fights(self, code: str) -> List[Fight]:
+        """The report's fights that pass the configured filter (raises OfflineError)."""
+        return FightFilter.from_config(self.cfg).apply(self.ctx.repo.get_fights(code))
+
+    def _report_bytes(self, code: str, event_types: List[str]) -> Tuple[float, str]:
+        try:
+            fights = self._fights(code)
+        except OfflineError:
+            fights = None
+        ids = None if fights is None else {f.id for f in fights}
+        entries = {k: e for k, e in load_manifest(os.path.join(self.cfg.output_dir, code)).items()
+                   if k[1] in event_types and (ids is None or k[0] in ids)}
+        if entries:
+            return float(sum(e["bytes"] for e in entries.values())), "manifest"
+        if fights is None:
+            return 0.0, "size unknown"
+        secs = sum(max(1.0, (f.endTime - f.startTime) / 1000.0) for f in fights)
+        return secs * sum(self._rate(t) for t in event_types) * self.event_bytes, "estimated"
+
+    def events(self, code: str, event_types: List[str], fight_filter: Optional[FightFilter] = None) -> NodeCost:
+        try:
+            fights = self.ctx.repo.get_fights(code)
+            if fight_filter is not None:
+                fights = fight_filter.apply(fights)
+        except OfflineError:
+            return NodeCost(None, note="fights unknown until the report is listed")
+        etl, cfg = self.ctx.etl, self.cfg
+        pages: List[int] = []
+        per_type: Dict[str, float] = defaultdict(float)
+        for f in fights:
+            secs = max(1.0, (f.endTime - f.startTime) / 1000.0)
+            for et in event_types:
+                if etl.events_complete(code, f.id, et):
+                    continue
+                n = secs * self._rate(et)
+                pages.append(max(1, math.ceil(n / EVENTS_PER_PAGE)))
+                per_type[et] += n
+        if cfg.fetch_mode == "report-wide":
+            requests = sum(max(1, math.ceil(n / EVENTS_PER_PAGE)) for n in per_type.values())
+        else:
+            requests = math.ceil(sum(pages) / max(1, cfg.events_batch_size))
+        note = f"{len(pages)} streams" + ("" if self.rates else ", default event rates")
+        return NodeCost(requests + 1, note=note)  # + the fights query
+
+    def estimate(self, action: Any) -> NodeCost:
+        name = action.artifact().name
+        code = getattr(action, "code", None)
+        if name == "report-header":
+            return NodeCost(1)
+        if name == "guild-reports":
+            known = self.ctx.repo.index is not None and self.ctx.repo.index.reports(action.guild, action.slug, action.region)
+            return NodeCost(1, note="incremental sync" if known else "first sync pages the full listing")
+        if name == "report-events":
+            return self.events(code, action.event_types, action.fight_filter)
+        if name in ("features-players", "death-context"):
+            size, how = self._report_bytes(code, list(action.consumes(self.ctx) or self.cfg.event_types))
+            return NodeCost(0, cpu_s=size / FEATURE_BYTES_PER_S, note=f"{size / 2**20:.1f} MiB of events ({how})")
+        return NodeCost(0, cpu_s=CPU_FLOOR_S.get(name, 0.0))
+
+    def seconds(self, cost: NodeCost) -> float:
+        """Wall time: requests spread over the fetch workers, paced once the hourly budget is spent."""
+        if cost.requests is None:
+            return cost.cpu_s
+        wire = cost.requests * REQUEST_LATENCY_S / max(1, self.cfg.max_in_flight)
+        over = max(0.0, cost.points - POINTS_PER_HOUR) / (POINTS_PER_HOUR / 3600.0)
+        return max(wire, over) + cost.cpu_s
+
+def make_plan(orch: Any, root: Any) -> Plan:
+    """Dry-run `root` with an orchestrator whose context uses an `OfflineRepository`."""
+    from .graph import _action_name
+    errors: Dict[str, Exception] = {}
+    graph = orch.plan(root, strict=False, errors=errors)
+    status = orch.dry_run(graph)
+    est = Estimator(orch.ctx)
+    nodes: Dict[str, PlannedNode] = {}
+    order = graph.order()
+    for nid in order:
+        act = graph.actions[nid]
+        cost = est.estimate(act) if status[nid] != "fresh" else NodeCost(0)
+        nodes[nid] = PlannedNode(nid, _action_name(act), act.artifact().name, status[nid], cost,
+                                 est.seconds(cost) if status[nid] != "fresh" else 0.0)
+    # longest path: every node starts after its slowest dependency (the orchestrator runs the rest in parallel)
+    finish: Dict[str, float] = {}
+    via: Dict[str, Optional[str]] = {}
+    for nid in order:
+        dep = max(graph.deps[nid], key=lambda d: finish[d], default=None)
+        via[nid] = dep
+        finish[nid] = (finish[dep] if dep else 0.0) + nodes[nid].seconds
+    path, cur = [], graph.root_id
+    while cur is not None:
+        path.append(cur); cur = via[cur]
+    return Plan(graph.root_id, nodes, order, list(reversed(path)), finish[graph.root_id],
+                {nid: str(e) for nid, e in errors.items()})
+
+def _fmt_s(s: float) -> str:
+    return f"{s:.1f}s" if s < 120 else f"{s / 60:.1f}min"
+
+def print_plan(plan: Plan, console: Any = None) -> None:
+    from rich.console import Console
+    from rich.table import Table
+    console = console or Console()
+    t = Table(title="Plan")
+    for col in ("action", "artifact", "status", "requests", "points", "est. time", "note"):
+        t.add_column(col, justify="right" if col in ("requests", "points", "est. time") else "left")
+    for n in plan.work:
+        reqs = "?" if n.cost.requests is None else f"{n.cost.requests:.0f}"
+        pts = "?" if n.cost.points is None else f"{n.cost.points:.0f}"
+        t.add_row(n.action, n.nid, n.status, reqs, pts, _fmt_s(n.seconds), n.cost.note)
+    console.print(t)
+    fresh = len(plan.nodes) - len(plan.work)
+    reqs, unknown = plan.total_requests()
+    more = "+" if unknown else ""
+    console.print(f"{len(plan.work)} of {len(plan.nodes)} artifacts to build ({fresh} fresh); "
+                  f"~{reqs:.0f}{more} GraphQL requests, ~{reqs * POINTS_PER_REQUEST:.0f}{more} points")
+    console.print(f"critical path ~{_fmt_s(plan.critical_s)}: " + " -> ".join(plan.nodes[n].action for n in plan.critical_path))
+    for nid, why in plan.unresolved.items():
+        console.print(f"[yellow]dependencies of {nid} unknown offline: {why}[/yellow]")
@@ -0,0 +1,90 @@
+from __future__ import annotations
+import sqlite3, pathlib, threading
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Set, Tuple
+from .models import Report
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+  guild TEXT NOT NULL,
+  slug TEXT NOT NULL,
+  region TEXT NOT NULL,
+  code TEXT NOT NULL,
+  title TEXT,
+  startTime INTEGER,
+  endTime INTEGER,
+  PRIMARY KEY (guild, slug, region, code)
+);
+CREATE INDEX IF NOT EXISTS reports_by_start ON reports (guild, slug, region, startTime);
+CREATE TABLE IF NOT EXISTS guild_sync (
+  guild TEXT NOT NULL,
+  slug TEXT NOT NULL,
+  region TEXT NOT NULL,
+  oldest_page INTEGER NOT NULL DEFAULT 0,
+  history_complete INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (guild, slug, region)
+);
+"""
+
+class ReportIndex:
+    """Local SQLite index of guild reports (`<output_dir>/reports.sqlite`).
+
+    `WCLRepository` keeps it up to date incrementally, so listing a guild only
+    fetches pages newer than what is already known. `guild_sync` records how far
+    back the listing has been paged, so an interrupted first sync resumes there.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        with self._connect() as con:
+            con.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        con = sqlite3.connect(self.path, timeout=30)
+        try:
+            with con:  # commit / rollback
+                yield con
+        finally:
+            con.close()
+
+    def known_codes(self, guild: str, slug: str, region: str) -> Set[str]:
+        with self._connect() as con:
+            rows = con.execute("SELECT code FROM reports WHERE guild=? AND slug=? AND region=?", (guild, slug, region)).fetchall()
+        return {r[0] for r in rows}
+
+    def upsert(self, guild: str, slug: str, region: str, reports: Iterable[Report]) -> None:
+        rows = [(guild, slug, region, r.code, r.title, r.startTime, r.endTime) for r in reports]
+        with self._lock, self._connect() as con:
+            con.executemany(
+                "INSERT INTO reports (guild, slug, region, code, title, startTime, endTime) VALUES (?,?,?,?,?,?,?) "
+                "ON CONFLICT (guild, slug, region, code) DO UPDATE SET title=excluded.title, "
+                "startTime=excluded.startTime, endTime=excluded.endTime",
+                rows,
+            )
+
+    def sync_state(self, guild: str, slug: str, region: str) -> Tuple[int, bool]:
+        """(deepest listing page indexed, whether the whole history has been paged through)."""
+        with self._connect() as con:
+            row = con.execute("SELECT oldest_page, history_complete FROM guild_sync WHERE guild=? AND slug=? AND region=?",
+                              (guild, slug, region)).fetchone()
+        return (int(row[0]), bool(row[1])) if row else (0, False)
+
+    def set_sync_state(self, guild: str, slug: str, region: str, oldest_page: int, history_complete: bool) -> None:
+        with self._lock, self._connect() as con:
+            con.execute(
+                "INSERT INTO guild_sync (guild, slug, region, oldest_page, history_complete) VALUES (?,?,?,?,?) "
+                "ON CONFLICT (guild, slug, region) DO UPDATE SET oldest_page=excluded.oldest_page, "
+                "history_complete=excluded.history_complete",
+                (guild, slug, region, int(oldest_page), int(history_complete)),
+            )
+
+    def reports(self, guild: str, slug: str, region: str) -> List[Report]:
+        """All indexed reports, newest first (the order the API lists them in)."""
+        with self._connect() as con:
+            rows = con.execute(
+                "SELECT code, title, startTime, endTime FROM reports WHERE guild=? AND slug=? AND region=? "
+                "ORDER BY startTime DESC, code", (guild, slug, region)).fetchall()
+        return [Report(code=c, title=t, startTime=st, endTime=en) for c, t, st, en in rows]
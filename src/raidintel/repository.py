@@ -1,8 +1,12 @@
 from __future__ import annotations
-import time
-from typing import Any, Dict, Iterable, List
+import time, threading
+from concurrent.futures import Future
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 from .models import Report, Fight, Event
-from .wcl_client import WCLClient
+from .wcl_client import WCLClient, NO_CACHE
+from .report_index import ReportIndex
 
 GQL_REPORT_HEADER = """
 query($code:String!){
@@ -32,7 +36,8 @@ GQL_FIGHTS = """
 query($code:String!){
   reportData {
     report(code:$code) {
-      fights { id startTime endTime }
+      endTime
+      fights { id startTime endTime encounterID kill difficulty fightPercentage }
     }
   }
 }
@@ -57,36 +62,144 @@ query($code:String!, $dataType:EventDataType!, $startTime:Float!, $endTime:Float
 }
 """
 
+EVENTS_BATCH_SIZE = 10  # aliased event streams per GraphQL request, unless configured otherwise
+
+def fight_from_api(f: Dict[str, Any]) -> Fight:
+    return Fight(int(f["id"]), int(f["startTime"]), int(f["endTime"]), int(f.get("encounterID") or 0),
+                 f.get("kill"), f.get("difficulty"), f.get("fightPercentage"))
+
+@lru_cache(maxsize=64)
+def _batched_events_query(n: int) -> str:
+    """GQL_EVENTS with `n` aliased events sub-queries (s0..s{n-1}) in one request."""
+    params = ", ".join(f"$dt{i}:EventDataType!, $st{i}:Float!, $et{i}:Float!, $f{i}:[Int]!" for i in range(n))
+    fields = "\n".join(
+        f"      s{i}: events(dataType:$dt{i} startTime:$st{i} endTime:$et{i} fightIDs:$f{i} limit:$limit){{ nextPageTimestamp data }}"
+        for i in range(n)
+    )
+    return f"""
+query($code:String!, $limit:Int, {params}){{
+  reportData {{
+    report(code:$code) {{
+{fields}
+    }}
+  }}
+}}
+"""
+
+@dataclass
+class EventCursor:
+    """Position of one (fight, data_type) stream; `start` advances with each page."""
+    fight_id: int
+    data_type: str
+    start: float
+    end: float
+    done: bool = False
+
 class WCLRepository:
-    def __init__(self, client: WCLClient) -> None:
+    """Typed access to the WCL API.
+
+    Responses for reports that ended more than `finished_after_s` ago never
+    change, so they are cached forever; live reports and the guild listing get
+    short TTLs. Event pages are not cached here, the ETL dumps already persist them.
+    With a `ReportIndex`, guild listings are synced incrementally into it and
+    served from it.
+    """
+
+    def __init__(self, client: WCLClient, listing_ttl: float = 300, live_ttl: float = 60, finished_after_s: float = 3600,
+                 index: Optional[ReportIndex] = None) -> None:
         self.client = client
+        self.index = index
+        self.listing_ttl = listing_ttl
+        self.live_ttl = live_ttl
+        self.finished_after_s = finished_after_s
+
+    def _report_ttl(self, report: Optional[Dict[str, Any]]) -> Optional[float]:
+        end_ms = (report or {}).get("endTime")
+        if not end_ms or time.time() - end_ms / 1000.0 < self.finished_after_s:
+            return self.live_ttl
+        return None  # finished report: immutable
 
     def get_report_header(self, code: str) -> Report:
-        data = self.client.gql(GQL_REPORT_HEADER, {"code": code})
+        data = self.client.gql(GQL_REPORT_HEADER, {"code": code},
+                               cache_ttl=lambda d: self._report_ttl(d["reportData"]["report"]))
         rep = data["reportData"]["report"]
         if not rep:
             raise RuntimeError(f"Report not found: {code}")
         return Report(**rep)
 
+    def list_guild_reports_page(self, guild: str, slug: str, region: str, page: int = 1) -> Tuple[List[Report], bool]:
+        """One page of the guild listing (newest first) and whether more pages follow.
+
+        Page 1 always comes from the API: it is where new uploads appear, and
+        a cached copy would hide them from a sync for up to `listing_ttl`.
+        """
+        variables: Dict[str, Any] = {"guildName": guild, "guildServerSlug": slug, "guildServerRegion": region, "page": page}
+        data = self.client.gql(GQL_REPORTS, variables, cache_ttl=NO_CACHE if page == 1 else self.listing_ttl)
+        block = data["reportData"]["reports"]
+        return [Report(**r) for r in block["data"]], bool(block.get("has_more_pages", False))
+
+    def sync_guild_reports(self, guild: str, slug: str, region: str) -> int:
+        """Bring the report index up to date; returns the number of pages fetched.
+
+        New reports are paged from the top of the listing until a page holds
+        only indexed codes, so reports uploaded late (older than the newest
+        known one) are still picked up when they sort among recent pages. Until
+        the guild's history has been paged to its end, paging then resumes at
+        the deepest page reached by earlier syncs (listings shift towards later
+        pages as reports are added, so nothing is skipped).
+        """
+        known = self.index.known_codes(guild, slug, region)
+        oldest, complete = self.index.sync_state(guild, slug, region)
+        page, fetched = 1, 0
+        while True:
+            reps, more = self.list_guild_reports_page(guild, slug, region, page)
+            self.index.upsert(guild, slug, region, reps)
+            fetched += 1
+            if not complete:
+                oldest = max(oldest, page)
+                complete = not more
+                self.index.set_sync_state(guild, slug, region, oldest, complete)
+            if not more:
+                return fetched
+            if reps and all(r.code in known for r in reps):
+                break
+            page += 1
+        while not complete:
+            page = max(oldest, page + 1)
+            reps, more = self.list_guild_reports_page(guild, slug, region, page)
+            self.index.upsert(guild, slug, region, reps)
+            fetched += 1
+            oldest, complete = page, not more
+            self.index.set_sync_state(guild, slug, region, oldest, complete)
+        return fetched
+
     def list_guild_reports(self, guild: str, slug: str, region: str) -> List[Report]:
+        if self.index is not None:
+            self.sync_guild_reports(guild, slug, region)
+            return self.index.reports(guild, slug, region)
         page, out = 1, []
         while True:
-            data = self.client.gql(GQL_REPORTS, {
-                "guildName": guild, "guildServerSlug": slug, "guildServerRegion": region, "page": page
-            })
-            block = data["reportData"]["reports"]
-            out.extend([Report(**r) for r in block["data"]])
-            if not block.get("has_more_pages", False):
+            reps, more = self.list_guild_reports_page(guild, slug, region, page)
+            out.extend(reps)
+            if not more:
                 return out
             page += 1
-            time.sleep(0.2)
 
-    def get_fights(self, code: str) -> List[Fight]:
-        data = self.client.gql(GQL_FIGHTS, {"code": code})
+    def get_fights(self, code: str, cached: bool = True) -> List[Fight]:
+        """Fights of a report; `cached=False` always asks the API (live reports between pulls)."""
+        ttl = (lambda d: self._report_ttl(d["reportData"]["report"])) if cached else NO_CACHE
+        data = self.client.gql(GQL_FIGHTS, {"code": code}, cache_ttl=ttl)
         fights = data["reportData"]["report"]["fights"] or []
-        return [Fight(**f) for f in fights if f.get("endTime", 0) > f.get("startTime", 0)]
+        return [fight_from_api(f) for f in fights if f.get("endTime", 0) > f.get("startTime", 0)]
 
-    def stream_events(self, code: str, fight_id: int, start: float, end: float, data_type: str, limit: int = 10000) -> Iterable[Event]:
+    def stream_event_pages(self, code: str, fight_id: int, start: float, end: float, data_type: str,
+                           limit: int = 10000) -> Iterator[Tuple[List[Event], Optional[float]]]:
+        """Yield (events, nextPageTimestamp) per page; the cursor is None on the last page."""
+        return self.stream_fights_event_pages(code, [fight_id], start, end, data_type, limit)
+
+    def stream_fights_event_pages(self, code: str, fight_ids: List[int], start: float, end: float, data_type: str,
+                                  limit: int = 10000) -> Iterator[Tuple[List[Event], Optional[float]]]:
+        """Like `stream_event_pages`, for several fights in one stream (events carry a `fight` field)."""
         cur = start
         while True:
             data = self.client.gql(GQL_EVENTS, {
@@ -94,15 +207,99 @@ class WCLRepository:
                 "dataType": data_type,
                 "startTime": cur,
                 "endTime": end,
-                "fightIDs": [fight_id],
+                "fightIDs": list(fight_ids),
                 "limit": limit,
             })
             block = data["reportData"]["report"]["events"]
-            events = block.get("data", []) or []
-            for ev in events:
-                yield ev
             nxt = block.get("nextPageTimestamp")
+            yield block.get("data", []) or [], float(nxt) if nxt else None
             if not nxt:
                 break
             cur = float(nxt)
-            time.sleep(0.15)
+
+    def stream_events(self, code: str, fight_id: int, start: float, end: float, data_type: str, limit: int = 10000) -> Iterable[Event]:
+        for events, _ in self.stream_event_pages(code, fight_id, start, end, data_type, limit):
+            yield from events
+
+    def stream_events_batched(self, code: str, cursors: List[EventCursor], limit: int = 10000, batch_size: int = EVENTS_BATCH_SIZE) -> Iterator[Tuple[int, List[Event], bool]]:
+        """Page several event streams at once, up to `batch_size` aliased sub-queries per request.
+
+        Yields (index into `cursors`, page events, stream finished). Streams leave the
+        batch as soon as they have no `nextPageTimestamp`, and waiting ones take their slot.
+        """
+        pending = [i for i, c in enumerate(cursors) if not c.done]
+        while pending:
+            batch, pending = pending[:batch_size], pending[batch_size:]
+            variables: Dict[str, Any] = {"code": code, "limit": limit}
+            for j, i in enumerate(batch):
+                c = cursors[i]
+                variables.update({f"dt{j}": c.data_type, f"st{j}": c.start, f"et{j}": c.end, f"f{j}": [c.fight_id]})
+            data = self.client.gql(_batched_events_query(len(batch)), variables)
+            report = data["reportData"]["report"]
+            still_open = []
+            for j, i in enumerate(batch):
+                c = cursors[i]
+                block = report[f"s{j}"]
+                nxt = block.get("nextPageTimestamp")
+                if nxt:
+                    c.start = float(nxt)
+                    still_open.append(i)
+                else:
+                    c.done = True
+                yield i, block.get("data", []) or [], c.done
+            pending = still_open + pending
+
+class RunScopedRepository:
+    """Memoizes the read-only calls of a repository for one orchestration run.
+
+    Identical calls (same method and arguments) hit the wrapped repository once;
+    concurrent callers of a call that is still in flight wait for its result
+    instead of issuing their own. Failures are not remembered. Everything else,
+    e.g. the event streams, is passed through.
+    """
+
+    MEMOIZED = ("get_report_header", "list_guild_reports_page", "list_guild_reports", "get_fights")
+
+    def __init__(self, repo: Any) -> None:
+        self.repo = repo
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._calls: Dict[tuple, Future] = {}
+
+    def _call(self, name: str, *args: Any, **kwargs: Any) -> Any:
+        key = (name, args, tuple(sorted(kwargs.items())))
+        with self._lock:
+            fut = self._calls.get(key)
+            owner = fut is None
+            if owner:
+                fut = self._calls[key] = Future()
+            else:
+                self.hits += 1
+        if owner:
+            try:
+                fut.set_result(getattr(self.repo, name)(*args, **kwargs))
+            except BaseException as e:
+                with self._lock:
+                    self._calls.pop(key, None)
+                fut.set_exception(e)
+                raise
+        res = fut.result()
+        return list(res) if isinstance(res, list) else res  # callers may sort/filter their copy
+
+    def get_report_header(self, code: str) -> Report:
+        return self._call("get_report_header", code)
+
+    def list_guild_reports_page(self, guild: str, slug: str, region: str, page: int = 1) -> Tuple[List[Report], bool]:
+        return self._call("list_guild_reports_page", guild, slug, region, page)
+
+    def list_guild_reports(self, guild: str, slug: str, region: str) -> List[Report]:
+        return self._call("list_guild_reports", guild, slug, region)
+
+    def get_fights(self, code: str, cached: bool = True) -> List[Fight]:
+        if not cached:  # live reports: always ask again, and leave the run's memo alone
+            return self.repo.get_fights(code, cached=False)
+        return self._call("get_fights", code)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.repo, name)
+
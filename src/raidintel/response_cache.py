@@ -0,0 +1,98 @@
+from __future__ import annotations
+import json, os, time, pathlib, hashlib, logging, threading
+from typing import Any, Dict, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+class ResponseCache:
+    """Content-addressed on-disk cache of GraphQL responses.
+
+    Entries are keyed by a hash of (normalised query, variables) and stored as
+    `<root>/<hh>/<hash>.json` together with their expiry (None = never expires).
+    Total size is capped by evicting least-recently-used entries; file mtimes
+    double as the LRU clock, so the order survives restarts.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 512 * 1024 * 1024) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[str, Tuple[int, float]]] = None  # path -> (size, last_used)
+        self._total = 0
+
+    @staticmethod
+    def key(query: str, variables: Dict[str, Any]) -> str:
+        raw = json.dumps([" ".join(query.split()), variables], sort_keys=True, default=str).encode()
+        return hashlib.sha256(raw).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    def _load_index(self) -> Dict[str, Tuple[int, float]]:
+        if self._index is None:
+            self._index = {}
+            for p in pathlib.Path(self.root).glob("*/*.json"):
+                st = p.stat()
+                self._index[str(p)] = (st.st_size, st.st_mtime)
+            self._total = sum(sz for sz, _ in self._index.values())
+        return self._index
+
+    def get(self, query: str, variables: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        path = self._path(self.key(query, variables))
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+        if entry is not None and (entry.get("expires") is None or entry["expires"] > time.time()):
+            now = time.time()
+            with self._lock:
+                self.hits += 1
+                idx = self._load_index()
+                if path in idx:
+                    idx[path] = (idx[path][0], now)
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                pass
+            return entry["data"]
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, query: str, variables: Dict[str, Any], data: Dict[str, Any], ttl: Optional[float]) -> None:
+        path = self._path(self.key(query, variables))
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"expires": None if ttl is None else time.time() + ttl, "data": data}, f)
+        os.replace(tmp, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            idx = self._load_index()
+            old = idx.get(path)
+            self._total += size - (old[0] if old else 0)
+            idx[path] = (size, time.time())
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        idx = self._index or {}
+        target = int(self.max_bytes * 0.9)
+        for path, (size, _) in sorted(idx.items(), key=lambda kv: kv[1][1]):
+            if self._total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self._total -= size
+            del idx[path]
+        log.debug("Response cache evicted down to %s bytes", self._total)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n = len(self._load_index())
+            return {"hits": self.hits, "misses": self.misses, "entries": n, "bytes": self._total}
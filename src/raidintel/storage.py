@@ -1,24 +1,73 @@
 from __future__ import annotations
-import json, os, time, pathlib, hashlib
-from typing import Any, Dict, Optional
+import json, os, glob, time, pathlib, hashlib, sqlite3, logging, threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+log = logging.getLogger(__name__)
 
 class ArtifactKey:
     def __init__(self, name: str, params: Dict[str, Any], version: str = "v1") -> None:
         self.name, self.params, self.version = name, params, version
+        self._id: Optional[Tuple[str, str]] = None  # (version, id)
 
     def id(self) -> str:
-        raw = json.dumps([self.name, self.params, self.version], sort_keys=True).encode()
-        h = hashlib.sha1(raw).hexdigest()[:12]
-        return f"{self.name}-{h}"
+        # the orchestrator sets `version` after construction, so the cached id is keyed on it
+        if self._id is None or self._id[0] != self.version:
+            raw = json.dumps([self.name, self.params, self.version], sort_keys=True).encode()
+            h = hashlib.sha1(raw).hexdigest()[:12]
+            self._id = (self.version, f"{self.name}-{h}")
+        return self._id[1]
+
+def _fresh(t: Optional[float], ttl_seconds: Optional[int], now: float) -> bool:
+    if t is None: return False
+    if ttl_seconds is None: return True
+    return (now - t) < ttl_seconds
+
+HASH_MAX_BYTES = 1 << 20  # files up to this size are fingerprinted by content, larger ones by size + mtime
+
+def fingerprint_files(patterns: Sequence[str], by_content: bool = True) -> Optional[str]:
+    """Digest of the files matching `patterns` (None when there are none to look at).
+
+    Missing files are part of the digest too, so a file appearing or
+    disappearing changes it. With `by_content=False` every file is stamped by
+    size + mtime only, which costs one stat per file instead of a read.
+    """
+    if not patterns:
+        return None
+    h = hashlib.sha1()
+    for pattern in patterns:
+        for p in sorted(glob.glob(pattern, recursive=True)) or [pattern]:
+            h.update(p.encode() + b"\0")
+            try:
+                st = os.stat(p)
+            except OSError:
+                h.update(b"missing\0")
+                continue
+            if by_content and st.st_size <= HASH_MAX_BYTES:
+                with open(p, "rb") as f:
+                    h.update(hashlib.sha1(f.read()).digest())
+            else:
+                h.update(f"{st.st_size}:{st.st_mtime_ns}".encode())
+    return h.hexdigest()
 
 class ArtifactStore:
+    """One JSON file per artifact under `<root>/_artifacts/`."""
+
     def __init__(self, root: str = "out"):
         self.root = root
+        self._dir = pathlib.Path(root) / "_artifacts"
+        self._dir.mkdir(parents=True, exist_ok=True)
 
     def _path(self, key: ArtifactKey) -> str:
-        p = pathlib.Path(self.root) / "_artifacts" / key.id()
-        p.parent.mkdir(parents=True, exist_ok=True)
-        return str(p)
+        return str(self._dir / key.id())
+
+    def _time(self, key: ArtifactKey) -> Optional[float]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return float(json.load(f).get("t", 0))
+        except FileNotFoundError:
+            return None
+        except Exception:
+            return 0.0  # unreadable record: present, but never fresh under a TTL
 
     def exists(self, key: ArtifactKey) -> bool:
         return os.path.exists(self._path(key))
@@ -26,13 +75,129 @@ class ArtifactStore:
     def is_fresh(self, key: ArtifactKey, ttl_seconds: Optional[int]) -> bool:
         if not self.exists(key): return False
         if ttl_seconds is None: return True
+        return _fresh(self._time(key), ttl_seconds, time.time())
+
+    def exists_many(self, keys: Sequence[ArtifactKey]) -> List[bool]:
+        return [self.exists(k) for k in keys]
+
+    def fresh_many(self, keys: Sequence[ArtifactKey], ttls: Sequence[Optional[int]]) -> List[bool]:
+        """`exists(k) and is_fresh(k, ttl)` for each key."""
+        return [self.is_fresh(k, ttl) for k, ttl in zip(keys, ttls)]
+
+    def record(self, key: ArtifactKey) -> Optional[Dict[str, Any]]:
+        """The stored `{"meta": ..., "t": ...}` of an artifact, or None."""
         try:
             with open(self._path(key), "r", encoding="utf-8") as f:
-                data = json.load(f)
-            return (time.time() - float(data.get("t", 0))) < ttl_seconds
+                return json.load(f)
         except Exception:
-            return False
+            return None
+
+    def records_many(self, keys: Sequence[ArtifactKey]) -> List[Optional[Dict[str, Any]]]:
+        return [self.record(k) for k in keys]
 
     def touch(self, key: ArtifactKey, meta: Dict[str, Any]) -> None:
         with open(self._path(key), "w", encoding="utf-8") as f:
             json.dump({"meta": meta, "t": time.time()}, f)
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+  id TEXT PRIMARY KEY,
+  name TEXT,
+  t REAL NOT NULL,
+  meta TEXT
+);
+CREATE TABLE IF NOT EXISTS migrations (name TEXT PRIMARY KEY, t REAL NOT NULL);
+"""
+
+class SQLiteArtifactStore(ArtifactStore):
+    """All artifact records in one SQLite file (`<root>/_artifacts.sqlite`, WAL mode).
+
+    Bulk lookups answer a whole plan with a few `IN (...)` queries instead of a
+    stat and a JSON parse per artifact. Records of the JSON file store found in
+    `<root>/_artifacts/` are imported once; the files are left in place.
+    """
+
+    CHUNK = 500  # ids per query, below SQLite's bound-parameter limit
+
+    def __init__(self, root: str = "out", path: Optional[str] = None):
+        self.root = root
+        self.path = path or os.path.join(root, "_artifacts.sqlite")
+        pathlib.Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("PRAGMA synchronous=NORMAL")
+        self._con.executescript(SQLITE_SCHEMA)
+        self._migrate_json_dir(os.path.join(root, "_artifacts"))
+
+    def _migrate_json_dir(self, legacy: str) -> None:
+        with self._lock, self._con:
+            if self._con.execute("SELECT 1 FROM migrations WHERE name='json-dir'").fetchone():
+                return
+            rows = []
+            if os.path.isdir(legacy):
+                for p in pathlib.Path(legacy).iterdir():
+                    try:
+                        data = json.loads(p.read_text(encoding="utf-8"))
+                    except Exception:
+                        continue
+                    meta = data.get("meta") or {}
+                    rows.append((p.name, meta.get("name"), float(data.get("t", 0)), json.dumps(meta)))
+            self._con.executemany("INSERT OR IGNORE INTO artifacts (id, name, t, meta) VALUES (?,?,?,?)", rows)
+            self._con.execute("INSERT INTO migrations (name, t) VALUES ('json-dir', ?)", (time.time(),))
+        if rows:
+            log.info("Imported %d artifact records from %s", len(rows), legacy)
+
+    def _select(self, columns: str, ids: Sequence[str]) -> List[tuple]:
+        rows: List[tuple] = []
+        uniq = list(dict.fromkeys(ids))
+        with self._lock:
+            for i in range(0, len(uniq), self.CHUNK):
+                chunk = uniq[i:i + self.CHUNK]
+                q = f"SELECT id, {columns} FROM artifacts WHERE id IN ({','.join('?' * len(chunk))})"
+                rows.extend(self._con.execute(q, chunk).fetchall())
+        return rows
+
+    def _times(self, ids: Sequence[str]) -> Dict[str, float]:
+        return dict(self._select("t", ids))
+
+    def record(self, key: ArtifactKey) -> Optional[Dict[str, Any]]:
+        return self.records_many([key])[0]
+
+    def records_many(self, keys: Sequence[ArtifactKey]) -> List[Optional[Dict[str, Any]]]:
+        ids = [k.id() for k in keys]
+        found = {i: {"meta": json.loads(meta) if meta else {}, "t": t} for i, t, meta in self._select("t, meta", ids)}
+        return [found.get(i) for i in ids]
+
+    def exists(self, key: ArtifactKey) -> bool:
+        return self.exists_many([key])[0]
+
+    def is_fresh(self, key: ArtifactKey, ttl_seconds: Optional[int]) -> bool:
+        return self.fresh_many([key], [ttl_seconds])[0]
+
+    def exists_many(self, keys: Sequence[ArtifactKey]) -> List[bool]:
+        ids = [k.id() for k in keys]
+        found = self._times(ids)
+        return [i in found for i in ids]
+
+    def fresh_many(self, keys: Sequence[ArtifactKey], ttls: Sequence[Optional[int]]) -> List[bool]:
+        ids = [k.id() for k in keys]
+        found = self._times(ids)
+        now = time.time()
+        return [_fresh(found.get(i), ttl, now) for i, ttl in zip(ids, ttls)]
+
+    def touch(self, key: ArtifactKey, meta: Dict[str, Any]) -> None:
+        with self._lock, self._con:
+            self._con.execute(
+                "INSERT INTO artifacts (id, name, t, meta) VALUES (?,?,?,?) "
+                "ON CONFLICT (id) DO UPDATE SET name=excluded.name, t=excluded.t, meta=excluded.meta",
+                (key.id(), key.name, time.time(), json.dumps(meta)))
+
+ARTIFACT_STORES = ("sqlite", "json")
+
+def open_artifact_store(root: str, backend: str = "sqlite") -> ArtifactStore:
+    if backend == "sqlite":
+        return SQLiteArtifactStore(root)
+    if backend == "json":
+        return ArtifactStore(root)
+    raise ValueError(f"Unknown artifact store {backend!r}; expected one of {', '.join(ARTIFACT_STORES)}")
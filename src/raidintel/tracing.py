@@ -0,0 +1,190 @@
+from __future__ import annotations
+import os, sys, json, time, pathlib, threading, contextvars, tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+try:
+    import resource  # not on Windows
+except ImportError:  # pragma: no cover
+    resource = None  # type: ignore
+
+# Instrumentation for one process. Code calls the module-level `span()` / `count()`;
+# both are no-ops until a `Tracer` is installed with `enable()`. Counters are also
+# attributed to the action running in the current context (see `action_scope`);
+# worker pools started inside an action should `submit()` through this module so
+# their threads inherit it.
+
+_tracer: Optional["Tracer"] = None
+_action: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("raidintel_action", default=None)
+
+def peak_rss_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024  # bytes on macOS, KiB elsewhere
+
+class HeapPeak:
+    """High-water mark of traced allocations (Python objects, numpy buffers) in a `with` block, above its start.
+
+    tracemalloc is started for the block unless it already runs. The peak is
+    process-wide, so allocations of other threads during the block count too.
+    """
+
+    def __init__(self) -> None:
+        self.peak_bytes = 0
+        self._base = 0
+        self._started = False
+
+    def __enter__(self) -> "HeapPeak":
+        self._started = not tracemalloc.is_tracing()
+        if self._started:
+            tracemalloc.start()
+        self._base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.peak_bytes = max(0, tracemalloc.get_traced_memory()[1] - self._base)
+        if self._started:
+            tracemalloc.stop()
+
+class Tracer:
+    """Spans, counters and per-action outcomes of a run; exports Chrome trace JSON and a summary table."""
+
+    def __init__(self) -> None:
+        self.t0 = time.perf_counter()
+        self.events: List[Dict[str, Any]] = []
+        self.counters: Dict[str, float] = defaultdict(float)
+        self.action_counters: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self.actions: Dict[str, Dict[str, Any]] = {}  # artifact id -> status, duration_s
+        self._threads: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def _us(self, t: float) -> float:
+        return (t - self.t0) * 1e6
+
+    def add_span(self, name: str, cat: str, start: float, end: float, args: Dict[str, Any]) -> None:
+        th = threading.current_thread()
+        act = _action.get()
+        if act is not None:
+            args = {"action": act, **args}
+        ev = {"name": name, "cat": cat, "ph": "X", "ts": self._us(start), "dur": self._us(end) - self._us(start),
+              "pid": os.getpid(), "tid": th.ident, "args": args}
+        with self._lock:
+            self._threads[th.ident or 0] = th.name
+            self.events.append(ev)
+
+    def count(self, name: str, n: float = 1) -> None:
+        act = _action.get()
+        with self._lock:
+            self.counters[name] += n
+            if act is not None:
+                self.action_counters[act][name] += n
+
+    def action_done(self, artifact_id: str, status: str, duration_s: float) -> None:
+        with self._lock:
+            prev = self.actions.get(artifact_id)
+            if prev is not None:  # ensured again in the same process: add up, a rebuild outranks a hit
+                status = prev["status"] if status == "hit" else status
+                duration_s += prev["duration_s"]
+            self.actions[artifact_id] = {"status": status, "duration_s": duration_s}
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        with self._lock:
+            meta = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+                    for tid, name in self._threads.items()]
+            return {"traceEvents": meta + list(self.events), "displayTimeUnit": "ms",
+                    "otherData": {"counters": dict(self.counters), "peak_rss": peak_rss_bytes()}}
+
+    def write_chrome_trace(self, path: str) -> str:
+        """Write the trace (loadable in chrome://tracing or ui.perfetto.dev)."""
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+        return path
+
+    def print_summary(self, console: Any = None) -> None:
+        from rich.console import Console
+        from rich.table import Table
+        console = console or Console(stderr=True)
+        # ru_maxrss is the process's high-water mark, so it is only meaningful for the run as a whole
+        rss = peak_rss_bytes()
+        with self._lock:
+            hits, misses = self.counters.get("gql.cache_hits", 0), self.counters.get("gql.cache_misses", 0)
+        notes = [f"peak RSS {rss / 2**20:.0f} MiB" if rss else "",
+                 f"response cache {int(hits)} hits / {int(misses)} misses" if hits or misses else ""]
+        t = Table(title="RaidIntel run", caption=", ".join(n for n in notes if n) or None)
+        for col in ("action", "status", "time", "gql", "cached", "MB in", "events"):
+            t.add_column(col, justify="left" if col in ("action", "status") else "right")
+        with self._lock:
+            actions = list(self.actions.items())
+            per = {k: dict(v) for k, v in self.action_counters.items()}
+            totals = dict(self.counters)
+        def row(c: Dict[str, float]) -> List[str]:
+            return [f"{int(c.get('gql.calls', 0))}", f"{int(c.get('gql.cache_hits', 0))}",
+                    f"{c.get('gql.bytes', 0) / 2**20:.1f}", f"{int(c.get('etl.events', 0))}"]
+        for aid, a in sorted(actions, key=lambda kv: -kv[1]["duration_s"]):
+            t.add_row(aid, a["status"], f"{a['duration_s']:.2f}s", *row(per.get(aid, {})))
+        t.add_row("total", "", f"{time.perf_counter() - self.t0:.2f}s", *row(totals), style="bold")
+        console.print(t)
+
+RUN_LOG = os.path.join("_trace", "last_run.json")
+
+def load_run_log(output_dir: str) -> Dict[str, Dict[str, Any]]:
+    """artifact id -> outcome of the last run that touched it (status, duration_s, t)."""
+    try:
+        with open(os.path.join(output_dir, RUN_LOG), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_run_log(output_dir: str, records: Dict[str, Dict[str, Any]]) -> None:
+    path = os.path.join(output_dir, RUN_LOG)
+    merged = {**load_run_log(output_dir), **records}
+    pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(merged, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+def enable(tracer: Optional[Tracer] = None) -> Tracer:
+    global _tracer
+    _tracer = tracer or Tracer()
+    return _tracer
+
+def disable() -> None:
+    global _tracer
+    _tracer = None
+
+def active() -> Optional[Tracer]:
+    return _tracer
+
+@contextmanager
+def span(name: str, cat: str = "run", **args: Any) -> Iterator[None]:
+    t = _tracer
+    if t is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        t.add_span(name, cat, start, time.perf_counter(), args)
+
+def count(name: str, n: float = 1) -> None:
+    t = _tracer
+    if t is not None:
+        t.count(name, n)
+
+@contextmanager
+def action_scope(artifact_id: str) -> Iterator[None]:
+    token = _action.set(artifact_id)
+    try:
+        yield
+    finally:
+        _action.reset(token)
+
+def submit(pool: Any, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """`pool.submit` that carries the caller's action over to the worker thread."""
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
@@ -1,30 +1,162 @@
 from __future__ import annotations
-import time, logging
+import time, logging, threading
+from email.utils import parsedate_to_datetime
 from typing import Any, Dict, Optional
 import requests
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from . import tracing
 
 log = logging.getLogger(__name__)
 OAUTH_URL = "https://www.warcraftlogs.com/oauth/token"
 
+NO_CACHE = object()  # gql(cache_ttl=...) default: bypass the response cache
+
+GQL_RATE_LIMIT = """
+query{
+  rateLimitData { limitPerHour pointsSpentThisHour pointsResetIn }
+}
+"""
+
+class RateLimiter:
+    """Token bucket sized to the WCL hourly point budget.
+
+    The bucket holds the points still available this hour (minus a small
+    reserve) and refills at `limitPerHour / 3600` points/s, so with budget to
+    spare requests go out back to back, and near the limit they are paced at the
+    sustainable rate instead of running into 429s. Readings from `rateLimitData`
+    resynchronise the bucket and teach it the average points per request.
+    """
+
+    def __init__(self, reserve_pct: float = 0.05, refresh_interval: float = 30.0) -> None:
+        self.reserve_pct = reserve_pct
+        self.refresh_interval = refresh_interval
+        self.limit_per_hour: Optional[float] = None
+        self.points_spent: float = 0.0
+        self.reset_at: float = 0.0
+        self.cost_per_request: float = 1.0
+        self._tokens = 0.0
+        self._last = time.monotonic()
+        self._blocked_until = 0.0
+        self._requests_since_sync = 0
+        self._next_sync = float("-inf")
+        self._sync_failures = 0
+        self._lock = threading.Lock()
+
+    @property
+    def points_remaining(self) -> Optional[float]:
+        if self.limit_per_hour is None:
+            return None
+        return max(0.0, self.limit_per_hour - self.points_spent)
+
+    def _capacity(self) -> float:
+        return self.limit_per_hour * (1.0 - self.reserve_pct)
+
+    def _refill(self, now: float) -> None:
+        if now >= self.reset_at:
+            self._tokens = self._capacity()
+            self.points_spent = 0.0
+            self.reset_at = now + 3600.0
+        else:
+            self._tokens = min(self._capacity(), self._tokens + (now - self._last) * self.limit_per_hour / 3600.0)
+        self._last = now
+
+    def acquire(self) -> None:
+        """Block until one request may be sent."""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._blocked_until - now)
+            self._requests_since_sync += 1
+            if self.limit_per_hour is not None:  # unknown budget: only 429 backoff applies
+                self._refill(now)
+                # reserve the points now, sleep outside the lock
+                self._tokens -= self.cost_per_request
+                if self._tokens < 0:
+                    refill_wait = -self._tokens * 3600.0 / self.limit_per_hour
+                    wait = max(wait, min(refill_wait, self.reset_at - now))
+        if wait > 0:
+            log.debug("Rate limiter: waiting %.2fs", wait)
+            time.sleep(wait)
+
+    def backoff(self, seconds: float) -> None:
+        """Hold back every caller for `seconds` (used on HTTP 429)."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = min(self._tokens, 0.0)
+            self._next_sync = float("-inf")  # re-read the budget before the next request
+
+    def needs_sync(self) -> bool:
+        return time.monotonic() >= self._next_sync
+
+    def sync_failed(self) -> None:
+        """A `rateLimitData` read failed: retry after refresh_interval, doubling per failure (up to 10 min)."""
+        with self._lock:
+            self._sync_failures += 1
+            delay = min(self.refresh_interval * 2 ** (self._sync_failures - 1), 600.0)
+            self._next_sync = time.monotonic() + delay
+
+    def update(self, limit_per_hour: float, points_spent: float, reset_in: float) -> None:
+        """Feed a `rateLimitData` reading."""
+        with self._lock:
+            now = time.monotonic()
+            if self.limit_per_hour is not None and self._requests_since_sync and points_spent >= self.points_spent:
+                observed = (points_spent - self.points_spent) / self._requests_since_sync
+                # other clients on the same key also spend points; don't let one reading explode the estimate
+                observed = min(observed, 4.0 * self.cost_per_request)
+                if observed > 0:
+                    self.cost_per_request = 0.7 * self.cost_per_request + 0.3 * observed
+            self.limit_per_hour = float(limit_per_hour)
+            self.points_spent = float(points_spent)
+            self.reset_at = now + float(reset_in)
+            self._tokens = self.points_remaining - self.reserve_pct * self.limit_per_hour
+            self._last = now
+            self._requests_since_sync = 0
+            self._next_sync = now + self.refresh_interval
+            self._sync_failures = 0
+        log.debug("Rate limit: %.0f/%.0f points spent, reset in %ss, ~%.2f points/request",
+                  points_spent, limit_per_hour, reset_in, self.cost_per_request)
+
+def _retry_after_seconds(resp: requests.Response, default: float = 5.0) -> float:
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
 class WCLClient:
     """Client for Warcraft Logs v2 GraphQL"""
 
-    def __init__(self, site: str, client_id: str, client_secret: str, timeout: int = 90) -> None:
-        self.base_gql = f"https://{site}.warcraftlogs.com/api/v2/client"
+    def __init__(self, site: str, client_id: str, client_secret: str, timeout: int = 90, pool_size: int = 16,
+                 base_url: Optional[str] = None, oauth_url: str = OAUTH_URL, rate_limiter: Optional[RateLimiter] = None,
+                 cache: Optional[Any] = None) -> None:
+        self.base_gql = base_url or f"https://{site}.warcraftlogs.com/api/v2/client"
+        self.oauth_url = oauth_url
         self.client_id = client_id
         self.client_secret = client_secret
         self.timeout = timeout
+        self.limiter = rate_limiter or RateLimiter()
+        self.cache = cache  # ResponseCache or None
         self._token: Optional[str] = None
         self._token_expiry: float = 0.0
+        self._token_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
         self._session = requests.Session()
+        # gql() is called from several worker threads when streams are fetched concurrently
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
 
     def _need_token(self) -> bool:
         return not self._token or time.time() >= self._token_expiry
 
     def _refresh_token(self) -> None:
         r = self._session.post(
-            OAUTH_URL,
+            self.oauth_url,
             data={"grant_type":"client_credentials"},
             auth=(self.client_id, self.client_secret),
             timeout=self.timeout
@@ -35,23 +167,68 @@ class WCLClient:
         self._token_expiry = time.time() + float(data.get("expires_in", 3600)) * 0.9
         log.debug("Obtained new OAuth token; expires in ~%ss", data.get("expires_in"))
 
-    @retry(
-        reraise=True,
-        stop=stop_after_attempt(5),
-        wait=wait_exponential(multiplier=0.5, min=0.5, max=8),
-        retry=retry_if_exception_type((requests.HTTPError, requests.ConnectionError, requests.Timeout)),
-    )
-    def gql(self, query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+    def _post(self, query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
         if self._need_token():
-            self._refresh_token()
+            with self._token_lock:
+                if self._need_token():
+                    self._refresh_token()
         headers = {"Authorization": f"Bearer {self._token}", "Accept":"application/json", "Content-Type":"application/json"}
-        resp = self._session.post(self.base_gql, json={"query": query, "variables": variables}, timeout=self.timeout, headers=headers)
+        with tracing.span("gql.request", "fetch"):
+            resp = self._session.post(self.base_gql, json={"query": query, "variables": variables}, timeout=self.timeout, headers=headers)
+        tracing.count("gql.calls")
+        tracing.count("gql.bytes", len(resp.content))
+        if resp.status_code == 429:
+            delay = _retry_after_seconds(resp)
+            log.warning("Rate limited (429); backing off %.1fs", delay)
+            self.limiter.backoff(delay)
         try:
             resp.raise_for_status()
         except requests.HTTPError as e:
             log.warning("HTTP error %s: %s", resp.status_code, getattr(e, "response", None))
             raise
-        payload = resp.json()
+        with tracing.span("gql.parse", "parse"):
+            payload = resp.json()
         if "errors" in payload:
             raise RuntimeError(f"GraphQL error: {payload['errors']}")
         return payload["data"]
+
+    def sync_rate_limit(self) -> None:
+        """Refresh the limiter from `rateLimitData`; only one thread does it at a time."""
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            self.limiter.acquire()  # the sync is a request too
+            rl = self._post(GQL_RATE_LIMIT, {})["rateLimitData"]
+            self.limiter.update(rl["limitPerHour"], rl["pointsSpentThisHour"], rl["pointsResetIn"])
+        except Exception as e:  # pacing falls back to the last known budget
+            log.debug("Could not read rateLimitData: %s", e)
+            self.limiter.sync_failed()
+        finally:
+            self._sync_lock.release()
+
+    @retry(
+        reraise=True,
+        stop=stop_after_attempt(5),
+        wait=wait_exponential(multiplier=0.5, min=0.5, max=8),
+        retry=retry_if_exception_type((requests.HTTPError, requests.ConnectionError, requests.Timeout)),
+    )
+    def _request(self, query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+        if self.limiter.needs_sync():
+            self.sync_rate_limit()
+        self.limiter.acquire()
+        return self._post(query, variables)
+
+    def gql(self, query: str, variables: Dict[str, Any], cache_ttl: Any = NO_CACHE) -> Dict[str, Any]:
+        """Run a query. With `cache_ttl` set (seconds, None = forever, or a callable
+        deciding from the response) the response cache is consulted first."""
+        if cache_ttl is NO_CACHE or self.cache is None:
+            return self._request(query, variables)
+        data = self.cache.get(query, variables)
+        if data is not None:
+            tracing.count("gql.cache_hits")
+            return data
+        tracing.count("gql.cache_misses")
+        data = self._request(query, variables)
+        ttl = cache_ttl(data) if callable(cache_ttl) else cache_ttl
+        self.cache.put(query, variables, data, ttl)
+        return data
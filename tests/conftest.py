@@ -0,0 +1,64 @@
+from __future__ import annotations
+import os, sys, json, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+class FakeWCL:
+    """A local stand-in for the WCL OAuth and GraphQL endpoints.
+
+    `rate_limit` answers `rateLimitData` (None: a GraphQL error instead),
+    `throttle` holds Retry-After values returned as 429s before requests succeed.
+    """
+
+    def __init__(self) -> None:
+        self.rate_limit: Optional[Dict[str, Any]] = {"limitPerHour": 3600, "pointsSpentThisHour": 0, "pointsResetIn": 3600}
+        self.throttle: List[str] = []
+        self.queries: List[str] = []
+        self.lock = threading.Lock()
+
+    def count(self, needle: str) -> int:
+        with self.lock:
+            return sum(needle in q for q in self.queries)
+
+    def answer(self, path: str, body: bytes):
+        if path.endswith("/oauth"):
+            return 200, {}, {"access_token": "t", "expires_in": 3600}
+        query = json.loads(body)["query"]
+        with self.lock:
+            self.queries.append(query)
+            if self.throttle:
+                return 429, {"Retry-After": self.throttle.pop(0)}, {"errors": ["throttled"]}
+        if "rateLimitData" in query:
+            if self.rate_limit is None:
+                return 200, {}, {"errors": [{"message": "rateLimitData unavailable"}]}
+            return 200, {}, {"data": {"rateLimitData": self.rate_limit}}
+        return 200, {}, {"data": {"ping": 1}}
+
+@pytest.fixture
+def fake_wcl():
+    fake = FakeWCL()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args: Any) -> None:
+            pass
+
+        def do_POST(self) -> None:
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            status, headers, obj = fake.answer(self.path, body)
+            data = json.dumps(obj).encode()
+            self.send_response(status)
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield fake, f"http://127.0.0.1:{srv.server_address[1]}"
+    srv.shutdown()
+    srv.server_close()
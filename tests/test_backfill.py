@@ -0,0 +1,70 @@
+from __future__ import annotations
+import threading
+from types import SimpleNamespace
+from typing import List, Tuple
+import pytest
+from src.raidintel import backfill
+from src.raidintel.actions.core import EnsureReportEventsDumped
+from src.raidintel.backfill import Backfill, BackfillProgress
+from src.raidintel.models import Report
+
+class _Orch:
+    """Records what a backfill ensures; coaching runs can be held until `release` is set."""
+
+    def __init__(self, log: List[Tuple[str, str]], release: threading.Event, started: threading.Event) -> None:
+        self.log, self.release, self.started = log, release, started
+
+    def plan(self, action):
+        return SimpleNamespace(actions={"dump": EnsureReportEventsDumped(action.code, ["Casts"])})
+
+    def ensure(self, action):
+        step = "dump" if isinstance(action, EnsureReportEventsDumped) else "analyze"
+        self.log.append((step, action.code))
+        if step == "analyze":
+            self.started.set()
+            assert self.release.wait(5)
+
+class _Backfill(Backfill):
+    def __init__(self, progress: BackfillProgress, **kwargs) -> None:
+        super().__init__(orch=None, progress=progress, **kwargs)
+        self.log: List[Tuple[str, str]] = []
+        self.release, self.started = threading.Event(), threading.Event()
+
+    def _orch(self):
+        return _Orch(self.log, self.release, self.started)
+
+def _reports(n: int) -> List[Report]:
+    return [Report(code=f"R{k}", title="", startTime=k * 1000, endTime=k * 1000 + 1) for k in range(n)]
+
+def test_restart_skips_what_the_progress_file_records(tmp_path):
+    path = str(tmp_path / "progress.json")
+    progress = BackfillProgress(path)
+    progress.mark("R3", "done")
+    progress.mark("R2", "dumped")
+    progress.mark("R1", "dumped")
+    progress.mark("R1", "failed", error="boom")  # failed while analysing: keeps "dumped"
+
+    run = _Backfill(BackfillProgress(path), fetch_workers=1, cpu_workers=1)
+    run.release.set()
+    stats = run.run(_reports(4)[::-1])
+    assert stats.skipped == 1 and stats.done == 3 and not stats.failed
+    assert sorted(run.log) == [("analyze", "R0"), ("analyze", "R1"), ("analyze", "R2"), ("dump", "R0")]
+    assert {code: BackfillProgress(path).state(code) for code in ("R0", "R1", "R2", "R3")} == dict.fromkeys(
+        ("R0", "R1", "R2", "R3"), "done")
+
+def test_interrupt_cancels_queued_analysis(tmp_path, monkeypatch):
+    run = _Backfill(BackfillProgress(str(tmp_path / "progress.json")), fetch_workers=1, cpu_workers=1)
+    real_wait = backfill.wait
+
+    def interrupted(fs, *args, **kwargs):
+        real_wait(fs, *args, **kwargs)  # every dump finished: R3 is analysing, the others are queued
+        assert run.started.wait(5)
+        threading.Timer(0.3, run.release.set).start()
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(backfill, "wait", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        run.run(_reports(4)[::-1])
+    assert [c for step, c in run.log if step == "dump"] == ["R3", "R2", "R1", "R0"]
+    assert [c for step, c in run.log if step == "analyze"] == ["R3"]
+    assert run.progress.state("R3") == "done" and run.progress.state("R2") == "dumped"
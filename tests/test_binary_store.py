@@ -0,0 +1,68 @@
+from __future__ import annotations
+import io, json
+import numpy as np
+from src.raidintel.etl.binary_store import (_header, append_events_binary, event_dtype, null_of, open_events, project,
+                                            read_count, write_events_binary)
+
+EVENTS = [
+    {"timestamp": 1000, "type": "damage", "sourceID": -1, "targetID": 7, "abilityGameID": 1, "amount": 5.0, "tick": True},
+    {"timestamp": 1010, "type": "mystery", "sourceID": 3, "abilityGameID": "n/a", "amount": 2**40, "extra": [1]},
+    {"timestamp": 1020, "type": "damage", "sourceID": 4, "targetID": -1, "amount": None, "absorbed": 12},
+]
+
+def test_project_keeps_environment_ids_apart_from_missing_fields():
+    arr = project(EVENTS, "DamageTaken", 3)
+    null32, null8 = null_of(np.int32), null_of(np.int8)
+    assert arr["sourceID"].tolist() == [-1, 3, 4]
+    assert arr["targetID"].tolist() == [7, null32, -1]
+    assert arr["abilityGameID"].tolist() == [1, null32, null32]
+    assert arr["amount"].tolist() == [5, 2**40, null_of(np.int64)]
+    assert arr["tick"].tolist() == [1, null8, null8]
+    assert arr["fight"].tolist() == [3, 3, 3] and arr["type"].tolist() == [3, 0, 3]
+
+def test_header_is_padded_to_a_fixed_size_and_parses():
+    dt = event_dtype("Healing")
+    headers = [_header(dt, n) for n in (0, 7, 10**15)]
+    assert len({len(h) for h in headers}) == 1 and len(headers[0]) % 64 == 0
+    for h, n in zip(headers, (0, 7, 10**15)):
+        fh = io.BytesIO(h)
+        assert np.lib.format.read_magic(fh) == (1, 0)
+        assert np.lib.format.read_array_header_1_0(fh) == ((n,), False, dt)
+
+def test_write_append_and_memory_map_round_trip(tmp_path):
+    path = str(tmp_path / "fight_3.npy")
+    assert write_events_binary(path, "DamageTaken", 3, EVENTS[:2]) == 2
+    assert append_events_binary(path, "DamageTaken", 3, EVENTS[2:]) == 3
+    assert read_count(path) == 3
+    mapped = np.load(path, mmap_mode="r")
+    assert isinstance(mapped, np.memmap) and mapped.dtype == event_dtype("DamageTaken")
+    assert mapped.tobytes() == project(EVENTS, "DamageTaken", 3).tobytes()
+
+def test_zero_row_streams(tmp_path):
+    path = str(tmp_path / "fight_1.npy")
+    assert write_events_binary(path, "Deaths", 1, []) == 0
+    assert read_count(path) == 0
+    assert np.load(path).shape == (0,) and len(open_events(path)) == 0
+    assert open_events(path).dtype == event_dtype("Deaths")
+    append_events_binary(path, "Deaths", 1, [{"timestamp": 5, "type": "death", "targetID": 2, "killerID": -1}])
+    mapped = np.load(path, mmap_mode="r")
+    assert len(mapped) == 1 and mapped["killerID"][0] == -1 and mapped["sourceID"][0] == null_of(np.int32)
+
+def test_append_after_a_torn_append_drops_the_uncounted_bytes(tmp_path):
+    path = str(tmp_path / "fight_3.npy")
+    write_events_binary(path, "DamageTaken", 3, EVENTS[:1])
+    with open(path, "ab") as fh:  # records of an append that died before its header rewrite
+        fh.write(project(EVENTS[1:2], "DamageTaken", 3).tobytes()[:-5])
+    assert read_count(path) == 1
+    assert append_events_binary(path, "DamageTaken", 3, EVENTS[2:]) == 2
+    assert np.load(path).tobytes() == project([EVENTS[0], EVENTS[2]], "DamageTaken", 3).tobytes()
+
+def test_missing_timestamps_read_as_zero_like_jsonl(tmp_path):
+    from src.raidintel.analysis.player_features import _binary_columns, _jsonl_columns
+    events = [{"timestamp": 50, "type": "cast", "sourceID": 1}, {"type": "cast", "sourceID": 2}, {"type": "cast"}]
+    npy = str(tmp_path / "fight_1.npy")
+    write_events_binary(npy, "Casts", 1, events)
+    jsonl = tmp_path / "fight_1_Casts.jsonl"
+    jsonl.write_text("".join(json.dumps(ev) + "\n" for ev in events))
+    for got in (_binary_columns(npy), _jsonl_columns(str(jsonl), True)):
+        assert [a.tolist() for a in got] == [[1, 2], [50, 0]]
@@ -0,0 +1,84 @@
+from __future__ import annotations
+import os, random
+import pandas as pd
+import pytest
+from src.raidintel.actions.core import EnsureReportEventsDumped
+from src.raidintel.actions.prescribe import BuildDeathContext
+from src.raidintel.analysis.death_context import build_death_context
+from src.raidintel.config import WCLConfig
+from src.raidintel.etl.pipeline import ETLPipeline
+from src.raidintel.graph import resolve_with_demand
+from src.raidintel.models import Fight
+from src.raidintel.orchestrator import Context
+
+DEFENSIVES = {642, 871, 22812}
+
+def _fight(rnd: random.Random):
+    """Streams of one fight: hand-placed events around three deaths, plus random noise."""
+    deaths = [{"timestamp": 20_000, "sourceID": 1, "targetID": 7, "abilityGameID": 99, "killingAbilityGameID": 301},
+              {"timestamp": 25_000, "sourceID": 9, "abilityGameID": 98},  # no targetID: the victim is the source
+              {"timestamp": 30_000, "sourceID": 2, "targetID": 8, "abilityGameID": 97}]  # 8 is in no other stream
+    dmg = [{"timestamp": t, "sourceID": 1, "targetID": 7, "abilityGameID": ab, "amount": am}
+           for t, ab, am in [(9_999, 300, 1000), (10_000, 300, 10), (15_000, 302, 25), (20_000, 301, 20), (20_001, 302, 5000)]]
+    heal = [{"timestamp": t, "sourceID": 3, "targetID": 7, "amount": am} for t, am in [(9_000, 700), (19_000, 40), (21_000, 900)]]
+    casts = [{"timestamp": t, "sourceID": 7, "abilityGameID": ab} for t, ab in [(5_000, 871), (12_000, 642), (13_000, 1), (20_000, 22812)]]
+    casts.append({"timestamp": 18_000, "sourceID": 9, "abilityGameID": 22812})
+    for _ in range(400):  # other units, and victim 9 inside and outside its window
+        dmg.append({"timestamp": rnd.randint(0, 40_000), "sourceID": rnd.randint(1, 4), "targetID": rnd.choice([5, 6, 9]),
+                    "abilityGameID": rnd.randint(300, 305), "amount": rnd.randint(1, 500)})
+        heal.append({"timestamp": rnd.randint(0, 40_000), "sourceID": 3, "targetID": rnd.choice([5, 9]), "amount": rnd.randint(1, 500)})
+        casts.append({"timestamp": rnd.randint(0, 40_000), "sourceID": rnd.choice([5, 9]),
+                      "abilityGameID": rnd.choice([1, 2, 642, 871])})
+    key = lambda e: e["timestamp"]
+    return {"Deaths": deaths, "DamageTaken": sorted(dmg, key=key), "Healing": sorted(heal, key=key), "Casts": sorted(casts, key=key)}
+
+def _brute_force(streams, window_ms: int):
+    """The death context by scanning every event for every death."""
+    rows = []
+    for d in streams["Deaths"]:
+        victim = d.get("targetID", d["sourceID"])
+        t0, t1 = d["timestamp"] - window_ms, d["timestamp"] + 1
+        inside = lambda e, who: e.get(who) == victim and t0 <= e["timestamp"] < t1
+        hits = [e for e in streams["DamageTaken"] if inside(e, "targetID")]
+        by_ability = {}
+        for e in hits:
+            by_ability[e["abilityGameID"]] = by_ability.get(e["abilityGameID"], 0) + e["amount"]
+        heals = [e for e in streams["Healing"] if inside(e, "targetID")]
+        used = [e["abilityGameID"] for e in streams["Casts"] if inside(e, "sourceID") and e["abilityGameID"] in DEFENSIVES]
+        rows.append({"targetID": victim, "death_ts": d["timestamp"], "dmg_taken": sum(e["amount"] for e in hits),
+                     "n_hits": len(hits), "top_damage_ability": min(by_ability, key=lambda a: (-by_ability[a], a)) if hits else None,
+                     "killing_ability": d.get("killingAbilityGameID", d["abilityGameID"]),
+                     "heal_received": sum(e["amount"] for e in heals), "n_heals": len(heals),
+                     "defensives_cast": len(used), "defensive_abilities": ";".join(map(str, used))})
+    return rows
+
+@pytest.mark.parametrize("event_store", ["jsonl", "binary"])
+def test_death_context_matches_a_brute_force_scan(tmp_path, event_store):
+    streams = _fight(random.Random(3))
+    etl = ETLPipeline(str(tmp_path), event_store=event_store)
+    fight = Fight(id=1, startTime=0, endTime=40_000)
+    etl.write_fights_csv("R1", [fight])
+    for et, events in streams.items():
+        etl.dump_events_jsonl("R1", fight, et, events)
+    df = build_death_context("R1", str(tmp_path), event_store=event_store, defensives=DEFENSIVES)
+    expected = _brute_force(streams, 10_000)
+    assert len(df) == len(expected)
+    for (_, row), exp in zip(df.iterrows(), expected):
+        got = {k: row[k] for k in exp}
+        got["top_damage_ability"] = None if pd.isna(got["top_damage_ability"]) else int(got["top_damage_ability"])
+        assert got == exp
+    # victim 7's window is [10000, 20001): the hit at 9999 and the one after the death are out, the killing blow is in
+    assert expected[0] == {"targetID": 7, "death_ts": 20_000, "dmg_taken": 55, "n_hits": 3, "top_damage_ability": 302,
+                           "killing_ability": 301, "heal_received": 40, "n_heals": 1, "defensives_cast": 2,
+                           "defensive_abilities": "642;22812"}
+    assert expected[1]["targetID"] == 9 and expected[1]["n_hits"] > 0  # NULL targetID: the source died
+    assert expected[2] == {"targetID": 8, "death_ts": 30_000, "dmg_taken": 0, "n_hits": 0, "top_damage_ability": None,
+                           "killing_ability": 97, "heal_received": 0, "n_heals": 0, "defensives_cast": 0,
+                           "defensive_abilities": ""}
+
+def test_death_context_dump_includes_damage_taken_outside_configured_types(tmp_path):
+    cfg = WCLConfig(client_id="", client_secret="", output_dir=str(tmp_path))
+    assert "DamageTaken" not in cfg.event_types
+    graph = resolve_with_demand(BuildDeathContext("R1"), Context(store=None, repo=None, etl=None, cfg=cfg))
+    dump = next(a for a in graph.actions.values() if isinstance(a, EnsureReportEventsDumped))
+    assert dump.event_types == ["Casts", "Healing", "Deaths", "DamageTaken"]
@@ -0,0 +1,45 @@
+from __future__ import annotations
+import json
+from typing import List
+from src.raidintel.actions.core import EnsureReportEventsDumped
+from src.raidintel.config import WCLConfig
+from src.raidintel.etl.pipeline import ETLPipeline
+from src.raidintel.models import Fight, Report
+from src.raidintel.orchestrator import Context, Orchestrator
+from src.raidintel.storage import open_artifact_store
+
+class _Repo:
+    """One finished report with one fight; every stream is served as `version`-tagged events."""
+
+    def __init__(self) -> None:
+        self.fight = Fight(id=1, startTime=0, endTime=1000)
+        self.version = 1
+        self.streams: List[str] = []
+
+    def get_report_header(self, code):
+        return Report(code=code, title="", startTime=0, endTime=1000)
+
+    def get_fights(self, code, cached=True):
+        return [self.fight]
+
+    def stream_event_pages(self, code, fight_id, start, end, data_type):
+        self.streams.append(data_type)
+        yield [{"timestamp": 10, "type": "cast", "sourceID": 1, "v": self.version, "fight": 1}], None
+
+def _ctx(tmp_path, repo) -> Context:
+    cfg = WCLConfig(client_id="", client_secret="", output_dir=str(tmp_path), events_batch_size=1, fight_shards=1,
+                    orchestrator_workers=1)
+    return Context(store=open_artifact_store(str(tmp_path)), repo=repo, etl=ETLPipeline(str(tmp_path)), cfg=cfg)
+
+def test_unfinished_dump_resumes_but_a_refresh_downloads_again(tmp_path):
+    repo = _Repo()
+    ctx = _ctx(tmp_path, repo)
+    ctx.etl.dump_events_jsonl("R1", repo.fight, "Casts", [{"timestamp": 10, "type": "cast", "v": 0, "fight": 1}])
+    Orchestrator(ctx).ensure(EnsureReportEventsDumped("R1", ["Casts", "Healing"]))
+    assert repo.streams == ["Healing"]  # no record yet: the committed Casts stream is kept
+
+    repo.version, repo.streams = 2, []
+    Orchestrator(ctx).ensure(EnsureReportEventsDumped("R1", ["Casts", "Healing"], ttl=0))  # expired
+    assert sorted(repo.streams) == ["Casts", "Healing"]
+    with open(ctx.etl.stored_events_path("R1", 1, "Casts"), encoding="utf-8") as f:
+        assert [json.loads(line)["v"] for line in f] == [2]
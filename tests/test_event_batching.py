@@ -0,0 +1,42 @@
+from __future__ import annotations
+import re
+from typing import Any, Dict, List
+from src.raidintel.repository import EventCursor, WCLRepository
+
+class _PagingClient:
+    """Answers aliased events queries two events per page; every stream has its own timeline."""
+
+    def __init__(self, streams: Dict[tuple, List[int]]) -> None:
+        self.streams = streams
+        self.batches: List[int] = []
+
+    def gql(self, query: str, variables: Dict[str, Any], cache_ttl: Any = None) -> Dict[str, Any]:
+        aliases = sorted(int(a) for a in re.findall(r"\bs(\d+): events", query))
+        self.batches.append(len(aliases))
+        report = {}
+        for j in aliases:
+            key = (variables[f"f{j}"][0], variables[f"dt{j}"])
+            ts = [t for t in self.streams[key] if variables[f"st{j}"] <= t < variables[f"et{j}"]]
+            page, rest = ts[:2], ts[2:]
+            report[f"s{j}"] = {"data": [{"timestamp": t, "fight": key[0], "type": key[1]} for t in page],
+                               "nextPageTimestamp": rest[0] if rest else None}
+        return {"reportData": {"report": report}}
+
+def test_batched_pages_go_back_to_their_cursor():
+    streams = {(f, dt): [f * 1000 + dt_k * 100 + k for k in range(f + dt_k)]
+               for f in (1, 2, 3) for dt_k, dt in enumerate(("Casts", "Healing"), start=1)}
+    client = _PagingClient(streams)
+    cursors = [EventCursor(f, dt, 0.0, 10_000.0) for f, dt in streams]
+    seen: Dict[int, List[dict]] = {i: [] for i in range(len(cursors))}
+    finished = []
+    for i, events, done in WCLRepository(client).stream_events_batched("R1", cursors, batch_size=4):
+        seen[i].extend(events)
+        if done:
+            finished.append(i)
+
+    assert max(client.batches) == 4 and sum(client.batches) > len(cursors)  # streams leave and refill the batch
+    assert sorted(finished) == list(range(len(cursors)))
+    for i, c in enumerate(cursors):
+        assert c.done
+        assert [e["timestamp"] for e in seen[i]] == streams[(c.fight_id, c.data_type)]
+        assert {(e["fight"], e["type"]) for e in seen[i]} == {(c.fight_id, c.data_type)}
@@ -0,0 +1,85 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import List
+import pytest
+from src.raidintel.actions.core import EnsureDatasetBuilt, EnsureReportEventsDumped, report_events
+from src.raidintel.actions.prescribe import BuildDeathContext, BuildPlayerFeatures
+from src.raidintel.backfill import Backfill, BackfillProgress
+from src.raidintel.config import WCLConfig
+from src.raidintel.graph import event_demand, resolve_actions, resolve_with_demand
+from src.raidintel.orchestrator import Context
+from src.raidintel.storage import ArtifactKey
+
+@dataclass
+class _Root:
+    needs: List[str]  # "features", "dataset", "reader"
+    asked: List[str] = field(default_factory=list)
+    def artifact(self): return ArtifactKey("root", {"needs": self.needs})
+    def requires(self, ctx):
+        self.asked.append("root")
+        make = {"features": lambda: BuildPlayerFeatures("R1"), "dataset": lambda: EnsureDatasetBuilt("R1"),
+                "reader": lambda: _Reader("R1")}
+        return [make[n]() for n in self.needs]
+    def version(self): return "v1"
+
+@dataclass
+class _Reader:
+    """Reads the dump without declaring consumes()."""
+    code: str
+    def artifact(self): return ArtifactKey("reader", {"code": self.code})
+    def requires(self, ctx): return [report_events(ctx, self.code)]
+    def version(self): return "v1"
+
+def _ctx(**cfg) -> Context:
+    return Context(store=None, repo=None, etl=None, cfg=WCLConfig(client_id="", client_secret="", **cfg))
+
+def _dumps(graph) -> List[EnsureReportEventsDumped]:
+    return [a for a in graph.actions.values() if isinstance(a, EnsureReportEventsDumped)]
+
+def test_features_and_dataset_demand_the_union_of_what_they_read():
+    ctx = _ctx()
+    need = event_demand(resolve_actions(_Root(["features", "dataset"]), ctx), ctx)
+    assert list(need["R1"]) == ctx.cfg.event_types  # the dataset counts every configured type
+    assert need["R1"]["Casts"] == ["sourceID", "timestamp"] and need["R1"]["Healing"] == ["sourceID"]
+    assert need["R1"]["Buffs"] == []
+
+def test_features_alone_narrow_the_dump_to_their_types():
+    ctx = _ctx()
+    graph = resolve_with_demand(_Root(["features"]), ctx)
+    [dump] = _dumps(graph)
+    assert dump.event_types == ["Casts", "DamageDone", "Healing", "Deaths"]
+    assert ctx.demand["R1"]["DamageDone"] == ["sourceID", "timestamp"]
+
+def test_an_undeclared_consumer_needs_every_configured_type():
+    ctx = _ctx()
+    [dump] = _dumps(resolve_with_demand(_Root(["features", "reader"]), ctx))
+    assert dump.event_types == ctx.cfg.event_types
+
+def test_narrowing_re_resolves_once_with_a_cleared_requires_cache():
+    ctx, cache = _ctx(), {}
+    root = _Root(["features"])
+    graph = resolve_with_demand(root, ctx, requires_cache=cache)
+    assert root.asked == ["root", "root"]  # the first, every-type pass is thrown away
+    [dump] = _dumps(graph)
+    assert [d.event_types for deps in cache.values() for d in deps if isinstance(d, EnsureReportEventsDumped)] == [
+        dump.event_types]
+    resolve_with_demand(root, ctx, requires_cache=cache)  # demand unchanged: one pass, answered from the cache
+    assert root.asked == ["root", "root"]
+
+def test_backfill_without_a_dump_in_the_graph_fails_clearly(tmp_path):
+    class _Orch:
+        def plan(self, action):
+            return resolve_actions(_Root([]), _ctx())
+    run = Backfill(orch=None, progress=BackfillProgress(str(tmp_path / "progress.json")))
+    run._orch = lambda: _Orch()
+    with pytest.raises(RuntimeError, match="no events dump"):
+        run._dump("R1")
+
+def test_declared_types_outside_the_config_are_dropped_unless_required():
+    ctx = _ctx(event_types=["Casts", "Healing", "Deaths"])
+    [dump] = _dumps(resolve_with_demand(_Root(["features"]), ctx))
+    assert dump.event_types == ["Casts", "Healing", "Deaths"]  # no DamageDone behind the user's back
+
+    ctx = _ctx(event_types=["Casts", "Healing"])
+    [dump] = _dumps(resolve_with_demand(BuildDeathContext("R1"), ctx))
+    assert dump.event_types == ["Casts", "Healing", "DamageTaken", "Deaths"]  # what death context can't run without
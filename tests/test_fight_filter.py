@@ -0,0 +1,80 @@
+from __future__ import annotations
+import csv, io
+import pandas as pd
+import pytest
+from src.raidintel.actions.prescribe import BuildDeathContext, BuildPlayerFeatures
+from src.raidintel.config import WCLConfig
+from src.raidintel.etl.pipeline import ETLPipeline
+from src.raidintel.fight_filter import FightFilter, _ints
+from src.raidintel.models import Fight, Report
+from src.raidintel.orchestrator import Context, Orchestrator
+from src.raidintel.storage import open_artifact_store
+
+TRASH = Fight(id=1, startTime=0, endTime=20_000)
+KILL = Fight(id=2, startTime=30_000, endTime=200_000, encounterID=2902, kill=True, difficulty=5, fightPercentage=0.0)
+WIPE = Fight(id=3, startTime=210_000, endTime=215_000, encounterID=2902, kill=False, difficulty=4, fightPercentage=63.5)
+UNKNOWN = Fight(id=4, startTime=220_000, endTime=280_000, encounterID=2917)  # old fights.csv: no kill/difficulty
+
+@pytest.mark.parametrize("flt, kept", [
+    (FightFilter(), [1, 2, 3, 4]),
+    (FightFilter(bosses_only=True), [2, 3, 4]),
+    (FightFilter(outcome="kills"), [2]),
+    (FightFilter(outcome="wipes"), [3]),  # an unknown outcome is neither
+    (FightFilter(difficulties=(5,)), [2]),
+    (FightFilter(encounters=(2917,)), [4]),
+    (FightFilter(min_duration_s=20), [1, 2, 4]),  # the 20s trash pull is exactly long enough
+    (FightFilter(bosses_only=True, min_duration_s=10, encounters=(2902, 2917)), [2, 4]),
+])
+def test_matches(flt, kept):
+    assert [f.id for f in flt.apply([TRASH, KILL, WIPE, UNKNOWN])] == kept
+
+def test_unknown_outcome_is_rejected():
+    with pytest.raises(ValueError):
+        FightFilter(outcome="pulls")
+
+@pytest.mark.parametrize("value, ints", [
+    (None, ()), ("", ()), ("5", (5,)), ("5, 4,,4", (4, 5)), (" 3 ,1 ", (1, 3)), ([5, "4", 4], (4, 5)), ((), ()),
+])
+def test_ints_parses_lists_and_env_strings(value, ints):
+    assert _ints(value) == ints
+
+def test_from_config_reads_env_style_strings():
+    cfg = WCLConfig(client_id="", client_secret="", fight_difficulties="5,4", fight_encounters="2902",
+                    fight_outcome="KILLS", fight_min_duration_s=30)
+    assert FightFilter.from_config(cfg) == FightFilter(outcome="kills", difficulties=(4, 5), encounters=(2902,),
+                                                       min_duration_s=30.0)
+
+def test_from_row_reads_old_and_new_fights_csv(tmp_path):
+    old = io.StringIO("id,startTime,endTime\n7,100,900\n")
+    assert [Fight.from_row(r) for r in csv.DictReader(old)] == [Fight(id=7, startTime=100, endTime=900)]
+    etl = ETLPipeline(str(tmp_path))
+    etl.write_fights_csv("R1", [TRASH, KILL, WIPE, UNKNOWN])
+    assert etl.read_fights_csv("R1") == [TRASH, KILL, WIPE, UNKNOWN]
+
+def test_narrowing_the_filter_gives_analyses_a_new_key():
+    bosses = FightFilter(bosses_only=True)
+    for make in (BuildPlayerFeatures, BuildDeathContext):
+        assert make("R1").artifact().id() == make("R1", fight_filter=FightFilter()).artifact().id()
+        assert make("R1").artifact().id() != make("R1", fight_filter=bosses).artifact().id()
+
+class _Repo:
+    def get_report_header(self, code):
+        return Report(code=code, title="", startTime=0, endTime=300_000)
+
+    def get_fights(self, code, cached=True):
+        return [TRASH, KILL]
+
+    def stream_event_pages(self, code, fight_id, start, end, data_type):
+        evs = [{"timestamp": int(start) + 1000 * k, "type": "cast", "sourceID": 10 + fight_id, "fight": fight_id}
+               for k in range(3)] if data_type == "Casts" else []
+        yield evs, None
+
+def test_narrowed_filter_rebuilds_features_without_the_excluded_fights(tmp_path):
+    cfg = WCLConfig(client_id="", client_secret="", output_dir=str(tmp_path), events_batch_size=1, orchestrator_workers=1)
+    ctx = Context(store=open_artifact_store(str(tmp_path)), repo=_Repo(), etl=ETLPipeline(str(tmp_path)), cfg=cfg)
+    out = tmp_path / "R1" / "player_features.csv"
+    Orchestrator(ctx).ensure(BuildPlayerFeatures("R1", fight_filter=FightFilter.from_config(cfg)))
+    assert sorted(pd.read_csv(out)["fight_id"]) == [1, 2]
+    cfg.fight_bosses_only = True
+    Orchestrator(ctx).ensure(BuildPlayerFeatures("R1", fight_filter=FightFilter.from_config(cfg)))
+    assert sorted(pd.read_csv(out)["fight_id"]) == [2]
@@ -0,0 +1,73 @@
+from __future__ import annotations
+import os
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import List, Optional
+from src.raidintel.orchestrator import Context, Orchestrator
+from src.raidintel.storage import ArtifactKey, open_artifact_store
+
+@dataclass
+class _Upstream:
+    path: str
+    content: List[str]  # shared, so the test can change what the next build writes
+    runs: List[str] = field(default_factory=list)
+    def artifact(self): return ArtifactKey("up", {})
+    def requires(self, ctx): return []
+    def run(self, ctx):
+        self.runs.append("up")
+        with open(self.path, "w") as f:
+            f.write(self.content[0])
+    def outputs(self, ctx): return [self.path]
+    def ttl_seconds(self) -> Optional[int]: return 0  # always rebuilt
+    def version(self): return "v1"
+
+@dataclass
+class _Downstream:
+    up: _Upstream
+    extra: str
+    runs: List[str] = field(default_factory=list)
+    def artifact(self): return ArtifactKey("down", {})
+    def requires(self, ctx): return [self.up]
+    def run(self, ctx): self.runs.append("down")
+    def inputs(self, ctx): return [self.extra]
+    def ttl_seconds(self) -> Optional[int]: return None
+    def version(self): return "v1"
+
+def _setup(tmp_path):
+    ctx = Context(store=open_artifact_store(str(tmp_path)), repo=None, etl=None,
+                  cfg=SimpleNamespace(output_dir=str(tmp_path), event_types=[], orchestrator_workers=1))
+    extra = os.path.join(tmp_path, "extra.txt")
+    with open(extra, "w") as f:
+        f.write("a")
+    up = _Upstream(os.path.join(tmp_path, "up.txt"), ["one"])
+    return ctx, _Downstream(up, extra), up
+
+def _ensure(ctx, down):
+    orch = Orchestrator(ctx)
+    orch.ensure(down)
+    return {r["action"]: r["status"] for r in orch.last_run.values()}
+
+def test_upstream_rebuild_invalidates_only_when_its_outputs_change(tmp_path):
+    ctx, down, up = _setup(tmp_path)
+    assert _ensure(ctx, down) == {"_Upstream": "miss", "_Downstream": "miss"}
+    assert _ensure(ctx, down) == {"_Upstream": "miss", "_Downstream": "hit"}  # rebuilt, same bytes
+    up.content[0] = "two"
+    assert _ensure(ctx, down) == {"_Upstream": "miss", "_Downstream": "stale"}
+
+def test_changed_input_file_rebuilds(tmp_path):
+    ctx, down, _ = _setup(tmp_path)
+    _ensure(ctx, down)
+    with open(down.extra, "a") as f:
+        f.write("b")
+    assert _ensure(ctx, down)["_Downstream"] == "stale"
+    assert _ensure(ctx, down)["_Downstream"] == "hit"
+
+def test_records_from_before_fingerprints_are_trusted(tmp_path):
+    ctx, down, _ = _setup(tmp_path)
+    key = down.artifact()
+    key.version = down.version()
+    ctx.store.touch(key, {"name": key.name, "params": key.params, "version": key.version})  # no "inputs"
+    with open(down.extra, "w") as f:
+        f.write("changed")
+    assert _ensure(ctx, down)["_Downstream"] == "hit"
+    assert down.runs == []
@@ -0,0 +1,48 @@
+from __future__ import annotations
+from src.raidintel.models import Report
+from src.raidintel.report_index import ReportIndex
+from src.raidintel.repository import WCLRepository
+
+class _Listing(WCLRepository):
+    """Serves a guild listing from memory, 10 reports per page, newest first."""
+
+    def __init__(self, index: ReportIndex, reports, fail_at: int = 0) -> None:
+        super().__init__(client=None, index=index)
+        self.reports, self.fail_at, self.pages = list(reports), fail_at, []
+
+    def list_guild_reports_page(self, guild, slug, region, page=1):
+        if page == self.fail_at:
+            raise ConnectionError("interrupted")
+        self.pages.append(page)
+        ordered = sorted(self.reports, key=lambda r: -r.startTime)
+        return ordered[(page - 1) * 10:page * 10], page * 10 < len(ordered)
+
+def _rep(i: int) -> Report:
+    return Report(code=f"r{i:03d}", title="", startTime=i * 1000, endTime=i * 1000 + 1)
+
+def test_interrupted_first_sync_resumes_into_older_history(tmp_path):
+    index = ReportIndex(str(tmp_path / "reports.sqlite"))
+    repo = _Listing(index, [_rep(i) for i in range(1, 36)], fail_at=3)
+    try:
+        repo.sync_guild_reports("g", "s", "eu")
+    except ConnectionError:
+        pass
+    assert len(index.reports("g", "s", "eu")) == 20
+    assert index.sync_state("g", "s", "eu") == (2, False)
+    repo.fail_at = 0
+    repo.reports += [_rep(i) for i in range(36, 41)]  # uploaded in between
+    repo.pages = []
+    repo.sync_guild_reports("g", "s", "eu")
+    assert len(index.reports("g", "s", "eu")) == 40
+    assert index.sync_state("g", "s", "eu") == (4, True)
+    assert repo.pages == [1, 2, 3, 4]
+
+def test_incremental_sync_stops_on_known_codes_and_keeps_late_uploads(tmp_path):
+    index = ReportIndex(str(tmp_path / "reports.sqlite"))
+    repo = _Listing(index, [_rep(i) for i in range(1, 51)])
+    repo.sync_guild_reports("g", "s", "eu")
+    repo.reports += [_rep(51), Report(code="late", title="", startTime=45500, endTime=45501)]
+    repo.pages = []
+    repo.sync_guild_reports("g", "s", "eu")
+    assert repo.pages == [1, 2]
+    assert "late" in {r.code for r in index.reports("g", "s", "eu")}
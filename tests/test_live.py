@@ -0,0 +1,78 @@
+from __future__ import annotations
+import os, json
+from typing import List
+import pandas as pd
+import pytest
+from src.raidintel.config import WCLConfig
+from src.raidintel.etl.pipeline import ETLPipeline
+from src.raidintel.live import LiveTail
+from src.raidintel.models import Fight
+from src.raidintel.orchestrator import Context
+
+class _LiveRepo:
+    """Serves a report whose fight 1 grows between polls; events from a cursor's start, inclusive, like WCL."""
+
+    def __init__(self, fight: Fight, events: List[dict]) -> None:
+        self.fight = fight
+        self.events = events
+
+    def get_fights(self, code, cached=True):
+        return [self.fight]
+
+    def stream_events_batched(self, code, cursors, limit=10000, batch_size=10):
+        for i, c in enumerate(cursors):
+            yield i, [e for e in self.events if c.start <= e["timestamp"] < c.end], True
+
+def _event(ts: int, k: int, pad: int = 0) -> dict:
+    ev = {"timestamp": ts, "type": "cast", "sourceID": 1 + k % 3, "abilityGameID": k, "fight": 1}
+    if pad:
+        ev["pad"] = "x" * pad
+    return ev
+
+@pytest.mark.parametrize("event_store", ["jsonl", "parquet", "binary"])
+def test_tails_append_each_new_event_once(tmp_path, event_store):
+    etl = ETLPipeline(str(tmp_path), event_store=event_store)
+    stored = [_event(1000 + 100 * k, k) for k in range(40)] + [_event(5000, 40), _event(5000, 41, pad=70_000)]
+    fight = Fight(id=1, startTime=0, endTime=5000)
+    etl.write_fights_csv("R1", [fight])
+    path = etl.dump_events_jsonl("R1", fight, "Casts", stored)
+    if event_store == "jsonl":  # the last line starts before, and ends after, the last 64 KiB block boundary
+        size = os.path.getsize(path)
+        with open(path, "rb") as fh:
+            last = fh.read().rstrip(b"\n").rsplit(b"\n", 1)[1]
+        assert size - len(last) - 1 < size - (1 << 16)
+    new = [_event(5000, 42), _event(5100, 43), _event(5200, 44)]  # a third event at the last stored timestamp
+    repo = _LiveRepo(Fight(id=1, startTime=0, endTime=6000), stored + new)
+    cfg = WCLConfig(client_id="", client_secret="", output_dir=str(tmp_path), event_store=event_store)
+    tail = LiveTail(Context(store=None, repo=repo, etl=etl, cfg=cfg), "R1", event_types=["Casts"])
+
+    assert etl.trailing_events_at("R1", 1, "Casts", 5000) == 2
+    assert tail.poll().tailed == {1: 3}
+    repo.fight = Fight(id=1, startTime=0, endTime=7000)  # the fight moves on without new events
+    assert tail.poll().tailed == {1: 0}
+
+    entry = etl.manifest("R1")[(1, "Casts")]
+    assert (entry["count"], entry["max_ts"]) == (45, 5200)
+    if event_store == "jsonl":
+        with open(path, encoding="utf-8") as fh:
+            got = [json.loads(line)["abilityGameID"] for line in fh]
+    elif event_store == "binary":
+        from src.raidintel.etl.binary_store import open_events
+        got = open_events(etl.stored_events_path("R1", 1, "Casts")).abilityGameID.tolist()
+    else:
+        import pyarrow.parquet as pq
+        got = pq.read_table(etl.stored_events_path("R1", 1, "Casts"), columns=["abilityGameID"]).column("abilityGameID").to_pylist()
+    assert got == list(range(45))
+
+def test_updated_features_keep_the_full_build_row_order(tmp_path):
+    from src.raidintel.analysis.player_features import build_player_features_vectorized, update_player_features
+    etl = ETLPipeline(str(tmp_path))
+    fights = [Fight(id=f, startTime=f * 100_000, endTime=f * 100_000 + 60_000) for f in (1, 2, 3)]
+    etl.write_fights_csv("R1", fights)
+    for f in fights:  # 3 only deals damage and 4 only heals, so their rows come after every fight's casters
+        for et, sources in {"Casts": [2, 1], "DamageDone": [3, 1, 2], "Healing": [4]}.items():
+            etl.dump_events_jsonl("R1", f, et, [{"timestamp": f.startTime + 1000 * k, "sourceID": s}
+                                                for k, s in enumerate(sources * 3)])
+    full = build_player_features_vectorized("R1", str(tmp_path))
+    full.to_csv(os.path.join(str(tmp_path), "R1", "player_features.csv"), index=False)
+    pd.testing.assert_frame_equal(update_player_features("R1", str(tmp_path), [1]), full, check_dtype=False)
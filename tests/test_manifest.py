@@ -0,0 +1,23 @@
+from __future__ import annotations
+import os
+from concurrent.futures import ThreadPoolExecutor
+from src.raidintel.etl.manifest import JOURNAL, MANIFEST, compact_manifest, load_manifest, record_entry
+
+def _entry(fid: int, et: str, count: int = 1):
+    return {"fight": fid, "type": et, "path": f"events/fight_{fid}_{et}.jsonl", "count": count, "bytes": 1,
+            "min_ts": 0, "max_ts": 1, "sources": [1], "sha256": "0" * 64}
+
+def test_commits_are_journaled_and_compacted(tmp_path):
+    d = str(tmp_path)
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda i: record_entry(d, _entry(i // 4, f"T{i % 4}")), range(200)))
+    assert not os.path.exists(os.path.join(d, MANIFEST))
+    assert len(load_manifest(d)) == 200
+    record_entry(d, _entry(0, "T0", count=7))  # a later commit of the same stream wins
+    with open(os.path.join(d, JOURNAL), "a", encoding="utf-8") as f:
+        f.write('{"fight": 9')  # torn by a crash
+    assert load_manifest(d)[(0, "T0")]["count"] == 7
+    compact_manifest(d)
+    assert not os.path.exists(os.path.join(d, JOURNAL))
+    m = load_manifest(d)
+    assert len(m) == 200 and m[(0, "T0")]["count"] == 7
@@ -0,0 +1,14 @@
+from __future__ import annotations
+import pyarrow as pa
+from src.raidintel.etl.parquet_store import parquet_path, read_events_table, write_events_parquet
+
+def test_reading_a_missing_type_matches_the_schema_of_a_stored_one(tmp_path):
+    report_dir = str(tmp_path)
+    write_events_parquet(parquet_path(report_dir, 3, "Casts"), [{"timestamp": 5, "type": "cast", "sourceID": 2, "x": 1}])
+    for columns in (None, ["fight", "type", "sourceID"]):
+        stored = read_events_table(report_dir, "Casts", columns)
+        empty = read_events_table(report_dir, "Healing", columns)
+        assert empty.num_rows == 0
+        assert empty.schema == stored.schema
+        both = pa.concat_tables([empty, stored])
+        assert both.num_rows == 1 and both.column("fight").to_pylist() == [3]
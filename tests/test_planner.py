@@ -0,0 +1,48 @@
+from __future__ import annotations
+import pytest
+from src.raidintel.actions.core import AnalyzeGuildLatest, EnsureReportEventsDumped
+from src.raidintel.config import WCLConfig
+from src.raidintel.etl.pipeline import ETLPipeline
+from src.raidintel.models import Fight
+from src.raidintel.orchestrator import Context, Orchestrator
+from src.raidintel.planner import OfflineError, OfflineRepository, make_plan
+from src.raidintel.report_index import ReportIndex
+from src.raidintel.storage import open_artifact_store
+
+def test_offline_repository_probes_and_network_calls(tmp_path):
+    repo = OfflineRepository(str(tmp_path))
+    assert not hasattr(repo, "client")
+    assert getattr(repo, "client", None) is None
+    with pytest.raises(OfflineError):
+        repo.stream_event_pages("R1", 1, 0, 1, "Casts")
+    with pytest.raises(OfflineError):
+        repo.get_fights("R1")  # nothing stored yet
+
+def _orch(tmp_path, **cfg) -> Orchestrator:
+    cfg = WCLConfig(client_id="", client_secret="", output_dir=str(tmp_path), events_batch_size=1, **cfg)
+    repo = OfflineRepository(str(tmp_path), index=ReportIndex(str(tmp_path / "reports.sqlite")))
+    return Orchestrator(Context(store=open_artifact_store(str(tmp_path)), repo=repo, etl=ETLPipeline(str(tmp_path)), cfg=cfg))
+
+def test_plan_estimates_the_streams_left_to_dump(tmp_path):
+    orch = _orch(tmp_path)
+    etl = orch.ctx.etl
+    fights = [Fight(id=1, startTime=0, endTime=60_000), Fight(id=2, startTime=70_000, endTime=100_000)]
+    etl.write_fights_csv("R1", fights)
+    etl.dump_events_jsonl("R1", fights[0], "Casts", [{"timestamp": t, "type": "cast"} for t in range(0, 60_000, 100)])
+
+    plan = make_plan(orch, EnsureReportEventsDumped("R1", ["Casts", "Healing"]))
+    dump, header = plan.nodes[plan.root_id], plan.nodes[plan.critical_path[0]]
+    assert [plan.nodes[n].artifact for n in plan.critical_path] == ["report-header", "report-events"]
+    assert header.status == dump.status == "missing"
+    assert header.cost.requests == 1
+    assert dump.cost.requests == 3 + 1  # three streams left (fight 1 Casts is stored), one page each, + fights
+    assert dump.cost.note == "3 streams"  # Casts rate measured from the stored stream
+    assert plan.total_requests() == (5, False)
+    assert plan.unresolved == {}
+    assert set(orch._requires) == set(plan.nodes)  # resolved through the run's requires() cache
+
+def test_plan_reports_dependencies_it_cannot_resolve_offline(tmp_path):
+    orch = _orch(tmp_path, guild="g", server_slug="s", server_region="eu")
+    plan = make_plan(orch, AnalyzeGuildLatest("g", "s", "eu"))
+    assert list(plan.unresolved) == [plan.root_id]
+    assert "no local report index" in plan.unresolved[plan.root_id]
@@ -0,0 +1,64 @@
+from __future__ import annotations
+import os, csv, json, random, shutil, tracemalloc
+import pandas as pd
+import pytest
+from src.raidintel.analysis.player_features import build_player_features_vectorized, stream_player_features
+from src.raidintel.etl.manifest import refresh_manifest
+
+TYPES = {"Casts": 300, "DamageDone": 450, "Healing": 180, "Deaths": 3}
+
+def _report(out_dir: str, event_store: str) -> str:
+    """A small report of 8 fights, stored with `event_store`."""
+    rnd = random.Random(7)
+    base = os.path.join(out_dir, "R1")
+    os.makedirs(os.path.join(base, "events"))
+    with open(os.path.join(base, "fights.csv"), "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f); w.writerow(["id", "startTime", "endTime"])
+        for fid in range(1, 9):
+            st = fid * 1_000_000; en = st + rnd.randint(60_000, 300_000)
+            w.writerow([fid, st, en])
+            for et, n in TYPES.items():
+                path = os.path.join(base, "events", f"fight_{fid}_{et}.jsonl")
+                with open(path, "w", encoding="utf-8") as fh:
+                    for ts in sorted(rnd.randint(st, en) for _ in range(n)):
+                        fh.write(json.dumps({"timestamp": ts, "type": et.lower(), "sourceID": rnd.randint(1, 12),
+                                             "targetID": rnd.randint(100, 110), "fight": fid}) + "\n")
+                if event_store == "parquet":
+                    from src.raidintel.etl.parquet_store import jsonl_to_parquet, parquet_path
+                    jsonl_to_parquet(path, parquet_path(base, fid, et))
+                elif event_store == "binary":
+                    from src.raidintel.etl.binary_store import binary_path, jsonl_to_binary
+                    jsonl_to_binary(path, binary_path(base, fid, et), et, fid)
+    if event_store != "jsonl":
+        shutil.rmtree(os.path.join(base, "events"))
+    refresh_manifest(base, event_store)
+    return base
+
+@pytest.mark.parametrize("event_store", ["jsonl", "parquet", "binary"])
+def test_process_pool_matches_one_worker(tmp_path, event_store):
+    _report(str(tmp_path), event_store)
+    one = build_player_features_vectorized("R1", str(tmp_path), event_store)
+    many = build_player_features_vectorized("R1", str(tmp_path), event_store, workers=3, min_events_per_worker=0)
+    assert len(one) > 0
+    pd.testing.assert_frame_equal(one, many)
+
+def test_small_reports_are_not_fanned_out(tmp_path, monkeypatch):
+    import src.raidintel.analysis.player_features as pf
+    _report(str(tmp_path), "jsonl")
+    monkeypatch.setattr(pf, "_process_pool", None)  # any fan-out would fail
+    assert len(pf.build_player_features_vectorized("R1", str(tmp_path), workers=4)) > 0
+
+def test_streamed_build_matches_in_memory_build(tmp_path):
+    _report(str(tmp_path), "jsonl")
+    out = str(tmp_path / "streamed.csv")
+    stats = stream_player_features("R1", str(tmp_path), out, memory_mb=0.1, trace_memory=True)  # ~1100 events: a fight per chunk
+    assert stats.chunks > 1 and stats.fights == 8 and stats.peak_traced and stats.peak_bytes > 0
+    assert not tracemalloc.is_tracing()
+    untraced = stream_player_features("R1", str(tmp_path), str(tmp_path / "untraced.csv"), memory_mb=0.1)
+    assert not untraced.peak_traced
+    whole = build_player_features_vectorized("R1", str(tmp_path))
+    streamed = pd.read_csv(out)
+    assert stats.rows == len(whole)
+    key = ["fight_id", "sourceID"]  # streamed rows come per fight group, not by first appearance in the report
+    pd.testing.assert_frame_equal(streamed.sort_values(key).reset_index(drop=True),
+                                  whole.sort_values(key).reset_index(drop=True), check_dtype=False)
@@ -0,0 +1,48 @@
+from __future__ import annotations
+import time
+from src.raidintel.wcl_client import RateLimiter, WCLClient
+
+def _client(url: str, limiter: RateLimiter = None) -> WCLClient:
+    return WCLClient("www", "id", "secret", base_url=url + "/gql", oauth_url=url + "/oauth", rate_limiter=limiter)
+
+def test_requests_are_paced_near_the_budget(fake_wcl):
+    fake, url = fake_wcl
+    # 10 points/s, and exactly the reserve left: every request has to wait for its refill
+    fake.rate_limit = {"limitPerHour": 36000, "pointsSpentThisHour": 36000 * 0.95, "pointsResetIn": 3600}
+    client = _client(url)
+    t0 = time.monotonic()
+    for _ in range(4):
+        assert client.gql("{ ping }", {}) == {"ping": 1}
+    elapsed = time.monotonic() - t0
+    assert 0.3 <= elapsed < 2.0
+    assert fake.count("rateLimitData") == 1
+
+def test_429_backs_off_for_retry_after_and_resyncs(fake_wcl):
+    fake, url = fake_wcl
+    client = _client(url)
+    client.gql("{ ping }", {})
+    fake.throttle = ["1"]
+    t0 = time.monotonic()
+    assert client.gql("{ ping }", {}) == {"ping": 1}
+    assert time.monotonic() - t0 >= 1.0
+    assert fake.count("rateLimitData") == 2  # the 429 invalidates the last reading
+
+def test_failed_sync_is_not_retried_before_every_request(fake_wcl):
+    fake, url = fake_wcl
+    fake.rate_limit = None
+    client = _client(url)
+    for _ in range(10):
+        client.gql("{ ping }", {})
+    assert fake.count("rateLimitData") == 1
+    assert len(fake.queries) == 11
+
+def test_sync_retry_delay_doubles_per_failure():
+    limiter = RateLimiter(refresh_interval=30.0)
+    assert limiter.needs_sync()
+    limiter.sync_failed()
+    first = limiter._next_sync - time.monotonic()
+    limiter.sync_failed()
+    second = limiter._next_sync - time.monotonic()
+    assert 29 < first <= 30 and 59 < second <= 60
+    limiter.update(3600, 0, 3600)
+    assert not limiter.needs_sync() and limiter._sync_failures == 0
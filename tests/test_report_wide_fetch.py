@@ -0,0 +1,62 @@
+from __future__ import annotations
+import os, logging
+from typing import Dict, List
+from src.raidintel.etl.fetch import ConcurrentEventFetcher
+from src.raidintel.etl.pipeline import ETLPipeline
+from src.raidintel.models import Fight
+
+FIGHTS = [Fight(id=1, startTime=0, endTime=900), Fight(id=2, startTime=1000, endTime=1500), Fight(id=3, startTime=2000, endTime=4000)]
+
+class _Repo:
+    """Serves events `per_page` at a time in time order, with WCL's inclusive `nextPageTimestamp` cursors."""
+
+    def __init__(self, events: Dict[str, List[dict]], per_page: int = 4) -> None:
+        self.events = events
+        self.per_page = per_page
+
+    def stream_fights_event_pages(self, code, fight_ids, start, end, data_type, limit=10000):
+        evs = [e for e in self.events[data_type] if e["fight"] in fight_ids and start <= e["timestamp"] <= end]
+        while evs:
+            page, evs = evs[:self.per_page], evs[self.per_page:]
+            yield page, float(evs[0]["timestamp"]) if evs else None
+
+    def stream_event_pages(self, code, fight_id, start, end, data_type, limit=10000):
+        return self.stream_fights_event_pages(code, [fight_id], start, end, data_type, limit)
+
+def _events(data_type: str) -> List[dict]:
+    out = []
+    for f in FIGHTS:
+        for k, ts in enumerate(range(f.startTime, f.endTime, 70 + 10 * f.id)):
+            out.append({"timestamp": ts, "type": data_type.lower(), "sourceID": k % 5, "fight": f.id})
+    return out
+
+def _dump(root: str, repo: _Repo, mode: str) -> Dict[str, bytes]:
+    etl = ETLPipeline(root)
+    fetcher = ConcurrentEventFetcher(repo, etl, max_in_flight=2, batch_size=1, mode=mode)
+    stats = fetcher.dump_report("R1", FIGHTS, ["Casts", "Healing"])
+    assert stats.streams == 6
+    events_dir = os.path.join(root, "R1", "events")
+    out = {}
+    for name in sorted(os.listdir(events_dir)):
+        with open(os.path.join(events_dir, name), "rb") as f:
+            out[name] = f.read()
+    return out
+
+def test_report_wide_files_match_per_fight_files(tmp_path):
+    repo = _Repo({t: _events(t) for t in ("Casts", "Healing")})
+    per_fight = _dump(str(tmp_path / "per-fight"), repo, "per-fight")
+    report_wide = _dump(str(tmp_path / "report-wide"), repo, "report-wide")
+    assert sorted(per_fight) == [f"fight_{f}_{t}.jsonl" for f in (1, 2, 3) for t in ("Casts", "Healing")]
+    assert report_wide == per_fight
+
+def test_events_for_an_already_committed_fight_are_dropped_with_a_warning(tmp_path, caplog):
+    events = _events("Casts")
+    late = {"timestamp": 2500, "type": "casts", "sourceID": 9, "fight": 1}  # tagged fight 1, long after it was committed
+    events.insert(next(k for k, e in enumerate(events) if e["timestamp"] > 2500), late)
+    repo = _Repo({"Casts": events})
+    etl = ETLPipeline(str(tmp_path))
+    with caplog.at_level(logging.WARNING):
+        stats = ConcurrentEventFetcher(repo, etl, mode="report-wide").dump_report("R1", FIGHTS, ["Casts"])
+    assert stats.streams == 3
+    assert stats.events == len(events) - 1
+    assert "dropped 1 Casts event(s) for fight 1" in caplog.text
@@ -0,0 +1,55 @@
+from __future__ import annotations
+from src.raidintel import response_cache
+from src.raidintel.repository import WCLRepository
+from src.raidintel.response_cache import ResponseCache
+from src.raidintel.wcl_client import NO_CACHE, WCLClient
+
+class _Clock:
+    def __init__(self, now: float) -> None:
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+def test_entries_expire_after_their_ttl(tmp_path, monkeypatch):
+    clock = _Clock(1000.0)
+    monkeypatch.setattr(response_cache.time, "time", clock.time)
+    cache = ResponseCache(str(tmp_path))
+    cache.put("{ a }", {}, {"a": 1}, ttl=60)
+    cache.put("{ b }", {}, {"b": 1}, ttl=None)
+    clock.now += 59
+    assert cache.get("{ a }", {}) == {"a": 1}
+    clock.now += 2
+    assert cache.get("{ a }", {}) is None
+    assert cache.get("{ b }", {}) == {"b": 1}  # no ttl: never expires
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 1, 2)
+
+def test_callable_ttl_is_decided_from_the_response(fake_wcl, tmp_path):
+    fake, url = fake_wcl
+    cache = ResponseCache(str(tmp_path))
+    client = WCLClient("www", "id", "secret", base_url=url + "/gql", oauth_url=url + "/oauth", cache=cache)
+    seen = []
+    def ttl(data):
+        seen.append(data)
+        return -1  # already expired: every call goes to the API
+    for _ in range(2):
+        assert client.gql("{ ping }", {}, cache_ttl=ttl) == {"ping": 1}
+    assert seen == [{"ping": 1}, {"ping": 1}] and fake.count("ping") == 2
+    for _ in range(2):
+        client.gql("{ ping }", {"v": 1}, cache_ttl=lambda d: None)
+    assert fake.count("ping") == 3
+    assert cache.stats()["hits"] == 1
+
+class _ListingClient:
+    def __init__(self) -> None:
+        self.ttls = []
+
+    def gql(self, query, variables, cache_ttl=NO_CACHE):
+        self.ttls.append((variables["page"], cache_ttl))
+        return {"reportData": {"reports": {"data": [], "has_more_pages": variables["page"] < 2}}}
+
+def test_first_listing_page_bypasses_the_cache():
+    client = _ListingClient()
+    WCLRepository(client, listing_ttl=300).list_guild_reports("g", "s", "eu")
+    assert client.ttls == [(1, NO_CACHE), (2, 300)]
@@ -0,0 +1,19 @@
+from __future__ import annotations
+from src.raidintel.repository import RunScopedRepository
+
+class _Repo:
+    def __init__(self) -> None:
+        self.calls = []
+
+    def get_fights(self, code, cached=True):
+        self.calls.append(cached)
+        return [len(self.calls)]
+
+def test_get_fights_memoizes_unless_uncached():
+    repo = _Repo()
+    scoped = RunScopedRepository(repo)
+    assert scoped.get_fights("A") == scoped.get_fights("A") == [1]
+    assert scoped.get_fights("A", cached=False) == [2]
+    assert scoped.get_fights("A", cached=False) == [3]
+    assert scoped.get_fights("A") == [1]
+    assert repo.calls == [True, False, False]
@@ -0,0 +1,52 @@
+from __future__ import annotations
+import os, random
+import numpy as np
+import pytest
+from src.raidintel.etl.pipeline import ETLPipeline
+from src.raidintel.etl.time_index import NULL, EventWindows, StreamIndex, index_path
+from src.raidintel.models import Fight
+
+def _events(amount: int):
+    return [{"timestamp": 1000 + 10 * i, "sourceID": 1 + i % 3, "targetID": 7, "amount": amount} for i in range(50)]
+
+@pytest.mark.parametrize("event_store", ["jsonl", "binary"])
+def test_only_requested_types_are_indexed_and_appends_drop_the_index(tmp_path, event_store):
+    etl = ETLPipeline(str(tmp_path), event_store=event_store, time_index=["Deaths"])
+    fight = Fight(id=1, startTime=0, endTime=5000)
+    for et in ("Deaths", "Resources"):
+        etl.dump_events_jsonl("R1", fight, et, _events(5))
+    base = os.path.join(str(tmp_path), "R1")
+    assert os.path.exists(index_path(base, 1, "Deaths"))
+    assert not os.path.exists(index_path(base, 1, "Resources"))
+    etl.append_events("R1", 1, "Deaths", [{"timestamp": 1600, "sourceID": 2, "targetID": 7, "amount": 5}])
+    assert not os.path.exists(index_path(base, 1, "Deaths"))
+    assert len(EventWindows(base, event_store).index(1, "Deaths").rows(0, 10_000)) == 51
+
+def test_rewritten_stream_of_the_same_size_is_reindexed(tmp_path):
+    etl = ETLPipeline(str(tmp_path), time_index=True)
+    fight = Fight(id=1, startTime=0, endTime=5000)
+    path = etl.dump_events_jsonl("R1", fight, "DamageTaken", _events(5))
+    base = os.path.join(str(tmp_path), "R1")
+    with open(path, "rb") as fh:
+        data = fh.read().replace(b'"sourceID": 1', b'"sourceID": 4')
+    st = os.stat(path)
+    with open(path, "wb") as fh:
+        fh.write(data)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert os.path.getsize(path) == st.st_size
+    idx = EventWindows(base).index(1, "DamageTaken")
+    assert len(idx.rows(0, 10_000, source=4)) == 17 and len(idx.rows(0, 10_000, source=1)) == 0
+
+def test_spans_match_a_brute_force_scan():
+    rnd = random.Random(5)
+    ts = np.array(sorted(rnd.randint(0, 5000) for _ in range(300)), dtype=np.int64)
+    source = np.array([rnd.choice([1, 2, 3, NULL]) for _ in ts], dtype=np.int64)
+    target = np.array([rnd.choice([4, 5]) for _ in ts], dtype=np.int64)
+    idx = StreamIndex.build(ts, source, target)
+    actors = np.array([rnd.choice([1, 2, 3, 4, 9]) for _ in range(200)], dtype=np.int64)  # 4 and 9 never cast
+    t0 = np.array([rnd.randint(-100, 5000) for _ in actors], dtype=np.int64)
+    t1 = t0 + np.array([rnd.randint(0, 1500) for _ in actors], dtype=np.int64)
+    order, lo, hi = idx.spans("source", actors, t0, t1)
+    for i, a in enumerate(actors):
+        want = np.flatnonzero((source == a) & (ts >= t0[i]) & (ts < t1[i]))
+        assert order[lo[i]:hi[i]].tolist() == want.tolist()